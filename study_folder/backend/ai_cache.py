@@ -0,0 +1,181 @@
+"""Content-addressed result cache for call_ai.
+
+Two tiers: a small in-process LRU for the hot path, and an optional SQLite
+file that every gunicorn worker on the box shares.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from logs import log
+
+# Seconds each task's results stay valid. 0 disables caching for the task.
+# Override per task with AI_CACHE_TTL_<TASK>, e.g. AI_CACHE_TTL_SUMMARY=600.
+DEFAULT_TTLS = {
+    "summary": 7 * 24 * 3600,
+    "topics": 7 * 24 * 3600,
+    "doubt": 24 * 3600,
+    "quiz": 6 * 3600,
+    "image_prompt": 30 * 24 * 3600,
+    "tutor": 0,
+    "tutor_summary": 24 * 3600,
+    "default": 3600,
+}
+
+
+def ttl_for(task):
+    task = task or "default"
+    env_value = os.getenv(f"AI_CACHE_TTL_{task.upper()}")
+    if env_value is not None:
+        try:
+            return max(0, int(env_value))
+        except ValueError:
+            pass
+    return DEFAULT_TTLS.get(task, DEFAULT_TTLS["default"])
+
+
+def make_key(model, system_prompt, prompt, max_tokens, temperature, variant=None):
+    """Hash everything that can change the completion into a stable key."""
+    payload = json.dumps(
+        [model, system_prompt, prompt, max_tokens, temperature, variant],
+        ensure_ascii=False,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class AICache:
+    def __init__(self, max_entries=512, db_path=None):
+        self.max_entries = max_entries
+        self.db_path = db_path
+        self._memory = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._writes = 0
+        self._stats = {}
+
+        if db_path:
+            directory = os.path.dirname(db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = self._conn()
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS ai_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ai_cache_expiry ON ai_cache (expires_at)")
+            conn.commit()
+
+    # ── SQLite tier ──────────────────────────────────────────
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _disk_get(self, key, now):
+        try:
+            row = self._conn().execute(
+                "SELECT value, expires_at FROM ai_cache WHERE key = ?", (key,)
+            ).fetchone()
+        except sqlite3.Error as e:
+            log("ai_cache_read_failed", level="warning", error=str(e))
+            return None
+        if row and row[1] > now:
+            return row
+        return None
+
+    def _disk_set(self, key, value, expires_at):
+        try:
+            conn = self._conn()
+            conn.execute(
+                "INSERT OR REPLACE INTO ai_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, expires_at),
+            )
+            self._writes += 1
+            if self._writes % 200 == 0:
+                conn.execute("DELETE FROM ai_cache WHERE expires_at <= ?", (time.time(),))
+            conn.commit()
+        except sqlite3.Error as e:
+            log("ai_cache_write_failed", level="warning", error=str(e))
+
+    # ── Counters ─────────────────────────────────────────────
+    def _count(self, task, field):
+        task = task or "default"
+        with self._lock:
+            counters = self._stats.setdefault(
+                task, {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0}
+            )
+            counters[field] += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._memory),
+                "max_entries": self.max_entries,
+                "disk": bool(self.db_path),
+                "tasks": {task: dict(c) for task, c in self._stats.items()},
+            }
+
+    # ── Public API ───────────────────────────────────────────
+    def get(self, key, task=None):
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._memory.move_to_end(key)
+                else:
+                    del self._memory[key]
+                    entry = None
+        if entry is not None:
+            self._count(task, "memory_hits")
+            return entry[1]
+
+        if self.db_path:
+            row = self._disk_get(key, now)
+            if row:
+                self._remember(key, row[0], row[1])
+                self._count(task, "disk_hits")
+                return row[0]
+
+        self._count(task, "misses")
+        return None
+
+    def set(self, key, value, ttl, task=None):
+        if not value or ttl <= 0:
+            return
+        expires_at = time.time() + ttl
+        self._remember(key, value, expires_at)
+        if self.db_path:
+            self._disk_set(key, value, expires_at)
+        self._count(task, "stores")
+
+    def _remember(self, key, value, expires_at):
+        with self._lock:
+            self._memory[key] = (expires_at, value)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+        if self.db_path:
+            conn = self._conn()
+            conn.execute("DELETE FROM ai_cache")
+            conn.commit()
+
+
+def cache_from_env():
+    """Builds the process-wide cache from AI_CACHE_* settings."""
+    db_path = os.getenv("AI_CACHE_DB", os.path.join("cache", "ai_cache.sqlite3"))
+    max_entries = int(os.getenv("AI_CACHE_MAX_ENTRIES", "512"))
+    return AICache(max_entries=max_entries, db_path=db_path or None)
@@ -1,70 +1,236 @@
-from flask import Flask, jsonify, request
+# clients goes first: importing it starts the boot clock for /debug
+from clients import (gemini_model, imagen_model, mark_booted, ocr, pdf_extract,
+                     pil_image, startup_report, warm_up_in_background)
+from flask import Flask, Response, g, jsonify, request, send_file, stream_with_context
 from flask_cors import CORS
+import io
 import os
 import re
 import json
-import requests
+import math
+import random
 import shutil
 import subprocess
+import time
+import uuid
+import itertools
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-from PyPDF2 import PdfReader
-from PIL import Image
-import pytesseract
-from groq import Groq
-import google.generativeai as genai
+from ai_cache import cache_from_env, make_key, ttl_for
+from diagram_cache import DiagramCache, concept_key
+from jobs import JobFailed, JobQueue
+from logs import log, set_request_id, with_request_id
+from metrics import REGISTRY, http_latency, http_requests, stage_timer
+from providers import AllProvidersFailed, Overloaded, chain_from_env, make_request, prompt_text
+from quiz_bank import BANK_BATCH, bank_from_env, parse_questions
+from rate_limit import BATCH, RateLimited, priority, retry_after_hint
+from retrieval import Retriever
+import scheduler
+from sections import (diff_topic_trees, merge_topic_trees, pack_units, plan_reuse,
+                      section_fingerprint, split_units)
+from topic_filter import filters_for, institution_key as normalize_institution
+from tutor_context import SUMMARY_TOKENS, ContextManager
+from upload_store import store_from_env as uploads_from_env
+from user_store import store_from_env
 
 load_dotenv()
 
 app = Flask(__name__)
-CORS(app)
+CORS(app, expose_headers=["X-Request-ID"])
+# Largest request body Flask will read (syllabus uploads included); bigger ones get a 413
+app.config["MAX_CONTENT_LENGTH"] = int(os.getenv("MAX_CONTENT_LENGTH", str(32 * 1024 * 1024)))
+
+# ── Request ids, access logs and HTTP metrics ───────────────
+@app.before_request
+def start_request():
+    g.start = time.perf_counter()
+    g.request_id = request.headers.get("X-Request-ID") or uuid.uuid4().hex
+    set_request_id(g.request_id)
+
+@app.after_request
+def finish_request(response):
+    elapsed = time.perf_counter() - g.get("start", time.perf_counter())
+    # Label by route pattern, not raw path, so job ids don't explode the series count
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    http_latency.observe(elapsed, route=route, method=request.method)
+    http_requests.inc(route=route, method=request.method, status=response.status_code)
+    response.headers["X-Request-ID"] = g.get("request_id", "")
+    if route != "/metrics":
+        log("request", method=request.method, route=route, status=response.status_code,
+            ms=round(elapsed * 1000, 1))
+    return response
+
+# Admission control (rate_limit.py) refused the call: tell the client when to come back
+@app.errorhandler(Overloaded)
+@app.errorhandler(RateLimited)
+def ai_overloaded(e):
+    retry_after = max(1, math.ceil(e.retry_after))
+    log("ai_overloaded", level="warning", retry_after=retry_after)
+    response = jsonify({"success": False, "message": "AI service is busy, please retry shortly.",
+                        "retry_after": retry_after})
+    response.headers["Retry-After"] = str(retry_after)
+    return response, 503
 
 @app.route("/")
 def home():
     return jsonify({"status": "ok", "message": "Backend running"})
 
-UPLOAD_FOLDER = "uploads"
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-
-if os.name == 'nt':  # Windows
-    pytesseract.pytesseract.tesseract_cmd = r"C:\Program Files\Tesseract-OCR\tesseract.exe"
-else:  # Render / Linux
-    pytesseract.pytesseract.tesseract_cmd = "/usr/bin/tesseract"
+# Uploads are stored by content hash; extraction results are memoized per hash (see upload_store.py)
+uploads = uploads_from_env("uploads")
+# Per-syllabus BM25 indexes, so doubt/tutor requests can send a syllabus id (see retrieval.py)
+retriever = Retriever(uploads)
 
 # ── API Clients ──────────────────────────────────────────────
-groq_client = Groq(api_key=os.getenv("GROQ_API_KEY"))
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+# Built lazily and reused per worker (see clients.py / providers.py)
+GROQ_MODEL = "llama-3.1-8b-instant"   # Free, very fast
+GEMINI_MODEL = "gemini-1.5-flash"
+
+# Groq first, Gemini as fallback (or hedge, with LLM_HEDGE_DELAY); see providers.py
+llm = chain_from_env(GROQ_MODEL, GEMINI_MODEL)
+
+# ── AI Result Cache ──────────────────────────────────────────
+ai_cache = cache_from_env()
+
+# Quiz variety: 0 keeps quizzes uncached ("random every time"); N > 0 spreads
+# requests over N cached quiz sets per syllabus.
+QUIZ_CACHE_BUCKETS = int(os.getenv("QUIZ_CACHE_BUCKETS", "0"))
+
+def quiz_cache_variant():
+    if QUIZ_CACHE_BUCKETS <= 0:
+        return None
+    return f"quiz-bucket-{random.randrange(QUIZ_CACHE_BUCKETS)}"
 
 # ── Unified AI Call: Groq first, Gemini as fallback ─────────
-def call_ai(prompt, system_prompt="You are a helpful assistant.", max_tokens=1024):
-    # 1. Try Groq first (fastest)
+def _cache_slot(task, use_cache, req, cache_variant):
+    """Returns (cache_key, ttl) for a call, or (None, 0) when it shouldn't be cached."""
+    ttl = ttl_for(task) if use_cache else 0
+    if ttl <= 0:
+        return None, 0
+    prompt = prompt_text(req) if req.messages is None else [prompt_text(req), req.messages]
+    key = make_key(f"{GROQ_MODEL}|{GEMINI_MODEL}", req.system_prompt, prompt,
+                   req.max_tokens, req.temperature, cache_variant)
+    return key, ttl
+
+def call_ai(prompt, system_prompt="You are a helpful assistant.", max_tokens=1024,
+            temperature=0.7, messages=None, task=None, use_cache=True, cache_variant=None):
+    """`messages` overrides the chat payload for chat providers (Groq); Gemini gets the prompt."""
+    req = make_request(prompt, system_prompt, max_tokens, temperature, messages)
+    cache_key, ttl = _cache_slot(task, use_cache, req, cache_variant)
+    if cache_key:
+        cached = ai_cache.get(cache_key, task=task)
+        if cached is not None:
+            return cached
+
     try:
-        response = groq_client.chat.completions.create(
-            model="llama-3.1-8b-instant",   # Free, very fast
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user",   "content": prompt}
-            ],
-            max_tokens=max_tokens,
-            temperature=0.7
-        )
-        return response.choices[0].message.content
-    except Exception as e:
-        print(f"Groq failed: {e}, falling back to Gemini...")
+        provider, result = llm.complete(req)
+    except Overloaded:
+        raise  # answered as 503 + Retry-After, not as an empty result
+    except AllProvidersFailed as e:
+        log("ai_call_failed", level="error", task=task, errors=e.errors)
+        return None
+    if cache_key and result:
+        ai_cache.set(cache_key, result, ttl, task=task)
+    return result
+
+# ── Streaming variant: yields (provider, text) chunks as they arrive ──
+def stream_ai(prompt, system_prompt="You are a helpful assistant.", max_tokens=1024,
+              temperature=0.7, messages=None, task=None, use_cache=True, cache_variant=None):
+    """Like call_ai, but a generator.
+
+    Falls back to the next provider only if the current one fails before
+    producing any text; a stream that breaks halfway raises so the caller can
+    report it.
+    """
+    req = make_request(prompt, system_prompt, max_tokens, temperature, messages)
+    cache_key, ttl = _cache_slot(task, use_cache, req, cache_variant)
+    if cache_key:
+        cached = ai_cache.get(cache_key, task=task)
+        if cached is not None:
+            yield "cache", cached
+            return
+
+    parts = []
+    for provider, text in llm.stream(req):
+        parts.append(text)
+        yield provider, text
+
+    if cache_key and parts:
+        ai_cache.set(cache_key, "".join(parts), ttl, task=task)
+
+
+def wants_stream(data):
+    return bool(data.get("stream")) or request.args.get("stream") in ("1", "true")
+
 
-    # 2. Fallback to Gemini
+def sse_event(payload, name=None):
+    prefix = f"event: {name}\n" if name else ""
+    return f"{prefix}data: {json.dumps(payload)}\n\n"
+
+
+def sse_done(provider, first_token, total):
+    log("ai_stream", provider=provider, ttft_ms=round(first_token * 1000, 1),
+        total_ms=round(total * 1000, 1))
+    return sse_event({
+        "success": True,
+        "provider": provider,
+        "ttft_ms": round(first_token * 1000, 1),
+        "total_ms": round(total * 1000, 1)
+    }, "done")
+
+
+def sse_response(chunks, unavailable_message="AI service unavailable."):
+    """Streams (provider, text) chunks as Server-Sent Events.
+
+    Each chunk becomes a `data: {"token": ...}` event. The stream ends with
+    an `event: done` carrying time-to-first-token and total time, or with an
+    `event: error`. The first chunk is fetched before the response starts, so
+    an Overloaded chain still becomes a plain 503.
+    """
+    start = time.perf_counter()
+    chunks = iter(chunks)
+    head = []
+    failure = None
     try:
-        model = genai.GenerativeModel("gemini-1.5-flash")
-        full_prompt = f"{system_prompt}\n\n{prompt}"
-        response = model.generate_content(full_prompt)
-        return response.text
+        head.append(next(chunks))
+    except StopIteration:
+        pass
+    except Overloaded:
+        raise
     except Exception as e:
-        print(f"Gemini failed: {e}")
-        return None
+        failure = e
+
+    def generate():
+        first_token = None
+        provider = None
+        try:
+            if failure is not None:
+                raise failure
+            for provider, text in itertools.chain(head, chunks):
+                if first_token is None:
+                    first_token = time.perf_counter() - start
+                yield sse_event({"token": text})
+        except Exception as e:
+            log("ai_stream_failed", level="error", error=str(e))
+            yield sse_event({"success": False, "message": unavailable_message}, "error")
+            return
+
+        if first_token is None:
+            yield sse_event({"success": False, "message": unavailable_message}, "error")
+            return
+        yield sse_done(provider, first_token, time.perf_counter() - start)
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 def ocr_with_gemini(img):
     """Uses Gemini 1.5 Flash to extract text from images (OCR)."""
+    if llm.limiter:
+        llm.limiter.acquire("gemini")  # RateLimited propagates: the upload gets a 503
     try:
-        model = genai.GenerativeModel("gemini-1.5-flash")
+        model = gemini_model(GEMINI_MODEL)
         if img.mode != "RGB":
             img = img.convert("RGB")
         
@@ -75,37 +241,41 @@ def ocr_with_gemini(img):
         ])
         return response.text, None
     except Exception as e:
-        print(f"Gemini OCR failed: {e}")
+        log("gemini_ocr_failed", level="warning", error=str(e))
         return "", str(e)
 
 
+def ocr_pdf_images_with_gemini(images):
+    """OCR fallback for scanned PDF pages that Tesseract couldn't read."""
+    texts = []
+    for data in images:
+        text, _ = ocr_with_gemini(pil_image.open(io.BytesIO(data)))
+        if text:
+            texts.append(text)
+    return "\n".join(texts)
+
+
 # ── Syllabus Cleaning ────────────────────────────────────────
-def clean_syllabus_text(text):
-    lines = text.split("\n")
-    cleaned = []
-    blacklist_keywords = [
-        "mark", "score", "credit", "weightage", "hour", "exam", "internal",
-        "external", "total", "pattern", "duration", "question paper", "allotment",
-        "time", "minute", "mins", "hrs", "maximum", "minimum", "sec", "section",
-        "objective", "instruction", "rule", "administrative", "policy", "grade", 
-        "grading", "assignment", "project", "presentation", "attendance", "participation",
-        "syllabus", "course", "description", "outcome", "prerequisite", "textbook",
-        "reference", "material", "university", "department", "faculty", "student"
-    ]
-    for line in lines:
-        line = line.strip()
-        if len(line) < 4:
-            continue
-        if any(kw in line.lower() for kw in blacklist_keywords):
-            continue
-        line = re.sub(r"^[0-9.\-\s]+", "", line)
-        if len(line) > 3:
-            cleaned.append(line)
-    return "\n".join(cleaned)
+def clean_syllabus_text(text, institution=None):
+    """Drops administrative lines (marks, credits, hours...) and leading numbering."""
+    return filters_for(institution).clean_document(text)
 
 
 # ── Topic Extraction ─────────────────────────────────────────
-def generate_structured_topics(text):
+# Long syllabi are split at unit/chapter headings into TOPIC_CHUNK_CHARS chunks,
+# extracted concurrently (at most TOPIC_MAX_CONCURRENCY LLM calls at once,
+# across all uploads) and merged back in document order. Each chunk's topics
+# are kept with its section fingerprints, so a revised syllabus only sends
+# the sections that changed (see sections.plan_reuse).
+TOPIC_CHUNK_CHARS = int(os.getenv("TOPIC_CHUNK_CHARS", "4000"))
+TOPIC_MAX_CHUNKS = int(os.getenv("TOPIC_MAX_CHUNKS", "20"))
+TOPIC_MAX_CONCURRENCY = int(os.getenv("TOPIC_MAX_CONCURRENCY", "4"))
+
+topic_executor = ThreadPoolExecutor(max_workers=TOPIC_MAX_CONCURRENCY, thread_name_prefix="topics")
+
+def extract_topics_from_chunk(text):
+    """Returns (topics, degraded). degraded is True when no provider gave usable
+    JSON and the topics are the raw-line fallback, which must not be memoized."""
     prompt = f"""Extract ONLY the core academic subject topics and their relevant sub-topics from the following syllabus text.
 
 STRICT RULES:
@@ -118,11 +288,12 @@ STRICT RULES:
    ]
 
 Syllabus Content:
-{text[:4000]}"""
+{text[:TOPIC_CHUNK_CHARS]}"""
 
     result = call_ai(
         prompt=prompt,
-        system_prompt="You are a Curriculum Analyst. Extract structured academic topics and return only valid JSON."
+        system_prompt="You are a Curriculum Analyst. Extract structured academic topics and return only valid JSON.",
+        task="topics"
     )
 
     if result:
@@ -131,13 +302,54 @@ Syllabus Content:
             try:
                 parsed = json.loads(json_match.group(0))
                 if isinstance(parsed, list) and len(parsed) > 0:
-                    return parsed
+                    return parsed, False
             except Exception:
                 pass
 
     # Fallback: simple line extraction
     raw_lines = [line.strip() for line in text.split("\n") if len(line.strip()) > 5]
-    return [{"topic": line, "subtopics": []} for line in raw_lines if len(line.split()) <= 10]
+    return [{"topic": line, "subtopics": []} for line in raw_lines if len(line.split()) <= 10], True
+
+
+def generate_structured_topics(text, previous_groups=None):
+    """Returns (topics, groups, stats).
+
+    groups is the section map to store with the result:
+    [{"sections": [fingerprint, ...], "topics": [...]}, ...] in document
+    order. Chunks of previous_groups whose sections are all unchanged are
+    reused without an LLM call. stats["degraded_chunks"] counts chunks that
+    fell back to raw lines because no provider answered.
+    """
+    units = split_units(text, TOPIC_CHUNK_CHARS)
+    fingerprints = [section_fingerprint(unit) for unit in units]
+    steps = []  # a reused group, or the section indexes of a chunk to extract
+    for kind, value in plan_reuse(fingerprints, previous_groups):
+        if kind == "reuse":
+            steps.append(value)
+        else:
+            steps.extend([value[k] for k in chunk]
+                         for chunk in pack_units([units[i] for i in value], TOPIC_CHUNK_CHARS))
+
+    pending = [n for n, step in enumerate(steps)
+               if isinstance(step, list) and "".join(units[i] for i in step).strip()]
+    if len(pending) > TOPIC_MAX_CHUNKS:
+        log("topic_chunks_truncated", chunks=len(pending), kept=TOPIC_MAX_CHUNKS)
+        pending = pending[:TOPIC_MAX_CHUNKS]
+    chunks = ["\n".join(units[i] for i in steps[n]) for n in pending]
+    # map() keeps chunk order, so the merge is deterministic however calls finish.
+    extracted = dict(zip(pending, topic_executor.map(with_request_id(extract_topics_from_chunk), chunks)))
+    degraded = sum(1 for _, fell_back in extracted.values() if fell_back)
+
+    groups = []
+    for n, step in enumerate(steps):
+        if isinstance(step, dict):
+            groups.append(step)
+        elif n in extracted:
+            groups.append({"sections": [fingerprints[i] for i in step], "topics": extracted[n][0]})
+    stats = {"sections": len(units), "reused_chunks": len(groups) - len(extracted),
+             "extracted_chunks": len(extracted), "degraded_chunks": degraded}
+    topics = merge_topic_trees([group["topics"] for group in groups], normalize=clean_topic_name)
+    return topics, groups, stats
 
 
 # ── Topic Name Cleaning ──────────────────────────────────────
@@ -157,77 +369,147 @@ def clean_topic_name(name):
 
 
 # ── Routes ───────────────────────────────────────────────────
-users = {}
+# Users and sessions persist in SQLite by default, shared by all workers (see user_store.py)
+users = store_from_env()
 
 @app.route("/health", methods=["GET"])
 def health():
     return jsonify({"status": "ok", "message": "Study Flow backend running"})
 
+def credentials(data):
+    """(email, password) from a JSON body, or None unless both are non-empty strings."""
+    if not isinstance(data, dict):
+        return None
+    email, password = data.get("email"), data.get("password")
+    if not (isinstance(email, str) and email and isinstance(password, str) and password):
+        return None
+    return email, password
+
 @app.route("/register", methods=["POST"])
 def register():
-    data = request.json
-    email = data.get("email")
-    password = data.get("password")
-    if not email or not password:
+    fields = credentials(request.get_json(silent=True))
+    if fields is None:
         return jsonify({"success": False, "message": "Missing fields"}), 400
-    if email in users:
+    email, password = fields
+    if not users.register(email, password):
         return jsonify({"success": False, "message": "User already exists"}), 409
-    users[email] = password
     return jsonify({"success": True})
 
 @app.route("/login", methods=["POST"])
 def login():
-    data = request.json
-    email = data.get("email")
-    password = data.get("password")
-    if users.get(email) != password:
+    fields = credentials(request.get_json(silent=True))
+    if fields is None or not users.authenticate(*fields):
         return jsonify({"success": False, "message": "Invalid credentials"}), 401
+    email = fields[0]
+    return jsonify({"success": True, "token": users.create_session(email)})
+
+def session_token():
+    header = request.headers.get("Authorization", "")
+    if header.startswith("Bearer "):
+        return header[len("Bearer "):].strip()
+    return None
+
+@app.route("/session", methods=["GET"])
+def session():
+    email = users.session_email(session_token())
+    if not email:
+        return jsonify({"success": False, "message": "Not logged in"}), 401
+    return jsonify({"success": True, "email": email})
+
+@app.route("/logout", methods=["POST"])
+def logout():
+    token = session_token()
+    if token:
+        users.end_session(token)
     return jsonify({"success": True})
 
 
-@app.route("/upload-syllabus", methods=["POST"])
-def upload_syllabus():
+# ── Syllabus Pipeline ────────────────────────────────────────
+def extract_text(filepath, filename):
+    """Returns (extracted_text, gemini_error) for a saved PDF or image upload."""
+    extracted_text = ""
+    gemini_error = None
+    if filename.lower().endswith(".pdf"):
+        with stage_timer("pdf"):
+            extracted_text = pdf_extract.extract_pdf_text(filepath, fallback_ocr=ocr_pdf_images_with_gemini)
+        return extracted_text, gemini_error
+
+    # ── Tesseract OCR (tiled + preprocessed, see ocr.py) ──────
     try:
-        file = request.files["file"]
-        filepath = os.path.join("uploads", file.filename)
-        file.save(filepath)
+        with stage_timer("ocr_tesseract"):
+            text = ocr.ocr_image_file(filepath)
+        if text and len(text.strip()) > 50:
+            extracted_text = text
+    except Exception as e:
+        log("tesseract_failed", level="warning", error=str(e))
+
+    # ── Fallback to Gemini AI if Tesseract failed or was missing ──
+    if not extracted_text or len(extracted_text.strip()) < 10:
+        log("ocr_fallback", provider="gemini")
+        with stage_timer("ocr_gemini"), pil_image.open(filepath) as image:
+            extracted_text, gemini_error = ocr_with_gemini(image)
+    return extracted_text, gemini_error
+
+
+def filter_topics(topics_raw, institution=None):
+    filters = filters_for(institution)
+    final_topics = []
+
+    for item in topics_raw:
+        main_topic = item.get("topic", "").strip()
+        main_topic = clean_topic_name(main_topic)
+
+        if main_topic and len(main_topic.split()) <= 10 and not filters.is_forbidden(main_topic):
+            subtopics = []
+            for s in item.get("subtopics", []):
+                s = clean_topic_name(s.strip())
+                if s and len(s.split()) <= 10 and not filters.is_forbidden(s):
+                    subtopics.append(s)
+
+            final_topics.append({"topic": main_topic, "subtopics": subtopics})
+    return final_topics
+
+
+def with_topic_diff(payload, base_id, institution_key):
+    """Adds the topic-tree diff against an earlier version (None if that one is unknown)."""
+    if not base_id:
+        return payload
+    base = uploads.memo(base_id, "result", institution_key)
+    payload["base_syllabus_id"] = base_id
+    payload["diff"] = diff_topic_trees(base["topics"], payload["topics"]) if base else None
+    return payload
 
-        extracted_text = ""
+
+def process_syllabus(upload, on_stage=None, institution=None, base_id=None):
+    """Runs extraction -> cleaning -> structuring for a StoredUpload. Returns (payload, http_status).
+
+    Results are memoized against the upload's content hash, so a known
+    syllabus skips OCR and LLM work. base_id is the syllabus_id of an earlier
+    version: its unchanged sections are reused, and the payload carries a
+    diff of the topic tree against it.
+    """
+    def stage(name):
+        if on_stage:
+            on_stage(name)
+
+    # One canonical name for the filters and the memo key, so they can't disagree
+    institution_key = normalize_institution(institution)
+    institution = institution_key or None
+    memo = uploads.memo(upload.digest, "result", institution_key)
+    if memo is not None:
+        log("syllabus_memo_hit", digest=upload.digest)
+        retriever.get(upload.digest, memo["text"])  # indexes results memoized before retrieval existed
+        payload = {"success": True, "syllabus_id": upload.digest, "cached": True, **memo}
+        return with_topic_diff(payload, base_id, institution_key), 200
+
+    try:
+        stage("extracting")
+        extracted_text = uploads.memo(upload.digest, "raw")
         gemini_error = None
-        if file.filename.lower().endswith(".pdf"):
-            reader = PdfReader(filepath)
-            for page in reader.pages:
-                extracted_text += page.extract_text() or ""
-        else:
-            # ── Image processing with preprocessing ──────────────
-            try:
-                image = Image.open(filepath)
-                image = image.convert("RGB")
-                
-                width, height = image.size
-                if width < 1000:
-                    scale = 1000 / width
-                    image = image.resize(
-                        (int(width * scale), int(height * scale)), 
-                        Image.LANCZOS
-                    )
-                
-                # Try Tesseract if configured
-                try:
-                    text = pytesseract.image_to_string(image, config="--psm 3")
-                    if text and len(text.strip()) > 50:
-                        extracted_text = text
-                except Exception as e:
-                    print(f"Tesseract failed: {e}")
-            except Exception as e:
-                print(f"Initial image processing failed: {e}")
-
-            # ── Fallback to Gemini AI if Tesseract failed or was missing ──
-            if not extracted_text or len(extracted_text.strip()) < 10:
-                print("Tesseract failed or missing, using Gemini AI...")
-                if 'image' not in locals():
-                    image = Image.open(filepath)
-                extracted_text, gemini_error = ocr_with_gemini(image)
+        if extracted_text is None:
+            extracted_text, gemini_error = extract_text(upload.path, upload.filename)
+            if extracted_text and len(extracted_text.strip()) >= 10:
+                uploads.remember(upload.digest, "raw", extracted_text)
 
         if not extracted_text or len(extracted_text.strip()) < 10:
             error_msg = "Could not extract text."
@@ -235,66 +517,181 @@ def upload_syllabus():
                 error_msg += f" AI Error: {gemini_error}"
             else:
                 error_msg += f" (AI returned: '{extracted_text[:50]}')"
-            return jsonify({
-                "success": False, 
+            return {
+                "success": False,
                 "message": error_msg + " Please try a clearer image or PDF."
-            }), 400
+            }, 400
+
+        stage("cleaning")
+        with stage_timer("clean"):
+            cleaned_text = clean_syllabus_text(extracted_text, institution)
+        stage("structuring")
+        previous_groups = uploads.memo(base_id, "sections", institution_key) if base_id else None
+        with stage_timer("structure"):
+            topics_raw, groups, section_stats = generate_structured_topics(cleaned_text, previous_groups)
+    except (Overloaded, RateLimited):
+        raise
+    except Exception as e:
+        log("syllabus_failed", level="error", filename=upload.filename, error=str(e))
+        return {"success": False, "message": f"Syllabus processing failed: {str(e)}"}, 500
+
+    result = {"topics": filter_topics(topics_raw, institution), "text": cleaned_text}
+    if section_stats["degraded_chunks"]:
+        # Fallback topics from a provider outage: serve them, but let a re-upload retry
+        log("syllabus_degraded", level="warning", digest=upload.digest,
+            chunks=section_stats["degraded_chunks"])
+    else:
+        uploads.remember(upload.digest, "result", result, institution_key)
+        uploads.remember(upload.digest, "sections", groups, institution_key)
+    with stage_timer("index"):
+        retriever.build(upload.digest, cleaned_text)
+    if base_id:
+        log("syllabus_incremental", digest=upload.digest, base=base_id, **section_stats)
+    if DIAGRAM_PRERENDER:
+        prerender_diagrams(result["topics"])
+    if QUIZ_BANK:
+        quiz_bank.top_up(upload.digest)
+    payload = {"success": True, "syllabus_id": upload.digest, "cached": False,
+               "sections": section_stats, **result}
+    return with_topic_diff(payload, base_id, institution_key), 200
+
+
+# ── Background syllabus jobs ─────────────────────────────────
+# UPLOAD_MODE=job makes /upload-syllabus answer 202 + job id by default;
+# clients can still pick per request with ?mode=sync or ?mode=job.
+UPLOAD_MODE = os.getenv("UPLOAD_MODE", "sync")
+syllabus_jobs = JobQueue(
+    os.getenv("SYLLABUS_JOB_DB", os.path.join("cache", "jobs.sqlite3")),
+    max_workers=int(os.getenv("SYLLABUS_WORKERS", "2")),
+    retention=int(os.getenv("SYLLABUS_JOB_RETENTION", "3600")),
+    # A job whose worker stops heartbeating for this long is reported as failed
+    stale_after=int(os.getenv("SYLLABUS_JOB_STALE_AFTER", "120"))
+)
+
+def run_syllabus_job(job, upload, institution=None, base_id=None):
+    try:
+        # Nobody is blocked on a background job, so it yields to interactive calls
+        with priority(BATCH):
+            payload, status = process_syllabus(upload, on_stage=job.set_stage,
+                                               institution=institution, base_id=base_id)
+    except (Overloaded, RateLimited) as e:
+        raise JobFailed(f"AI service is busy, retry in {math.ceil(e.retry_after)}s")
+    if status != 200:
+        raise JobFailed(payload.get("message", "Syllabus processing failed"))
+    return payload
 
-        cleaned_text = clean_syllabus_text(extracted_text)
-        topics_raw = generate_structured_topics(cleaned_text)
+
+@app.route("/upload-syllabus", methods=["POST"])
+def upload_syllabus():
+    try:
+        file = request.files["file"]
+        # Streamed to a private temp file while hashing, then stored by content hash
+        with stage_timer("save"):
+            upload = uploads.save(file.stream, file.filename)
     except Exception as e:
-        print(f"Critical extraction error: {e}")
+        log("upload_save_failed", level="error", error=str(e))
         return jsonify({"success": False, "message": f"Syllabus processing failed: {str(e)}"}), 500
 
-    forbidden = ["mark", "score", "credit", "weightage", "hour", "exam",
-                 "internal", "external", "total", "time", "hrs", "mins"]
-    final_topics = []
+    mode = request.args.get("mode") or request.form.get("mode") or UPLOAD_MODE
+    institution = request.form.get("institution") or None
+    # syllabus_id of the previous version, for incremental re-processing
+    base_id = (request.form.get("base_syllabus_id") or "").strip().lower() or None
+    if base_id and not re.fullmatch(r"[0-9a-f]{64}", base_id):
+        return jsonify({"success": False, "message": "Invalid base_syllabus_id"}), 400
+    if mode == "job":
+        job_id = syllabus_jobs.submit(run_syllabus_job, upload, institution, base_id)
+        return jsonify({
+            "success": True,
+            "job_id": job_id,
+            "status": "queued",
+            "status_url": f"/upload-syllabus/jobs/{job_id}"
+        }), 202
 
-    for item in topics_raw:
-        main_topic = item.get("topic", "").strip()
-        main_topic = clean_topic_name(main_topic)
-        
-        if main_topic and len(main_topic.split()) <= 10 and not any(f in main_topic.lower() for f in forbidden):
-            subtopics = []
-            for s in item.get("subtopics", []):
-                s = clean_topic_name(s.strip())
-                if s and len(s.split()) <= 10 and not any(f in s.lower() for f in forbidden):
-                    subtopics.append(s)
-            
-            final_topics.append({"topic": main_topic, "subtopics": subtopics})
+    payload, status = process_syllabus(upload, institution=institution, base_id=base_id)
+    return jsonify(payload), status
 
-    return jsonify({"success": True, "topics": final_topics, "text": cleaned_text})
 
+@app.route("/upload-syllabus/jobs/<job_id>", methods=["GET"])
+def upload_syllabus_job(job_id):
+    job = syllabus_jobs.get(job_id)
+    if job is None:
+        return jsonify({"success": False, "message": "Unknown job id"}), 404
+    return jsonify({"success": job["status"] != "failed", **job})
 
-@app.route("/ai-assistant", methods=["POST"])
-def ai_assistant():
-    data = request.json
-    task = data.get("task")
-    content = data.get("content")
-    syllabus_context = data.get("syllabusContext", "")
 
-    if task == "summary":
-        system = "You are a professional academic assistant. Create clear, structured study guides."
-        prompt = f"""Analyze the following syllabus and create a comprehensive study guide.
+# ── Study schedules (same layout as frontend/src/utils/scheduler.js) ──
+SCHEDULE_BULK_MAX = int(os.getenv("SCHEDULE_BULK_MAX", "5000"))
 
-YOUR RESPONSE SHOULD INCLUDE:
-1. CONCEPT EXPLANATION: A brief overview of the main subjects.
-2. KEY POINTS: The most important theories or laws mentioned.
-3. IMPORTANT SUBTOPICS: Core chapters to focus on.
-4. MEMORY TIPS: Mnemonics or simple ways to remember complex parts.
-5. FAST REVISION NOTES: Bullet points for quick reading before an exam.
+@app.route("/schedule", methods=["POST"])
+def schedule():
+    data = request.json or {}
+    topics = data.get("topics")
+    if not isinstance(topics, list) or not topics:
+        return jsonify({"success": False, "message": "No topics provided"}), 400
+    try:
+        study_hours = scheduler.parse_study_hours(data.get("studyHours", 4))
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+    try:
+        tasks = scheduler.generate_tasks(topics, study_hours, data.get("startTime", "09:00"),
+                                         data.get("startDate"))
+    except (TypeError, ValueError, AttributeError) as e:
+        return jsonify({"success": False, "message": f"Invalid schedule request: {e}"}), 400
+    return jsonify({"success": True, "tasks": tasks, **scheduler.plan_summary(tasks, data.get("examDate"))})
 
-FORMATTING:
-- Use '-' for bullet points
-- Use **bold** for key section titles
-- Use __underline__ for critical concepts
 
-SYLLABUS CONTENT:
-{content[:3000]}"""
+@app.route("/schedule/reschedule", methods=["POST"])
+def schedule_reschedule():
+    """Moves missed sessions forward for many plans at once, e.g. from a nightly job.
 
-    elif task == "quiz":
-        system = "You are an expert quiz creator. Return only valid JSON, no extra text."
-        prompt = f"""Generate 5 UNIQUE and RANDOM multiple choice questions based on this syllabus content.
+    Body: {"today": "YYYY-MM-DD" (optional), "plans": [{"id", "tasks",
+    "studyHours", "startTime"}, ...]}. Plans with nothing missed come back
+    with rescheduled false and no tasks.
+    """
+    data = request.json or {}
+    plans = data.get("plans")
+    if not isinstance(plans, list) or not plans:
+        return jsonify({"success": False, "message": "No plans provided"}), 400
+    if len(plans) > SCHEDULE_BULK_MAX:
+        return jsonify({"success": False, "message": f"At most {SCHEDULE_BULK_MAX} plans per call"}), 400
+    try:
+        today = scheduler.parse_date(data.get("today"))
+    except ValueError:
+        return jsonify({"success": False, "message": "Invalid date for today"}), 400
+
+    results = []
+    rescheduled_count = 0
+    for plan in plans:
+        plan = plan if isinstance(plan, dict) else {}
+        try:
+            # Checked up front, even for plans with nothing missed
+            study_hours = scheduler.parse_study_hours(plan.get("studyHours", 4))
+            tasks, rescheduled = scheduler.reschedule_missed(
+                plan.get("tasks") or [], study_hours, plan.get("startTime", "09:00"), today)
+        except (TypeError, ValueError, AttributeError) as e:
+            results.append({"id": plan.get("id"), "success": False, "message": f"Invalid plan: {e}"})
+            continue
+        rescheduled_count += rescheduled
+        results.append({"id": plan.get("id"), "success": True, "rescheduled": rescheduled,
+                        "tasks": tasks if rescheduled else None})
+    return jsonify({"success": True, "results": results,
+                    "stats": {"plans": len(plans), "rescheduled": rescheduled_count}})
+
+
+# ── AI Assistant prompt templates ───────────────────────────
+DOUBT_INSTRUCTIONS = """INSTRUCTIONS:
+- Explain clearly and professionally.
+- Use '-' for bullet points.
+- Use **bold** for important terms.
+- If not in syllabus context, provide a general explanation and note it."""
+
+def quiz_prompt(content, count=5, avoid=()):
+    """(system, prompt) asking for count questions in the quiz JSON schema (see quiz_bank.py)."""
+    system = "You are an expert quiz creator. Return only valid JSON, no extra text."
+    avoid_text = "".join(f"\n- {question}" for question in avoid)
+    if avoid_text:
+        avoid_text = f"\n\nDO NOT REPEAT OR REPHRASE THESE EXISTING QUESTIONS:{avoid_text}"
+    prompt = f"""Generate {count} UNIQUE and RANDOM multiple choice questions based on this syllabus content.
 Make sure the questions are different every time to ensure variety.
 
 STRICT CONSTRAINTS:
@@ -309,10 +706,36 @@ STRICT CONSTRAINTS:
     "answer": "A",
     "explanation": "..."
   }}
-]
+]{avoid_text}
 
 SYLLABUS CONTENT:
 {content[:4000]}"""
+    return system, prompt
+
+
+def assistant_prompt(task, content, syllabus_context=""):
+    """Returns (system, prompt) for an /ai-assistant task, or None if the task is unknown."""
+    if task == "summary":
+        system = "You are a professional academic assistant. Create clear, structured study guides."
+        prompt = f"""Analyze the following syllabus and create a comprehensive study guide.
+
+YOUR RESPONSE SHOULD INCLUDE:
+1. CONCEPT EXPLANATION: A brief overview of the main subjects.
+2. KEY POINTS: The most important theories or laws mentioned.
+3. IMPORTANT SUBTOPICS: Core chapters to focus on.
+4. MEMORY TIPS: Mnemonics or simple ways to remember complex parts.
+5. FAST REVISION NOTES: Bullet points for quick reading before an exam.
+
+FORMATTING:
+- Use '-' for bullet points
+- Use **bold** for key section titles
+- Use __underline__ for critical concepts
+
+SYLLABUS CONTENT:
+{content[:3000]}"""
+
+    elif task == "quiz":
+        system, prompt = quiz_prompt(content)
 
     elif task == "doubt":
         system = "You are a helpful academic tutor. Explain concepts clearly using the provided context."
@@ -322,39 +745,327 @@ SYLLABUS CONTENT:
 EXPLAIN THIS CONCEPT:
 {content}
 
-INSTRUCTIONS:
-- Explain clearly and professionally.
-- Use '-' for bullet points.
-- Use **bold** for important terms.
-- If not in syllabus context, provide a general explanation and note it."""
+{DOUBT_INSTRUCTIONS}"""
 
     else:
+        return None
+    return system, prompt
+
+
+def assistant_cache_options(task):
+    cache_options = {"task": task}
+    if task == "quiz":
+        variant = quiz_cache_variant()
+        cache_options.update(use_cache=variant is not None, cache_variant=variant)
+    return cache_options
+
+
+class UnknownSyllabus(Exception):
+    """The request names a syllabusId with no index here and sent no syllabus text."""
+
+
+# The client resends the request with its syllabusContext
+UNKNOWN_SYLLABUS = {"success": False, "code": "unknown_syllabus",
+                    "message": "Unknown syllabus, send the syllabus text."}
+
+@app.errorhandler(UnknownSyllabus)
+def unknown_syllabus(e):
+    return jsonify(UNKNOWN_SYLLABUS), 409
+
+
+def syllabus_context_for(data, query, fallback=""):
+    """Passages relevant to query when the request names a syllabusId; otherwise (or if
+    that syllabus is unknown here) the syllabusContext the client sent. Raises
+    UnknownSyllabus if there is neither."""
+    syllabus_id = data.get("syllabusId")
+    context = data.get("syllabusContext", fallback) or ""
+    if syllabus_id:
+        retrieved = retriever.context(str(syllabus_id).lower(), query)
+        if retrieved is not None:
+            return retrieved
+        if not context:
+            raise UnknownSyllabus(syllabus_id)
+    return context
+
+
+ASSISTANT_UNAVAILABLE = "AI service unavailable. Check your API keys."
+
+def assistant_call(data):
+    """call_ai / stream_ai keyword arguments for an /ai-assistant body, or None for an
+    unknown task. Shared with the async routes in asgi.py."""
+    task = data.get("task")
+    content = data.get("content")
+    if task == "doubt":
+        syllabus_context = syllabus_context_for(data, content or "")
+    else:
+        syllabus_context = data.get("syllabusContext", "")
+        if not content and data.get("syllabusId"):
+            # Summary and quiz work on the whole syllabus: use the stored text
+            index = retriever.get(str(data["syllabusId"]).lower())
+            if index is not None:
+                content = "\n".join(index.passages)
+            elif not syllabus_context:
+                raise UnknownSyllabus(data["syllabusId"])
+        # ...or the syllabus text the client sent along
+        content = content or syllabus_context
+
+    prompts = assistant_prompt(task, content, syllabus_context)
+    if prompts is None:
+        return None
+    system, prompt = prompts
+    return dict(prompt=prompt, system_prompt=system, max_tokens=1500, **assistant_cache_options(task))
+
+
+# ── Quiz bank ────────────────────────────────────────────────
+# Quizzes for an uploaded syllabus are sampled from questions generated ahead
+# of time (see quiz_bank.py). QUIZ_BANK=0 generates every quiz live.
+QUIZ_BANK = os.getenv("QUIZ_BANK", "1") != "0"
+
+def generate_bank_questions(syllabus_id, avoid):
+    index = retriever.get(syllabus_id)
+    if index is None or not index.passages:
+        return None
+    # Each batch starts at a random passage, so batches cover different units
+    start = random.randrange(len(index.passages))
+    content = "\n".join(index.passages[start:] + index.passages[:start])
+    system, prompt = quiz_prompt(content, BANK_BATCH, avoid)
+    with priority(BATCH):
+        return call_ai(prompt, system_prompt=system, max_tokens=2500, temperature=0.9,
+                       task="quiz_bank", use_cache=False)
+
+quiz_bank = bank_from_env(generate_bank_questions)
+
+def _bank_syllabus(data):
+    """The syllabus id of a quiz request the bank can serve, else None. A quiz on
+    content of the client's own is always generated live (and never banked)."""
+    syllabus_id = str(data.get("syllabusId") or "").lower()
+    if data.get("content"):
+        return None
+    if QUIZ_BANK and data.get("task") == "quiz" and re.fullmatch(r"[0-9a-f]{64}", syllabus_id):
+        return syllabus_id
+    return None
+
+def bank_quiz(data):
+    """An /ai-assistant answer sampled from the question bank, or None to generate live."""
+    syllabus_id = _bank_syllabus(data)
+    if syllabus_id is None:
+        return None
+    questions = quiz_bank.sample(syllabus_id, data.get("userId"))
+    if questions is None:
+        return None
+    # Same shape as a live answer: the client parses the JSON array in "response"
+    return {"success": True, "response": json.dumps(questions, ensure_ascii=False), "source": "bank"}
+
+def bank_live_quiz(data, result):
+    """Keeps the valid questions of a live quiz in the bank, as seen by this user."""
+    syllabus_id = _bank_syllabus(data)
+    if syllabus_id is None or not result:
+        return
+    questions = parse_questions(result)
+    quiz_bank.add(syllabus_id, questions)
+    quiz_bank.mark_seen(syllabus_id, data.get("userId"), questions)
+
+
+@app.route("/ai-assistant", methods=["POST"])
+def ai_assistant():
+    data = request.json
+    banked = None if wants_stream(data) else bank_quiz(data)
+    if banked:
+        return jsonify(banked)
+
+    call = assistant_call(data)
+    if call is None:
         return jsonify({"success": False})
 
-    result = call_ai(prompt=prompt, system_prompt=system, max_tokens=1500)
+    if wants_stream(data):
+        return sse_response(stream_ai(**call), ASSISTANT_UNAVAILABLE)
+
+    result = call_ai(**call)
 
     if result:
+        bank_live_quiz(data, result)
         return jsonify({"success": True, "response": result})
-    return jsonify({"success": False, "message": "AI service unavailable. Check your API keys."})
+    return jsonify({"success": False, "message": ASSISTANT_UNAVAILABLE})
+
+
+# ── Batch AI Assistant ───────────────────────────────────────
+# Short doubts that share a syllabus context are packed into one LLM call;
+# everything else runs as individual calls on a bounded pool.
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "50"))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+BATCH_PACK_SIZE = int(os.getenv("BATCH_PACK_SIZE", "4"))
+PACKABLE_CONTENT_CHARS = 300
+
+batch_executor = ThreadPoolExecutor(max_workers=BATCH_CONCURRENCY, thread_name_prefix="batch")
+
+def packed_doubt_prompt(concepts, syllabus_context):
+    """The doubt template, asking for several concepts at once with numbered answer markers."""
+    system = "You are a helpful academic tutor. Explain concepts clearly using the provided context."
+    numbered = "\n".join(f"{i}. {concept}" for i, concept in enumerate(concepts, 1))
+    prompt = f"""CONTEXT FROM SYLLABUS:
+{syllabus_context[:1500]}
+
+EXPLAIN EACH OF THESE CONCEPTS SEPARATELY:
+{numbered}
+
+{DOUBT_INSTRUCTIONS}
+- Start each explanation on its own line with the marker === N === (N is the concept number), then the explanation. No text before the first marker."""
+    return system, prompt
+
+
+def split_packed_answers(text, count):
+    """Maps concept number -> explanation from a packed response; missing numbers are omitted."""
+    answers = {}
+    parts = re.split(r"^\s*===\s*(\d+)\s*===\s*$", text or "", flags=re.MULTILINE)
+    for number, answer in zip(parts[1::2], parts[2::2]):
+        index = int(number)
+        if 1 <= index <= count and answer.strip():
+            answers[index] = answer.strip()
+    return answers
+
+
+def run_assistant_item(task, content, syllabus_context):
+    system, prompt = assistant_prompt(task, content, syllabus_context)
+    return call_ai(prompt=prompt, system_prompt=system, max_tokens=1500,
+                   **assistant_cache_options(task))
+
+
+def run_doubt_pack(concepts, syllabus_context):
+    """Returns one answer (or None) per concept; ones the model skipped are retried individually."""
+    system, prompt = packed_doubt_prompt(concepts, syllabus_context)
+    result = call_ai(prompt=prompt, system_prompt=system,
+                     max_tokens=min(4000, 700 * len(concepts)), task="doubt")
+    answers = split_packed_answers(result, len(concepts))
+    for i, concept in enumerate(concepts, 1):
+        if i not in answers:
+            system, prompt = assistant_prompt("doubt", concept, syllabus_context)
+            answers[i] = call_ai(prompt=prompt, system_prompt=system, max_tokens=1500, task="doubt")
+    return [answers[i] for i in range(1, len(concepts) + 1)]
+
+
+@app.route("/ai-assistant/batch", methods=["POST"])
+def ai_assistant_batch():
+    data = request.json or {}
+    items = data.get("items") or []
+    shared_context = data.get("syllabusContext", "")
+    if not isinstance(items, list) or not items:
+        return jsonify({"success": False, "message": "No items provided"}), 400
+    if len(items) > BATCH_MAX_ITEMS:
+        return jsonify({"success": False, "message": f"At most {BATCH_MAX_ITEMS} items per batch"}), 400
+
+    results = [None] * len(items)
+    unique = {}   # (task, content, context) -> indexes; identical items are computed once
+    for index, item in enumerate(items):
+        item = item if isinstance(item, dict) else {}
+        task = item.get("task")
+        content = item.get("content") or ""
+        if task == "doubt":
+            # Doubts naming a syllabus get their own retrieved passages, so they
+            # pack only with doubts that retrieve the same ones.
+            try:
+                context = syllabus_context_for({"syllabusId": data.get("syllabusId"), **item}, content,
+                                               shared_context)
+            except UnknownSyllabus:
+                results[index] = {"index": index, "task": task, **UNKNOWN_SYLLABUS}
+                continue
+        else:
+            context = item.get("syllabusContext", shared_context) or ""
+        if assistant_prompt(task, content, context) is None or not content:
+            results[index] = {"index": index, "task": task, "success": False,
+                              "message": "Unknown task or empty content"}
+            continue
+        unique.setdefault((task, content, context), []).append(index)
+
+    # Group short doubts by context into packs; everything else is a single call.
+    packs, singles, by_context = [], [], {}
+    for key in unique:
+        task, content, context = key
+        if task == "doubt" and len(content) <= PACKABLE_CONTENT_CHARS and BATCH_PACK_SIZE > 1:
+            by_context.setdefault(context, []).append(key)
+        else:
+            singles.append(key)
+    for keys in by_context.values():
+        for start in range(0, len(keys), BATCH_PACK_SIZE):
+            chunk = keys[start:start + BATCH_PACK_SIZE]
+            if len(chunk) == 1:
+                singles.extend(chunk)
+            else:
+                packs.append(chunk)
+
+    futures = {}
+    # Batch work queues behind interactive calls; with_request_id carries the
+    # priority onto the pool threads.
+    with priority(BATCH):
+        for key in singles:
+            futures[batch_executor.submit(with_request_id(run_assistant_item), *key)] = [key]
+        for chunk in packs:
+            concepts = [content for _, content, _ in chunk]
+            futures[batch_executor.submit(with_request_id(run_doubt_pack), concepts, chunk[0][2])] = chunk
+
+    for future, keys in futures.items():
+        try:
+            outcome = future.result()
+            answers = outcome if len(keys) > 1 else [outcome]
+        except Exception as e:
+            log("batch_item_failed", level="error", error=str(e))
+            answers = [None] * len(keys)
+        entries = [{"success": True, "response": answer} if answer
+                   else {"success": False, "message": "AI service unavailable."}
+                   for answer in answers]
+        for key, entry in zip(keys, entries):
+            for index in unique[key]:
+                results[index] = {"index": index, "task": key[0], **entry}
+
+    return jsonify({
+        "success": True,
+        "results": results,
+        "stats": {
+            "items": len(items),
+            "unique": len(unique),
+            "packed_calls": len(packs),
+            "single_calls": len(singles)
+        }
+    })
 
 
 # ── NEW: AI Tutor Endpoint ───────────────────────────────────
-@app.route("/ai-tutor", methods=["POST"])
-def ai_tutor():
-    data = request.json
+def summarize_conversation(previous_summary, transcript):
+    prompt = f"""Update the running summary of a tutoring session with the new turns below.
+Keep what the student has already understood, what confused them, and any open questions.
+Reply with the summary only, at most {SUMMARY_TOKENS * 3 // 4} words.
+
+Current summary:
+{previous_summary or "(none yet)"}
+
+New turns:
+{transcript}"""
+    with priority(BATCH):  # runs in the background; the tutor reply never waits on it
+        return call_ai(prompt, system_prompt="You summarize tutoring conversations accurately and briefly.",
+                       max_tokens=SUMMARY_TOKENS, temperature=0.3, task="tutor_summary")
+
+tutor_contexts = ContextManager(ai_cache, summarize_conversation)
+
+def tutor_call(data):
+    """(call_ai / stream_ai keyword arguments, conversation id) for an /ai-tutor body.
+    Shared with the async routes in asgi.py."""
     topic = data.get("topic", "General")
     difficulty = data.get("difficulty", "Beginner")
     question = data.get("question", "")
     history = data.get("history", [])
 
-    history_text = ""
-    for msg in history[-6:]:
-        role_label = "Student" if msg["role"] == "user" else "Teacher"
-        history_text += f"{role_label}: {msg['content']}\n"
+    # Recent turns verbatim, older ones as a rolling summary (see tutor_context.py)
+    context = tutor_contexts.build(topic, history, data.get("conversation_id"))
+    log("tutor_context", conversation=context.conversation, tokens=context.tokens,
+        recent=len(context.recent), summarized=bool(context.summary))
 
     system = "You are an expert AI Teacher. Adapt your explanations based on the student's level. Always be clear, patient, and encouraging."
+    syllabus_context = syllabus_context_for(data, f"{topic} {question}")
+    if syllabus_context:
+        system += f"\n\nRelevant excerpts from the student's syllabus:\n{syllabus_context}"
 
-    prompt = f"""Topic: {topic}
+    # The flattened prompt is only built if a single-prompt provider (Gemini) is called
+    def prompt():
+        return f"""Topic: {topic}
 Student Level: {difficulty}
 
 TEACHING RULES:
@@ -365,50 +1076,44 @@ TEACHING RULES:
 - Use **bold** for key terms, '-' for bullet points.
 
 CONVERSATION SO FAR:
-{history_text}
+{context.history_text()}
 
 Student: {question}
 Teacher:"""
 
-    # For multi-turn chat, use Groq's full chat API for better context handling
-    try:
-        messages = [{"role": "system", "content": system}]
-        for msg in history[-6:]:
-            messages.append({
-                "role": "user" if msg["role"] == "user" else "assistant",
-                "content": msg["content"]
-            })
-        messages.append({"role": "user", "content": question})
-
-        response = groq_client.chat.completions.create(
-            model="llama-3.1-8b-instant",
-            messages=messages,
-            max_tokens=1024,
-            temperature=0.7
-        )
-        return jsonify({"success": True, "response": response.choices[0].message.content})
-    except Exception as e:
-        print(f"Groq tutor failed: {e}")
+    # For multi-turn chat, use Groq's full chat API for better context handling.
+    # Groq gets the chat messages, Gemini (fallback) gets the flattened prompt
+    messages = context.chat_messages(system, question)
+    return dict(prompt=prompt, system_prompt=system, messages=messages, task="tutor"), context.conversation
+
+
+@app.route("/ai-tutor", methods=["POST"])
+def ai_tutor():
+    data = request.json
+    call, conversation = tutor_call(data)
+
+    if wants_stream(data):
+        return sse_response(stream_ai(**call))
 
-    # Fallback to Gemini
-    result = call_ai(prompt=prompt, system_prompt=system)
+    result = call_ai(**call)
     if result:
-        return jsonify({"success": True, "response": result})
+        return jsonify({"success": True, "response": result, "conversation_id": conversation})
 
     return jsonify({"success": False, "message": "AI service unavailable."})
 
 
 import urllib.parse
 
-@app.route("/generate-image", methods=["POST"])
-def generate_image():
-    data = request.json
-    concept = data.get("concept", "")
-    context = data.get("context", "")
-
-    if not concept:
-        return jsonify({"success": False, "message": "No concept provided"})
+# Diagrams are cached on disk per normalized concept and served as bytes (see diagram_cache.py)
+diagrams = DiagramCache()
+DIAGRAM_PRERENDER = os.getenv("DIAGRAM_PRERENDER", "0") == "1"
+DIAGRAM_PRERENDER_MAX = int(os.getenv("DIAGRAM_PRERENDER_MAX", "30"))
+DIAGRAM_MAX_AGE = int(os.getenv("DIAGRAM_MAX_AGE", str(7 * 24 * 3600)))
+diagram_executor = ThreadPoolExecutor(max_workers=int(os.getenv("DIAGRAM_WORKERS", "1")),
+                                      thread_name_prefix="diagrams")
 
+def render_diagram(key, concept, context=""):
+    """Prompt rewrite -> Imagen -> Pollinations URL. Stores and returns the cache record."""
     # ── Step 1: Use Gemini to generate a smart image prompt ──────────
     prompt_for_prompt = f"""
     Create a short, precise image generation prompt (max 20 words) for a 
@@ -431,7 +1136,8 @@ def generate_image():
         result = call_ai(
             prompt=prompt_for_prompt,
             system_prompt="You are an expert at creating image generation prompts for educational diagrams.",
-            max_tokens=50
+            max_tokens=50,
+            task="image_prompt"
         )
         if result:
             # Clean up the prompt
@@ -439,12 +1145,13 @@ def generate_image():
             # Remove any extra sentences
             image_prompt = image_prompt.split(".")[0].strip()
     except Exception as e:
-        print(f"Prompt generation failed: {e}")
+        log("image_prompt_failed", level="warning", error=str(e))
 
     # ── Step 2: Try Gemini Image Generation ─────────────────────────
     try:
-        imagen_model = genai.ImageGenerationModel("imagen-3.0-generate-002")
-        response = imagen_model.generate_images(
+        if llm.limiter:
+            llm.limiter.acquire("imagen")  # when rate limited, go straight to the fallback
+        response = imagen_model("imagen-3.0-generate-002").generate_images(
             prompt=f"Educational diagram: {image_prompt}, clean white background, labeled, scientific illustration style",
             number_of_images=1,
             aspect_ratio="4:3",
@@ -452,40 +1159,77 @@ def generate_image():
             person_generation="dont_allow"
         )
         if response.generated_images:
-            import base64
             img_data = response.generated_images[0]._pil_image
-            import io
             buffer = io.BytesIO()
-            img_data.save(buffer, format="PNG")
-            img_base64 = base64.b64encode(buffer.getvalue()).decode()
-            return jsonify({
-                "success": True,
-                "image_url": None,
-                "image_base64": f"data:image/png;base64,{img_base64}",
-                "prompt_used": image_prompt,
-                "source": "gemini"
-            })
+            img_data.save(buffer, format="PNG", optimize=True)
+            return diagrams.put(key, concept, image_prompt, "gemini", png=buffer.getvalue())
     except Exception as e:
-        print(f"Gemini image generation failed: {e}, trying fallback...")
+        retry_after = retry_after_hint(e)
+        if retry_after is not None and llm.limiter:
+            llm.limiter.penalize("imagen", retry_after)
+        log("imagen_failed", level="warning", error=str(e), fallback="pollinations")
 
     # ── Step 3: Fallback — Pollinations.ai (Free, No API Key) ───────
+    encoded_prompt = urllib.parse.quote(
+        f"educational diagram {image_prompt} clean white background labeled scientific"
+    )
+    # Seeded from the cache key (stable across workers) so browsers can cache the URL too
+    pollinations_url = f"https://image.pollinations.ai/prompt/{encoded_prompt}?width=800&height=600&nologo=true&seed={int(key[:8], 16) % 9999}"
+    return diagrams.put(key, concept, image_prompt, "pollinations", image_url=pollinations_url)
+
+
+def cached_diagram(concept, context=""):
+    """Returns (key, record, cached). Concurrent requests for one concept render it once."""
+    key = concept_key(concept)
+    record, cached = diagrams.get_or_render(key, lambda: render_diagram(key, concept, context))
+    return key, record, cached
+
+
+def prerender_diagrams(topics):
+    """Background warm-up for a freshly uploaded syllabus; already cached topics are skipped."""
+    concepts = [item["topic"] for item in topics if item.get("topic")][:DIAGRAM_PRERENDER_MAX]
+    with priority(BATCH):
+        for concept in concepts:
+            diagram_executor.submit(with_request_id(cached_diagram), concept)
+
+
+@app.route("/generate-image", methods=["POST"])
+def generate_image():
+    data = request.json
+    concept = data.get("concept", "")
+    context = data.get("context", "")
+
+    if not concept or not concept_key(concept):
+        return jsonify({"success": False, "message": "No concept provided"})
+
     try:
-        encoded_prompt = urllib.parse.quote(
-            f"educational diagram {image_prompt} clean white background labeled scientific"
-        )
-        pollinations_url = f"https://image.pollinations.ai/prompt/{encoded_prompt}?width=800&height=600&nologo=true&seed={hash(concept) % 9999}"
-        
-        return jsonify({
-            "success": True,
-            "image_url": pollinations_url,
-            "image_base64": None,
-            "prompt_used": image_prompt,
-            "source": "pollinations"
-        })
+        key, record, cached = cached_diagram(concept, context)
     except Exception as e:
-        print(f"Pollinations fallback failed: {e}")
+        log("diagram_failed", level="error", error=str(e))
+        return jsonify({"success": False, "message": "Image generation failed"})
+
+    return jsonify({
+        "success": True,
+        # Relative for diagrams this backend serves; the frontend prefixes BACKEND_URL
+        "image_url": f"/diagrams/{key}.png?v={record['etag']}" if record["etag"] else record["image_url"],
+        "image_base64": None,
+        "prompt_used": record["prompt"],
+        "source": record["source"],
+        "cached": cached
+    })
+
 
-    return jsonify({"success": False, "message": "Image generation failed"})
+@app.route("/diagrams/<key>.png", methods=["GET"])
+def diagram_image(key):
+    record = diagrams.get(key) if re.fullmatch(r"[0-9a-f]{32}", key) else None
+    path = diagrams.image_path(key) if record and record["etag"] else None
+    if path is None:
+        return jsonify({"success": False, "message": "Unknown diagram"}), 404
+    # The ?v= query names the exact bytes, so browsers and CDNs may keep them a long time
+    response = send_file(os.path.abspath(path), mimetype="image/png", etag=record["etag"],
+                         conditional=True, max_age=DIAGRAM_MAX_AGE)
+    response.headers["Cache-Control"] = f"public, max-age={DIAGRAM_MAX_AGE}, immutable"
+    return response
 
 
 @app.route("/debug")
@@ -510,9 +1254,43 @@ def debug():
         "tesseract_version": tesseract_version.split("\n")[0] if tesseract_version else "error",
         "groq_key": bool(os.getenv("GROQ_API_KEY")),
         "gemini_key": bool(os.getenv("GEMINI_API_KEY")),
+        "ai_cache": ai_cache.stats(),
+        "uploads": uploads.stats(),
+        "llm": llm.stats(),
+        "quiz_bank": quiz_bank.stats(),
+        "startup": startup_report(),
         "os": os.name
     })
 
 
+# ── Prometheus metrics ───────────────────────────────────────
+@REGISTRY.collector
+def ai_cache_metrics():
+    stats = ai_cache.stats()
+    lookups = []
+    for task, counts in stats["tasks"].items():
+        for result in ("memory_hits", "disk_hits", "misses"):
+            lookups.append(({"task": task, "result": result}, counts.get(result, 0)))
+    return [
+        ("ai_cache_lookups_total", "counter", "AI cache lookups by task and result.", lookups),
+        ("ai_cache_entries", "gauge", "Entries in this worker's in-memory AI cache.",
+         [({}, stats["entries"])]),
+    ]
+
+@REGISTRY.collector
+def llm_circuit_metrics():
+    return [("llm_circuit_open", "gauge", "1 while a provider's circuit breaker is not closed.",
+             [({"provider": p.name}, int(p.breaker.state != "closed")) for p in llm.providers])]
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    return Response(REGISTRY.render(), mimetype="text/plain; version=0.0.4")
+
+
+mark_booted()
+if os.getenv("WARMUP_IMPORTS", "1") != "0":
+    warm_up_in_background()
+
+
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=10000)
@@ -0,0 +1,413 @@
+"""ASGI entry point: the AI routes on asyncio, every other route via the Flask app.
+
+Under gunicorn's sync/threaded workers, each /ai-tutor or /ai-assistant
+request holds a worker thread for the whole LLM call, and most of that time
+is spent waiting on Groq or Gemini. Here those two routes are coroutines on
+the event loop (ProviderChain.acomplete / astream over the SDKs' async
+clients), so a worker holds hundreds of model calls open at once. Prompt
+building (tutor context, syllabus retrieval, the cache) is shared with
+app.py through assistant_call / tutor_call and runs on threads, because it
+touches SQLite.
+
+Every other request (uploads, schedules, auth, diagrams, /metrics, CORS
+preflights) goes through a small WSGI bridge to the Flask app, on a bounded
+thread pool (ASGI_WSGI_THREADS), so those routes behave exactly as they do
+under gunicorn.
+
+    uvicorn asgi:app --host 0.0.0.0 --port $PORT --workers 2
+"""
+import asyncio
+import json
+import math
+import os
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
+
+import app as backend
+from logs import log, set_request_id
+from metrics import http_latency, http_requests
+from providers import AllProvidersFailed, Overloaded, make_request
+from rate_limit import RateLimited
+
+WSGI_THREADS = int(os.getenv("ASGI_WSGI_THREADS", "32"))
+MAX_BODY_BYTES = int(os.getenv("ASGI_MAX_BODY_BYTES", str(2 * 1024 * 1024)))
+# Flask route bodies past this size are buffered on disk rather than in memory
+WSGI_SPOOL_BYTES = int(os.getenv("ASGI_WSGI_SPOOL_BYTES", str(1024 * 1024)))
+
+wsgi_executor = ThreadPoolExecutor(max_workers=WSGI_THREADS, thread_name_prefix="wsgi")
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        self.status = status
+        super().__init__(message)
+
+
+# ── Async twins of call_ai / stream_ai ──────────────────────
+async def acall_ai(prompt, system_prompt="You are a helpful assistant.", max_tokens=1024,
+                   temperature=0.7, messages=None, task=None, use_cache=True, cache_variant=None):
+    req = make_request(prompt, system_prompt, max_tokens, temperature, messages)
+    cache_key, ttl = backend._cache_slot(task, use_cache, req, cache_variant)
+    if cache_key:
+        cached = await asyncio.to_thread(backend.ai_cache.get, cache_key, task=task)
+        if cached is not None:
+            return cached
+
+    try:
+        provider, result = await backend.llm.acomplete(req)
+    except Overloaded:
+        raise
+    except AllProvidersFailed as e:
+        log("ai_call_failed", level="error", task=task, errors=e.errors)
+        return None
+    if cache_key and result:
+        await asyncio.to_thread(backend.ai_cache.set, cache_key, result, ttl, task=task)
+    return result
+
+
+async def astream_ai(prompt, system_prompt="You are a helpful assistant.", max_tokens=1024,
+                     temperature=0.7, messages=None, task=None, use_cache=True, cache_variant=None):
+    req = make_request(prompt, system_prompt, max_tokens, temperature, messages)
+    cache_key, ttl = backend._cache_slot(task, use_cache, req, cache_variant)
+    if cache_key:
+        cached = await asyncio.to_thread(backend.ai_cache.get, cache_key, task=task)
+        if cached is not None:
+            yield "cache", cached
+            return
+
+    parts = []
+    async for provider, text in backend.llm.astream(req):
+        parts.append(text)
+        yield provider, text
+
+    if cache_key and parts:
+        await asyncio.to_thread(backend.ai_cache.set, cache_key, "".join(parts), ttl, task=task)
+
+
+async def sse_events(chunks, unavailable_message="AI service unavailable."):
+    """Like app.sse_response: the first chunk is awaited before the response starts,
+    so an Overloaded chain is still a plain 503."""
+    start = time.perf_counter()
+    head = []
+    failure = None
+    try:
+        head.append(await chunks.__anext__())
+    except StopAsyncIteration:
+        pass
+    except Overloaded:
+        raise
+    except Exception as e:
+        failure = e
+
+    async def generate():
+        first_token = None
+        provider = None
+        try:
+            if failure is not None:
+                raise failure
+            for provider, text in head:
+                first_token = time.perf_counter() - start
+                yield backend.sse_event({"token": text})
+            async for provider, text in chunks:
+                yield backend.sse_event({"token": text})
+        except Exception as e:
+            log("ai_stream_failed", level="error", error=str(e))
+            yield backend.sse_event({"success": False, "message": unavailable_message}, "error")
+            return
+        finally:
+            await chunks.aclose()
+
+        if first_token is None:
+            yield backend.sse_event({"success": False, "message": unavailable_message}, "error")
+            return
+        yield backend.sse_done(provider, first_token, time.perf_counter() - start)
+
+    return generate()
+
+
+# ── Async routes ─────────────────────────────────────────────
+SSE_HEADERS = [(b"content-type", b"text/event-stream; charset=utf-8"), (b"cache-control", b"no-cache"),
+               (b"x-accel-buffering", b"no")]
+
+
+def json_response(payload, status=200, headers=()):
+    return status, [(b"content-type", b"application/json"), *headers], json.dumps(payload).encode()
+
+
+async def ai_assistant(data, stream):
+    banked = None if stream else await asyncio.to_thread(backend.bank_quiz, data)
+    if banked:
+        return json_response(banked)
+    call = await asyncio.to_thread(backend.assistant_call, data)
+    if call is None:
+        return json_response({"success": False})
+    if stream:
+        return 200, SSE_HEADERS, await sse_events(astream_ai(**call), backend.ASSISTANT_UNAVAILABLE)
+    result = await acall_ai(**call)
+    if result:
+        await asyncio.to_thread(backend.bank_live_quiz, data, result)
+        return json_response({"success": True, "response": result})
+    return json_response({"success": False, "message": backend.ASSISTANT_UNAVAILABLE})
+
+
+async def ai_tutor(data, stream):
+    call, conversation = await asyncio.to_thread(backend.tutor_call, data)
+    if stream:
+        return 200, SSE_HEADERS, await sse_events(astream_ai(**call))
+    result = await acall_ai(**call)
+    if result:
+        return json_response({"success": True, "response": result, "conversation_id": conversation})
+    return json_response({"success": False, "message": "AI service unavailable."})
+
+
+ROUTES = {("POST", "/ai-assistant"): ai_assistant, ("POST", "/ai-tutor"): ai_tutor}
+
+
+def overloaded_response(e):
+    """Same answer as app.ai_overloaded."""
+    retry_after = max(1, math.ceil(e.retry_after))
+    log("ai_overloaded", level="warning", retry_after=retry_after)
+    return json_response({"success": False, "message": "AI service is busy, please retry shortly.",
+                          "retry_after": retry_after},
+                         503, [(b"retry-after", str(retry_after).encode())])
+
+
+async def read_body(receive, limit=None):
+    body = bytearray()
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            raise HTTPError(400, "client disconnected")
+        body += message.get("body", b"")
+        if limit is not None and len(body) > limit:
+            raise HTTPError(413, "request body too large")
+        if not message.get("more_body"):
+            return bytes(body)
+
+
+async def send_response(send, status, headers, body):
+    await send({"type": "http.response.start", "status": status, "headers": headers})
+    if isinstance(body, bytes):
+        await send({"type": "http.response.body", "body": body})
+        return
+    try:
+        async for chunk in body:
+            await send({"type": "http.response.body", "body": chunk.encode(), "more_body": True})
+    finally:
+        await body.aclose()
+    await send({"type": "http.response.body", "body": b""})
+
+
+async def handle(handler, scope, receive, send):
+    start = time.perf_counter()
+    headers = {name.decode("latin1").lower(): value.decode("latin1") for name, value in scope["headers"]}
+    request_id = headers.get("x-request-id") or uuid.uuid4().hex
+    set_request_id(request_id)
+    try:
+        try:
+            data = json.loads(await read_body(receive, MAX_BODY_BYTES))
+        except ValueError:
+            raise HTTPError(400, "invalid JSON body")
+        if not isinstance(data, dict):
+            raise HTTPError(400, "expected a JSON object")
+        query = parse_qs(scope.get("query_string", b"").decode("latin1"))
+        stream = bool(data.get("stream")) or query.get("stream", [""])[0] in ("1", "true")
+        status, response_headers, body = await handler(data, stream)
+    except (Overloaded, RateLimited) as e:
+        status, response_headers, body = overloaded_response(e)
+    except HTTPError as e:
+        status, response_headers, body = json_response({"success": False, "message": str(e)}, e.status)
+    except backend.UnknownSyllabus:
+        status, response_headers, body = json_response(backend.UNKNOWN_SYLLABUS, 409)
+    except Exception as e:
+        log("request_failed", level="error", route=scope["path"], error=repr(e))
+        status, response_headers, body = json_response({"success": False, "message": "Internal server error."}, 500)
+
+    # What app.finish_request and flask-cors add to every Flask response
+    response_headers = [*response_headers, (b"x-request-id", request_id.encode("latin1"))]
+    if "origin" in headers:
+        response_headers += [(b"access-control-allow-origin", b"*"),
+                             (b"access-control-expose-headers", b"X-Request-ID")]
+    elapsed = time.perf_counter() - start
+    http_latency.observe(elapsed, route=scope["path"], method=scope["method"])
+    http_requests.inc(route=scope["path"], method=scope["method"], status=status)
+    log("request", method=scope["method"], route=scope["path"], status=status, ms=round(elapsed * 1000, 1))
+    await send_response(send, status, response_headers, body)
+
+
+# ── WSGI bridge for the Flask routes ─────────────────────────
+async def spool_body(receive, limit):
+    """The request body in a file-like object (on disk past WSGI_SPOOL_BYTES)
+    and its length. Raises HTTPError(413) past limit."""
+    body = tempfile.SpooledTemporaryFile(max_size=WSGI_SPOOL_BYTES)
+    length = 0
+    try:
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                raise HTTPError(400, "client disconnected")
+            chunk = message.get("body", b"")
+            length += len(chunk)
+            if limit is not None and length > limit:
+                raise HTTPError(413, "request body too large")
+            body.write(chunk)
+            if not message.get("more_body"):
+                body.seek(0)
+                return body, length
+    except BaseException:
+        body.close()
+        raise
+
+
+def wsgi_environ(scope, body, length):
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": client[0],
+        "CONTENT_LENGTH": str(length),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": body,
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    for name, value in scope["headers"]:
+        name = name.decode("latin1").upper().replace("-", "_")
+        value = value.decode("latin1")
+        if name == "CONTENT_LENGTH":
+            continue
+        key = name if name == "CONTENT_TYPE" else f"HTTP_{name}"
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+def run_wsgi(environ, put, cancelled):
+    """Runs the Flask app and drains its body on one pool thread (stream_with_context
+    needs its request context pushed and popped on the same thread). Stops between
+    chunks once cancelled is set, i.e. when nobody is listening any more."""
+    def start_response(status, headers, exc_info=None):
+        put(("start", int(status.split(" ", 1)[0]),
+             [(name.lower().encode("latin1"), value.encode("latin1")) for name, value in headers]))
+        return lambda data: put(("body", data))
+
+    try:
+        result = backend.app(environ, start_response)
+        try:
+            for chunk in result:
+                if cancelled.is_set():
+                    log("wsgi_cancelled", route=environ["PATH_INFO"])
+                    break
+                if chunk:
+                    put(("body", chunk))
+        finally:
+            # Closes generators too, so an SSE route stops its provider stream
+            if hasattr(result, "close"):
+                result.close()
+    except Exception as e:
+        put(("error", e))
+    finally:
+        environ["wsgi.input"].close()
+    put(("end",))
+
+
+async def watch_disconnect(receive, cancelled):
+    """Sets cancelled when the client goes away (the body has been read by now)."""
+    while (await receive())["type"] != "http.disconnect":
+        pass
+    cancelled.set()
+
+
+async def wsgi(scope, receive, send):
+    try:
+        body, length = await spool_body(receive, backend.app.config["MAX_CONTENT_LENGTH"])
+    except HTTPError as e:
+        if e.status == 413:
+            await send_response(send, 413, [(b"content-type", b"text/plain")], b"Request Entity Too Large")
+        return
+    # run_wsgi closes the body once the app is done with it
+    cancelled = threading.Event()
+    watcher = asyncio.ensure_future(watch_disconnect(receive, cancelled))
+    try:
+        await bridge(scope, body, length, send, cancelled)
+    except BaseException:
+        cancelled.set()  # e.g. send() failed: stop the app thread too
+        raise
+    finally:
+        watcher.cancel()
+
+
+async def bridge(scope, body, length, send, cancelled):
+    loop = asyncio.get_running_loop()
+    messages = asyncio.Queue()
+
+    def put(message):
+        loop.call_soon_threadsafe(messages.put_nowait, message)
+
+    loop.run_in_executor(wsgi_executor, run_wsgi, wsgi_environ(scope, body, length), put, cancelled)
+
+    started = None  # (status, headers) until sent with the first body chunk
+    sent = False
+    while True:
+        message = await messages.get()
+        if cancelled.is_set():
+            return  # the client is gone; run_wsgi stops at its next chunk
+        kind = message[0]
+        if kind == "start":
+            started = message[1:]
+            continue
+        if kind == "error":
+            log("wsgi_failed", level="error", route=scope["path"], error=repr(message[1]), streaming=sent)
+            if sent:
+                # Part of the body is already out: raising makes the server drop the
+                # connection, so the client sees a failed response, not a short one.
+                raise message[1]
+            started = (500, [(b"content-type", b"text/plain")])
+            message = ("body", b"Internal Server Error")
+            kind = "body"
+        if not sent and started is not None:
+            await send({"type": "http.response.start", "status": started[0], "headers": started[1]})
+            sent = True
+        if kind == "body":
+            await send({"type": "http.response.body", "body": message[1], "more_body": True})
+        elif kind == "end":
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+
+# ── ASGI application ─────────────────────────────────────────
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            wsgi_executor.shutdown(wait=False)
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        await lifespan(receive, send)
+        return
+    if scope["type"] != "http":
+        return
+    handler = ROUTES.get((scope["method"], scope["path"]))
+    if handler is None:
+        await wsgi(scope, receive, send)
+    else:
+        await handle(handler, scope, receive, send)
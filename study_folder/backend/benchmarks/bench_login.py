@@ -0,0 +1,88 @@
+"""Login throughput against the SQLite user store with several worker processes.
+
+Each process stands in for a gunicorn worker: it opens its own store on a
+shared database file and runs login (scrypt verify + session insert) and
+session lookups.
+
+Run from the backend folder:
+    python benchmarks/bench_login.py --workers 1 2 4 --logins 200
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from multiprocessing import Pool
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _worker(args):
+    db_path, users, logins, lookups, seed = args
+    from user_store import SQLiteUserStore
+
+    store = SQLiteUserStore(db_path)
+    rng = random.Random(seed)
+    tokens = []
+    start = time.perf_counter()
+    for _ in range(logins):
+        email = f"student{rng.randrange(users)}@example.com"
+        if not store.authenticate(email, "correct horse battery staple"):
+            raise SystemExit(f"login failed for {email}")
+        tokens.append(store.create_session(email))
+    login_seconds = time.perf_counter() - start
+
+    # Cold: a fresh store has an empty session cache, so every lookup hits SQLite.
+    cold_store = SQLiteUserStore(db_path)
+    start = time.perf_counter()
+    for _ in range(lookups):
+        cold_store._load_session(rng.choice(tokens))
+    cold_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(lookups):
+        store.session_email(rng.choice(tokens))
+    cached_seconds = time.perf_counter() - start
+    return login_seconds, cold_seconds, cached_seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--logins", type=int, default=100, help="logins per worker")
+    parser.add_argument("--lookups", type=int, default=5000, help="session lookups per worker")
+    parser.add_argument("--scrypt-n", type=int, help="override USER_SCRYPT_N")
+    args = parser.parse_args()
+
+    if args.scrypt_n:
+        os.environ["USER_SCRYPT_N"] = str(args.scrypt_n)
+    from user_store import SCRYPT_N, SQLiteUserStore, hash_password
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "users.sqlite3")
+        store = SQLiteUserStore(db_path)
+        encoded = hash_password("correct horse battery staple")
+        for i in range(args.users):
+            store._insert_user(f"student{i}@example.com", encoded)
+
+        print(f"scrypt n={SCRYPT_N}, {args.users} users, {args.logins} logins/worker")
+        print(f"{'workers':>7} {'logins/sec':>11} {'ms/login':>9} {'cold lookups/s':>15} {'cached lookups/s':>17}")
+        for workers in args.workers:
+            jobs = [(db_path, args.users, args.logins, args.lookups, seed) for seed in range(workers)]
+            start = time.perf_counter()
+            with Pool(workers) as pool:
+                results = pool.map(_worker, jobs)
+            wall = time.perf_counter() - start
+            total_logins = workers * args.logins
+            login_time = max(r[0] for r in results)
+            cold_rate = workers * args.lookups / max(r[1] for r in results)
+            cached_rate = workers * args.lookups / max(r[2] for r in results)
+            print(f"{workers:>7} {total_logins / login_time:>11,.1f} "
+                  f"{1000 * login_time / args.logins:>9.1f} {cold_rate:>15,.0f} {cached_rate:>17,.0f}"
+                  f"   (wall {wall:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
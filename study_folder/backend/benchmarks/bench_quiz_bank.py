@@ -0,0 +1,104 @@
+"""Quiz start latency: live generation vs sampling the per-syllabus question bank.
+
+Uploads a generated syllabus to the app (in process, against the fake
+Groq/Gemini backends) and waits for the background fill. It then times
+/ai-assistant quiz requests with QUIZ_BANK off (one live LLM call each) and
+on (sampled from the bank). Each simulated user takes several quizzes, and
+the run checks that no user is served a question twice before the bank
+runs out.
+
+Run from the backend folder:
+    python benchmarks/bench_quiz_bank.py --groq-latency 2 --users 20 --quizzes 4
+"""
+import argparse
+import io
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+import fake_backends  # noqa: E402
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--quizzes", type=int, default=4, help="quizzes per user")
+    parser.add_argument("--live", type=int, default=10, help="live quizzes to time")
+    fake_backends.add_profile_args(parser)
+    args = parser.parse_args()
+
+    fakes = fake_backends.start_fake_server(fake_backends.profiles_from_args(args))
+    workdir = tempfile.mkdtemp(prefix="studyflow-quiz-")
+    os.environ.update(
+        fake_backends.fake_env(fakes.url),
+        USER_STORE="memory",
+        AI_CACHE_DB=os.path.join(workdir, "ai_cache.sqlite3"),
+        UPLOAD_FOLDER=os.path.join(workdir, "uploads"),
+        QUIZ_BANK_DB=os.path.join(workdir, "quiz_bank.sqlite3"),
+        LLM_RATE_GROQ="", LLM_RATE_GEMINI="", LLM_RATE_IMAGEN="",
+        LLM_RATE_DB=os.path.join(workdir, "rate_limit.sqlite3"),
+    )
+    os.chdir(workdir)
+    import logging
+
+    logging.getLogger("studyflow").disabled = True
+    import app
+
+    client = app.app.test_client()
+    pdf = fake_backends.make_pdf(fake_backends.syllabus_lines(8))
+    upload = client.post("/upload-syllabus", data={"file": (io.BytesIO(pdf), "syllabus.pdf")},
+                         content_type="multipart/form-data").get_json()
+    syllabus_id = upload["syllabus_id"]
+
+    start = time.perf_counter()
+    while app.quiz_bank.size(syllabus_id) < app.quiz_bank.target:
+        if not app.quiz_bank._pending:
+            app.quiz_bank.top_up(syllabus_id)
+        time.sleep(0.05)
+    fill_seconds = time.perf_counter() - start
+    fill_calls = fakes.calls["groq"]["ok"]
+
+    def quiz(user):
+        begin = time.perf_counter()
+        body = client.post("/ai-assistant", json={"task": "quiz", "content": "", "syllabusId": syllabus_id,
+                                                  "userId": user}).get_json()
+        elapsed = (time.perf_counter() - begin) * 1000
+        return elapsed, json.loads(body["response"]), body.get("source", "live")
+
+    app.QUIZ_BANK = False
+    live = [quiz("live-user")[0] for _ in range(args.live)]
+    app.QUIZ_BANK = True
+
+    banked, repeats, sources = [], 0, {}
+    for user in range(args.users):
+        seen = set()
+        for _ in range(args.quizzes):
+            elapsed, questions, source = quiz(f"user-{user}")
+            banked.append(elapsed)
+            sources[source] = sources.get(source, 0) + 1
+            for question in questions:
+                repeats += question["question"] in seen
+                seen.add(question["question"])
+
+    print(f"bank filled to {app.quiz_bank.size(syllabus_id)} questions in {fill_seconds:.1f}s "
+          f"(background; {fill_calls} Groq calls including topic extraction)")
+    print(f"  live quiz        p50 {statistics.median(live):8.1f} ms   p95 {percentile(live, 95):8.1f} ms")
+    print(f"  bank quiz        p50 {statistics.median(banked):8.1f} ms   p95 {percentile(banked, 95):8.1f} ms")
+    print(f"  {args.users} users x {args.quizzes} quizzes: sources {sources}, repeated questions {repeats}")
+    print(f"  bank size now {app.quiz_bank.size(syllabus_id)} (top-ups run in the background)")
+
+
+if __name__ == "__main__":
+    main()
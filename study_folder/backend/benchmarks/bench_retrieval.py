@@ -0,0 +1,101 @@
+"""Per-syllabus retrieval: index size, load and query latency, payload savings.
+
+Builds the BM25 index that /upload-syllabus stores for a synthetic
+syllabus, then times the cold path (read from the upload store's SQLite
+index and parse) and the warm path (index already loaded) for doubt-style
+queries. It also checks that the top passage contains the queried concept,
+and compares an /ai-assistant doubt body that carries the whole syllabus
+with one that carries only its id.
+
+Run from the backend folder:
+    python benchmarks/bench_retrieval.py --units 40
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SYLLABLES = "ka ro mi tes lun var pho zen qui dra mal nor sei tal bex cor".split()
+FILLER = ("introduction basic principles applications numerical problems derivations "
+          "case studies experiments advanced concepts laboratory revision").split()
+
+
+def _word(rng):
+    return "".join(rng.sample(SYLLABLES, 3))
+
+
+def synthetic_syllabus(rng, units, concepts_per_unit=8):
+    """Text with unit headings; every concept name appears in exactly one unit."""
+    lines, concepts = ["COURSE SYLLABUS"], []
+    for unit in range(1, units + 1):
+        lines.append(f"UNIT {unit}: {_word(rng).title()} {_word(rng).title()}")
+        for _ in range(concepts_per_unit):
+            concept = f"{_word(rng)} {_word(rng)}"
+            concepts.append(concept)
+            lines.append(f"{concept.title()} - {', '.join(rng.sample(FILLER, 4))}")
+    return "\n".join(lines), concepts
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--units", type=int, default=40)
+    parser.add_argument("--queries", type=int, default=2000)
+    args = parser.parse_args()
+
+    from retrieval import Retriever, SyllabusIndex
+    from upload_store import UploadStore
+
+    rng = random.Random(3)
+    text, concepts = synthetic_syllabus(rng, args.units)
+    digest = "f" * 64
+
+    with tempfile.TemporaryDirectory() as root:
+        store = UploadStore(root)
+        start = time.perf_counter()
+        Retriever(store).build(digest, text)
+        build_ms = (time.perf_counter() - start) * 1000
+        stored = len(json.dumps(store.memo(digest, "index"), ensure_ascii=False))
+
+        cold = []
+        for _ in range(20):
+            start = time.perf_counter()
+            Retriever(store).get(digest)
+            cold.append((time.perf_counter() - start) * 1000)
+
+        retriever = Retriever(store)
+        queries = [rng.choice(concepts) for _ in range(args.queries)]
+        warm, hits = [], 0
+        index = retriever.get(digest)
+        for concept in queries:
+            question = f"explain {concept} with an example"
+            start = time.perf_counter()
+            context = retriever.context(digest, question)
+            warm.append((time.perf_counter() - start) * 1000)
+            _, top = index.search(question, 1)[0]
+            hits += concept.title() in index.passages[top]
+
+    full_body = len(json.dumps({"task": "doubt", "content": "explain x", "syllabusContext": text}))
+    id_body = len(json.dumps({"task": "doubt", "content": "explain x", "syllabusId": digest}))
+    passages = len(SyllabusIndex.build(text).passages)
+    print(f"syllabus: {args.units} units, {len(text):,} chars, {passages} passages")
+    print(f"  index build            {build_ms:8.1f} ms   stored {stored / 1024:,.0f} KiB")
+    print(f"  cold load (SQLite)     {statistics.median(cold):8.2f} ms p50")
+    print(f"  query (loaded index)   {percentile(warm, 50):8.3f} ms p50   {percentile(warm, 99):.3f} ms p99")
+    print(f"  top passage has the concept: {hits}/{len(queries)}")
+    print(f"  doubt request body     {full_body:,} bytes with syllabusContext -> {id_body} with syllabusId")
+    print(f"  prompt context         {len(context):,} chars (RETRIEVAL_MAX_CHARS budget)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""Bulk schedule generation and nightly rescheduling at scale.
+
+Compares scheduler.py (per-day slot tables, one lookup per task) with a
+direct port of the frontend's generateTasks loop, which walks a datetime
+one session at a time. Users are processed in batches, the way the bulk
+endpoint receives them, so memory stays bounded at any scale.
+
+Run from the backend folder:
+    python benchmarks/bench_scheduler.py --users 10000 --topics 200
+"""
+import argparse
+import datetime
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+WORDS = "laws motion cell biology graph theory thermal physics organic reactions data structures".split()
+SETTINGS = [(hours, start) for hours in (1, 2, 3, 4, 6) for start in ("07:00", "09:00", "18:30")]
+
+
+def legacy_generate(topics, study_hours, start_time, start_date):
+    """generateTasks as written in scheduler.js, transliterated to datetime."""
+    tasks = []
+    max_mins = study_hours * 60
+    hour, minute = (int(part) for part in start_time.split(":"))
+    day = datetime.datetime.combine(start_date, datetime.time())
+    pointer = day.replace(hour=hour, minute=minute)
+    used = counter = 0
+    for item in topics:
+        subtopics = item["subtopics"] or [item["topic"]]
+        for index, sub in enumerate(subtopics):
+            if used + 30 > max_mins:
+                day += datetime.timedelta(days=1)
+                pointer = day.replace(hour=hour, minute=minute)
+                used = counter = 0
+            date = day.strftime("%Y-%m-%d")
+            counter += 1
+            focus_start = pointer.strftime("%I:%M %p")
+            slug = re.sub(r"\s+", "-", sub).lower()
+            pointer += datetime.timedelta(minutes=25)
+            tasks.append({
+                "id": f"{date}-{focus_start}-{slug}", "date": date,
+                "topic": f"{item['topic']}: {sub}" if index == 0 and item["subtopics"] else sub,
+                "duration": "25", "completed": False, "type": "focus", "startTime": focus_start,
+                "endTime": pointer.strftime("%I:%M %p"), "preference": start_time,
+            })
+            used += 25
+            long_break = counter % 4 == 0
+            minutes = 20 if long_break else 5
+            break_start = pointer.strftime("%I:%M %p")
+            pointer += datetime.timedelta(minutes=minutes)
+            tasks.append({
+                "id": f"{date}-{break_start}-break", "date": date,
+                "topic": "Long Break 🧘" if long_break else "Short Break ☕", "duration": str(minutes),
+                "completed": False, "type": "break", "startTime": break_start,
+                "endTime": pointer.strftime("%I:%M %p"), "preference": start_time,
+            })
+            used += minutes
+    return tasks
+
+
+def make_topics(rng, count):
+    topics = []
+    for _ in range(count):
+        subtopics = [" ".join(rng.sample(WORDS, 2)) for _ in range(rng.choice((0, 0, 2, 3)))]
+        topics.append({"topic": " ".join(rng.sample(WORDS, 3)), "subtopics": subtopics})
+    return topics
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--topics", type=int, default=200, help="topics per user")
+    parser.add_argument("--batch", type=int, default=500, help="users per bulk call")
+    parser.add_argument("--legacy-users", type=int, default=1000,
+                        help="users to time the loop port on (it is extrapolated to --users)")
+    args = parser.parse_args()
+
+    import scheduler
+
+    rng = random.Random(11)
+    # A pool of syllabi shared by users, as when a class uploads the same one
+    syllabi = [make_topics(rng, args.topics) for _ in range(20)]
+    today = datetime.date.today()
+    users = [(syllabi[i % len(syllabi)], *SETTINGS[i % len(SETTINGS)]) for i in range(args.users)]
+
+    def timed(fn, population):
+        sessions = 0
+        start = time.perf_counter()
+        for offset in range(0, len(population), args.batch):
+            for topics, hours, start_time in population[offset:offset + args.batch]:
+                sessions += len(fn(topics, hours, start_time)) // 2
+        return time.perf_counter() - start, sessions
+
+    sample = users[:args.legacy_users]
+    for topics, hours, start_time in sample[:50]:
+        assert scheduler.generate_tasks(topics, hours, start_time, today) == \
+            legacy_generate(topics, hours, start_time, today), "layouts differ"
+
+    legacy_seconds, legacy_sessions = timed(lambda t, h, s: legacy_generate(t, h, s, today), sample)
+    new_seconds, sessions = timed(lambda t, h, s: scheduler.generate_tasks(t, h, s, today), users)
+    legacy_total = legacy_seconds * len(users) / max(1, len(sample))
+    print(f"{len(users):,} users x {args.topics} topics = {sessions:,} focus sessions "
+          f"({sessions * 2:,} tasks), batches of {args.batch}")
+    print(f"  loop port      {legacy_sessions / legacy_seconds:>12,.0f} sessions/s   "
+          f"{legacy_total:7.1f}s for all users (timed on {len(sample):,})")
+    print(f"  slot tables    {sessions / new_seconds:>12,.0f} sessions/s   {new_seconds:7.1f}s "
+          f"({legacy_total / new_seconds:.1f}x)")
+
+    # Nightly pass: every plan started 3 days ago, a quarter of sessions done
+    started = today - datetime.timedelta(days=3)
+
+    def nightly(topics, hours, start_time):
+        tasks = scheduler.generate_tasks(topics, hours, start_time, started)
+        for task in tasks[::8]:
+            task["completed"] = True
+        begin = time.perf_counter()
+        rescheduled, _ = scheduler.reschedule_missed(tasks, hours, start_time, today)
+        nightly.seconds += time.perf_counter() - begin
+        return rescheduled
+
+    nightly.seconds = 0.0
+    timed(nightly, users)
+    print(f"  reschedule     {len(users) / nightly.seconds:>12,.0f} plans/s      {nightly.seconds:7.1f}s "
+          f"for all users")
+
+
+if __name__ == "__main__":
+    main()
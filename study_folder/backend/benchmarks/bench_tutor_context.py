@@ -0,0 +1,79 @@
+"""Tutor prompt size and build time as a conversation grows.
+
+Compares the previous context (last six messages in full, plus a
+flattened copy for the fallback prompt) with tutor_context's budgeted
+context. A fake summarizer stands in for the LLM, so only context
+handling is measured.
+
+Run from the backend folder:
+    python benchmarks/bench_tutor_context.py --turns 200
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+WORDS = ("entropy heat engine cycle reversible process temperature system surroundings "
+         "energy work state function microstate probability disorder").split()
+
+
+def _message(rng, low, high):
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(low, high))) + "."
+
+
+def legacy_tokens(history, question):
+    from tutor_context import estimate_tokens
+
+    recent = history[-6:]
+    history_text = "".join(f"{m['role']}: {m['content']}\n" for m in recent)
+    chat = sum(estimate_tokens(m["content"]) for m in recent) + estimate_tokens(question)
+    return chat, estimate_tokens(history_text)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, default=200, help="student/teacher exchanges")
+    parser.add_argument("--min-words", type=int, default=30)
+    parser.add_argument("--max-words", type=int, default=1500)
+    parser.add_argument("--report-every", type=int, default=25)
+    args = parser.parse_args()
+
+    from ai_cache import AICache
+    from tutor_context import ContextManager, clip, estimate_tokens
+
+    def fake_summarize(previous, transcript):
+        return clip(f"{previous} {transcript}", 200)
+
+    manager = ContextManager(AICache(max_entries=1024), fake_summarize)
+    rng = random.Random(7)
+    history = []
+    print(f"{'turn':>5} {'legacy chat tok':>15} {'legacy flat tok':>15} {'new chat tok':>12} "
+          f"{'build ms':>9} {'summary covers':>14}")
+    for turn in range(1, args.turns + 1):
+        question = _message(rng, 5, 40)
+        legacy_chat, legacy_flat = legacy_tokens(history, question)
+        start = time.perf_counter()
+        context = manager.build("Thermodynamics", history)
+        messages = context.chat_messages("system", question)
+        build_ms = (time.perf_counter() - start) * 1000
+        new_chat = sum(estimate_tokens(m["content"]) for m in messages[1:])
+        if turn % args.report_every == 0 or turn == 1:
+            _, covered = manager._load(context.conversation, manager_messages(history))
+            print(f"{turn:>5} {legacy_chat:>15,} {legacy_flat:>15,} {new_chat:>12,} "
+                  f"{build_ms:>9.2f} {covered:>14}")
+        history.append({"role": "user", "content": question})
+        history.append({"role": "assistant", "content": _message(rng, args.min_words, args.max_words)})
+        time.sleep(0.002)  # let the background summary land, as it would between real turns
+
+
+def manager_messages(history):
+    from tutor_context import normalize_history
+
+    return normalize_history(history)
+
+
+if __name__ == "__main__":
+    main()
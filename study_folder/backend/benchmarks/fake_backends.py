@@ -0,0 +1,328 @@
+"""Local stand-ins for the Groq and Gemini APIs, plus generated syllabi.
+
+One HTTP server answers both APIs:
+    POST /openai/v1/chat/completions                   Groq (stream or not)
+    POST /v1beta/models/<model>:generateContent        Gemini text and OCR
+    POST /v1beta/models/<model>:streamGenerateContent  Gemini streaming
+    POST /v1beta/models/<model>:predict                Imagen
+Each API has its own latency, jitter and error rate. Failed calls return
+HTTP 500, so the app's fallback and circuit breakers are exercised too.
+
+The app is pointed here with GROQ_BASE_URL and GEMINI_API_ENDPOINT (see
+fake_env). To run the server on its own, e.g. next to a gunicorn you start
+yourself:
+    python benchmarks/fake_backends.py --port 8090 --groq-latency 0.3
+"""
+import argparse
+import base64
+import io
+import json
+import random
+import re
+import threading
+import time
+from collections import namedtuple
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+Profile = namedtuple("Profile", ["latency", "jitter", "error_rate"])
+
+DEFAULT_PROFILES = {
+    "groq": Profile(latency=0.3, jitter=0.1, error_rate=0.0),
+    "gemini": Profile(latency=0.8, jitter=0.2, error_rate=0.0),
+    "imagen": Profile(latency=1.5, jitter=0.3, error_rate=0.0),
+}
+
+SUBJECTS = [
+    "Electrostatics", "Current Electricity", "Moving Charges", "Magnetism", "Optics",
+    "Thermodynamics", "Kinematics", "Laws of Motion", "Work and Energy", "Gravitation",
+    "Organic Chemistry", "Chemical Bonding", "Equilibrium", "Electrochemistry", "Polymers",
+    "Cell Biology", "Genetics", "Evolution", "Ecology", "Human Physiology",
+    "Linear Algebra", "Calculus", "Probability", "Statistics", "Number Theory",
+    "Data Structures", "Algorithms", "Operating Systems", "Computer Networks", "Databases",
+]
+SUBTOPICS = ["Introduction", "Basic Principles", "Applications", "Numerical Problems",
+             "Experiments", "Derivations", "Case Studies", "Advanced Concepts"]
+
+
+# ── Generated syllabi ────────────────────────────────────────
+def syllabus_lines(units, topics_per_unit=6, seed=0, nonce=None):
+    """Lines of a plausible syllabus: unit headings, topics, and admin noise to filter."""
+    rng = random.Random(seed)
+    lines = ["COURSE SYLLABUS", "Total Marks: 100   Credits: 4", "Course Objectives: see handbook"]
+    if nonce is not None:
+        lines.append(f"Elective Topic {nonce}")
+    for unit in range(1, units + 1):
+        lines.append(f"UNIT {unit}: {rng.choice(SUBJECTS)}")
+        for _ in range(topics_per_unit):
+            lines.append(f"{rng.choice(SUBJECTS)} - {', '.join(rng.sample(SUBTOPICS, 3))}")
+        lines.append(f"Hours: {rng.randint(6, 12)}   Marks: {rng.choice([10, 15, 20])}")
+    lines.append("Textbooks: Standard reference texts")
+    return lines
+
+
+def _pdf_escape(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def make_pdf(lines, lines_per_page=40):
+    """A minimal text PDF (Helvetica, one Tj per line) that PyPDF2 can extract."""
+    pages = [lines[i:i + lines_per_page] for i in range(0, len(lines), lines_per_page)] or [[]]
+    objects = {1: b"<< /Type /Catalog /Pages 2 0 R >>",
+               3: b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"}
+    kids = []
+    for n, page in enumerate(pages):
+        page_id, content_id = 4 + 2 * n, 5 + 2 * n
+        kids.append(f"{page_id} 0 R")
+        ops = ["BT", "/F1 11 Tf", "14 TL", "50 800 Td"]
+        for line in page:
+            ops.append(f"({_pdf_escape(line)}) Tj T*")
+        ops.append("ET")
+        stream = "\n".join(ops).encode("latin-1", "replace")
+        objects[content_id] = b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream)
+        objects[page_id] = (f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+                            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {content_id} 0 R >>").encode()
+    objects[2] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(pages)} >>".encode()
+
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = {}
+    for obj_id in sorted(objects):
+        offsets[obj_id] = out.tell()
+        out.write(b"%d 0 obj\n%s\nendobj\n" % (obj_id, objects[obj_id]))
+    xref = out.tell()
+    size = max(objects) + 1
+    out.write(b"xref\n0 %d\n0000000000 65535 f \n" % size)
+    for obj_id in range(1, size):
+        out.write(b"%010d 00000 n \n" % offsets[obj_id])
+    out.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (size, xref))
+    return out.getvalue()
+
+
+def make_image(lines, width=1240, line_height=28):
+    """A white PNG with the lines drawn in black, like a phone photo of a printed page."""
+    from PIL import Image, ImageDraw
+
+    image = Image.new("L", (width, line_height * (len(lines) + 2)), 255)
+    draw = ImageDraw.Draw(image)
+    for i, line in enumerate(lines):
+        draw.text((40, line_height * (i + 1)), line, fill=0)
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+# ── Canned answers ───────────────────────────────────────────
+def _answer(prompt, has_image=False):
+    if has_image:
+        # Stands in for Gemini OCR of an uploaded image
+        return "\n".join(syllabus_lines(4))
+    if "valid JSON array" in prompt or "Curriculum Analyst" in prompt:
+        content = prompt.split("Syllabus Content:", 1)[-1]
+        topics = []
+        for line in content.split("\n"):
+            line = re.sub(r"^\s*unit\s+\w+[:\s-]*", "", line.strip(), flags=re.IGNORECASE)
+            if line and len(topics) < 12:
+                name, _, rest = line.partition(" - ")
+                topics.append({"topic": name, "subtopics": [s.strip() for s in rest.split(",") if s.strip()]})
+        return json.dumps(topics)
+    if "multiple choice questions" in prompt:
+        # Some repeats across calls, so the quiz bank's dedup has work to do
+        count = int(re.search(r"Generate (\d+)", prompt).group(1))
+        return json.dumps([{
+            "question": f"Which statement about concept {random.randrange(count * 20)} is correct?",
+            "options": {"A": "The first", "B": "The second", "C": "The third", "D": "The fourth"},
+            "answer": random.choice("ABCD"),
+            "explanation": "It follows from the definition.",
+        } for _ in range(count)])
+    if "image generation prompt" in prompt:
+        return "Labeled cross-section diagram with arrows showing each stage of the process"
+    words = ("This concept builds on the basics covered earlier . It is best understood "
+             "through a simple example followed by the key definitions and a worked problem .").split()
+    return " ".join(words[i % len(words)] for i in range(160)) + "\nDo you want me to explain anything further?"
+
+
+def _chunks(text, parts=8):
+    step = max(1, len(text) // parts)
+    return [text[i:i + step] for i in range(0, len(text), step)]
+
+
+_PIXEL_PNG = base64.b64decode(
+    "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mP8z8DwHwAFBQIAX8jx0gAAAABJRU5ErkJggg=="
+)
+
+
+# ── Server ───────────────────────────────────────────────────
+class FakeBackendServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, profiles=None, seed=0):
+        super().__init__(address, _Handler)
+        self.profiles = dict(DEFAULT_PROFILES, **(profiles or {}))
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = {name: {"ok": 0, "errors": 0} for name in self.profiles}
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def roll(self, api):
+        """Returns (delay_seconds, fail) for one call and counts it."""
+        profile = self.profiles[api]
+        with self._lock:
+            delay = max(0.0, self._rng.gauss(profile.latency, profile.jitter))
+            fail = self._rng.random() < profile.error_rate
+            self.calls[api]["errors" if fail else "ok"] += 1
+        return delay, fail
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, body, content_type="application/json"):
+        data = body if isinstance(body, bytes) else json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_stream(self, content_type, pieces, delay):
+        """Chunked response; the first piece comes after a quarter of the latency."""
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        time.sleep(delay * 0.25)
+        for piece in pieces:
+            data = piece.encode()
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+            self.wfile.flush()
+            time.sleep(delay * 0.75 / max(1, len(pieces)))
+        self.wfile.write(b"0\r\n\r\n")
+
+    def do_GET(self):
+        if self.path == "/calls":
+            return self._send(200, self.server.calls)
+        self._send(404, {"error": "not found"})
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+        path = self.path.split("?", 1)[0]
+        if path.endswith("/chat/completions"):
+            return self._groq(body)
+        match = re.match(r"^/v1beta/models/([^:]+):(\w+)$", path)
+        if match and match.group(2) in ("generateContent", "streamGenerateContent"):
+            return self._gemini(body, stream=match.group(2) == "streamGenerateContent")
+        if match and match.group(2) == "predict":
+            return self._imagen()
+        self._send(404, {"error": {"message": f"no fake for {path}"}})
+
+    def _groq(self, body):
+        delay, fail = self.server.roll("groq")
+        if fail:
+            time.sleep(delay)
+            return self._send(500, {"error": {"message": "injected failure", "type": "server_error"}})
+        prompt = "\n".join(str(m.get("content", "")) for m in body.get("messages", []))
+        text = _answer(prompt)
+        base = {"id": "chatcmpl-fake", "created": int(time.time()), "model": body.get("model", "fake")}
+        if body.get("stream"):
+            events = [
+                "data: " + json.dumps(dict(base, object="chat.completion.chunk", choices=[
+                    {"index": 0, "delta": {"role": "assistant", "content": piece}, "finish_reason": None}
+                ])) + "\n\n"
+                for piece in _chunks(text)
+            ]
+            return self._send_stream("text/event-stream", events + ["data: [DONE]\n\n"], delay)
+        time.sleep(delay)
+        self._send(200, dict(base, object="chat.completion", choices=[
+            {"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}
+        ], usage={"prompt_tokens": len(prompt) // 4, "completion_tokens": len(text) // 4,
+                  "total_tokens": (len(prompt) + len(text)) // 4}))
+
+    def _gemini(self, body, stream):
+        delay, fail = self.server.roll("gemini")
+        if fail:
+            time.sleep(delay)
+            return self._send(500, {"error": {"code": 500, "message": "injected failure", "status": "INTERNAL"}})
+        parts = [part for content in body.get("contents", []) for part in content.get("parts", [])]
+        prompt = "\n".join(part.get("text", "") for part in parts)
+        has_image = any("inlineData" in part or "inline_data" in part for part in parts)
+        text = _answer(prompt, has_image)
+
+        def candidate(piece):
+            return {"candidates": [{"content": {"parts": [{"text": piece}], "role": "model"},
+                                    "finishReason": "STOP", "index": 0}],
+                    "usageMetadata": {"promptTokenCount": len(prompt) // 4,
+                                      "candidatesTokenCount": len(piece) // 4}}
+
+        if stream:
+            # The REST client reads a streamed JSON array
+            pieces = [json.dumps(candidate(piece)) for piece in _chunks(text)]
+            framed = ["[" + pieces[0]] + ["," + piece for piece in pieces[1:]] + ["]"]
+            return self._send_stream("application/json", framed, delay)
+        time.sleep(delay)
+        self._send(200, candidate(text))
+
+    def _imagen(self):
+        delay, fail = self.server.roll("imagen")
+        time.sleep(delay)
+        if fail:
+            return self._send(500, {"error": {"code": 500, "message": "injected failure", "status": "INTERNAL"}})
+        self._send(200, {"predictions": [{"mimeType": "image/png",
+                                          "bytesBase64Encoded": base64.b64encode(_PIXEL_PNG).decode()}]})
+
+
+def start_fake_server(profiles=None, host="127.0.0.1", port=0, seed=0):
+    """Starts the server on a daemon thread and returns it (see .url, .calls)."""
+    server = FakeBackendServer((host, port), profiles, seed)
+    threading.Thread(target=server.serve_forever, name="fake-backends", daemon=True).start()
+    return server
+
+
+def fake_env(url):
+    """Environment variables that point the app's SDK clients at the fake server."""
+    return {
+        "GROQ_API_KEY": "fake-groq-key",
+        "GROQ_BASE_URL": url,
+        "GEMINI_API_KEY": "fake-gemini-key",
+        "GEMINI_API_ENDPOINT": url,
+    }
+
+
+def add_profile_args(parser):
+    for api, profile in DEFAULT_PROFILES.items():
+        parser.add_argument(f"--{api}-latency", type=float, default=profile.latency, help="mean seconds")
+        parser.add_argument(f"--{api}-jitter", type=float, default=profile.jitter)
+        parser.add_argument(f"--{api}-errors", type=float, default=profile.error_rate, help="0..1")
+
+
+def profiles_from_args(args):
+    return {api: Profile(getattr(args, f"{api}_latency"), getattr(args, f"{api}_jitter"),
+                         getattr(args, f"{api}_errors"))
+            for api in DEFAULT_PROFILES}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    add_profile_args(parser)
+    args = parser.parse_args()
+
+    server = FakeBackendServer((args.host, args.port), profiles_from_args(args))
+    print(f"fake backends on {server.url}; point the app at them with:")
+    for key, value in fake_env(server.url).items():
+        print(f"  export {key}={value}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
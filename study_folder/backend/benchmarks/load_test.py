@@ -0,0 +1,360 @@
+"""Load test for the Flask app against fake Groq/Gemini backends.
+
+Starts the fake backends (fake_backends.py) and the app, then drives each
+scenario at every concurrency level. It records throughput and p50/p95/p99
+latency and writes them to a JSON file. Uploads use generated PDF and image
+syllabi of increasing size. Every request gets unique content, so the AI and
+OCR caches don't hide the real work (pass --warm-cache to measure hits).
+
+Images go through the real Tesseract when it is installed. Otherwise they
+take the app's Gemini OCR fallback, which the fake server answers.
+
+Run from the backend folder:
+    python benchmarks/load_test.py --concurrency 1 8 32 --requests 100
+    python benchmarks/load_test.py --server gunicorn --gunicorn-args "-w 4 --threads 8"
+    python benchmarks/load_test.py --server asgi --asgi-args "--workers 2" --scenarios ai-tutor
+    python benchmarks/load_test.py --groq-errors 0.2 --scenarios ai-assistant ai-tutor
+    python benchmarks/load_test.py --compare benchmarks/results/<older>.json
+"""
+import argparse
+import http.client
+import json
+import os
+import platform
+import shlex
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+import fake_backends  # noqa: E402
+
+
+# ── Request bodies ───────────────────────────────────────────
+def _json_body(payload):
+    return json.dumps(payload).encode(), "application/json"
+
+
+def _multipart(filename, data, content_type):
+    boundary = uuid.uuid4().hex
+    body = (
+        f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"{filename}\"\r\n"
+        f"Content-Type: {content_type}\r\n\r\n"
+    ).encode() + data + f"\r\n--{boundary}--\r\n".encode()
+    return body, f"multipart/form-data; boundary={boundary}"
+
+
+def _nonce(i, warm_cache):
+    return 0 if warm_cache else f"{i}-{uuid.uuid4().hex[:8]}"
+
+
+def pdf_scenario(pages):
+    def build(i, warm_cache):
+        lines = fake_backends.syllabus_lines(units=pages * 4, seed=pages, nonce=_nonce(i, warm_cache))
+        return "/upload-syllabus", _multipart(f"syllabus-{i}.pdf", fake_backends.make_pdf(lines),
+                                              "application/pdf")
+    return build
+
+
+def image_scenario(units):
+    def build(i, warm_cache):
+        lines = fake_backends.syllabus_lines(units=units, seed=units, nonce=_nonce(i, warm_cache))
+        return "/upload-syllabus", _multipart(f"syllabus-{i}.png", fake_backends.make_image(lines),
+                                              "image/png")
+    return build
+
+
+def assistant_request(i, warm_cache):
+    task = ("summary", "quiz", "doubt")[i % 3]
+    return "/ai-assistant", _json_body({
+        "task": task,
+        "content": f"Explain osmosis and diffusion in plant cells ({_nonce(i, warm_cache)})",
+    })
+
+
+def tutor_request(i, warm_cache):
+    history = [{"role": "user" if n % 2 == 0 else "assistant", "content": f"Turn {n} about entropy"}
+               for n in range(6)]
+    return "/ai-tutor", _json_body({
+        "topic": "Thermodynamics", "difficulty": "Intermediate", "history": history,
+        "question": f"Why does entropy increase? ({_nonce(i, warm_cache)})",
+    })
+
+
+def tutor_stream_request(i, warm_cache):
+    path, (body, content_type) = tutor_request(i, warm_cache)
+    return path, _json_body(dict(json.loads(body), stream=True))
+
+
+def image_request(i, warm_cache):
+    return "/generate-image", _json_body({"concept": f"Krebs cycle {_nonce(i, warm_cache)}"})
+
+
+SCENARIOS = {
+    "upload-pdf-2p": pdf_scenario(2),
+    "upload-pdf-10p": pdf_scenario(10),
+    "upload-pdf-40p": pdf_scenario(40),
+    "upload-image": image_scenario(3),
+    "ai-assistant": assistant_request,
+    "ai-tutor": tutor_request,
+    "ai-tutor-stream": tutor_stream_request,
+    "generate-image": image_request,
+}
+DEFAULT_SCENARIOS = ["upload-pdf-2p", "upload-pdf-10p", "upload-image",
+                     "ai-assistant", "ai-tutor", "ai-tutor-stream", "generate-image"]
+
+
+# ── App under test ───────────────────────────────────────────
+def _wait_until_up(base_url, timeout=30):
+    host, port = base_url.split("//", 1)[1].split(":")
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection(host, int(port), timeout=2)
+            conn.request("GET", "/health")
+            if conn.getresponse().status == 200:
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise SystemExit(f"app did not come up on {base_url}")
+
+
+def _free_port():
+    import socket
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_app(args, env, workdir):
+    """Returns (base_url, stop). The env must be in place before app.py is imported."""
+    port = _free_port()
+    if args.server == "inprocess":
+        os.environ.update(env)
+        os.chdir(workdir)  # uploads/ lands in the scratch directory
+        from werkzeug.serving import make_server
+
+        import app
+
+        server = make_server("127.0.0.1", port, app.app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        stop = server.shutdown
+    else:
+        if args.server == "asgi":
+            command = [sys.executable, "-m", "uvicorn", "asgi:app", "--host", "127.0.0.1", "--port", str(port),
+                       "--log-level", "warning", "--no-access-log", *shlex.split(args.asgi_args)]
+        else:
+            command = [sys.executable, "-m", "gunicorn", "app:app", "-b", f"127.0.0.1:{port}",
+                       "--log-level", "warning", *shlex.split(args.gunicorn_args)]
+        proc = subprocess.Popen(command, cwd=BACKEND_DIR, env=dict(os.environ, **env),
+                                stdout=subprocess.DEVNULL if args.quiet else None)
+
+        def stop():
+            proc.terminate()
+            proc.wait(timeout=30)
+    base_url = f"http://127.0.0.1:{port}"
+    _wait_until_up(base_url)
+    return base_url, stop
+
+
+# ── Load generation ──────────────────────────────────────────
+def _send(host, port, path, body, content_type, timeout):
+    """Returns (seconds, ok, status). ok also requires a JSON body without success=false."""
+    start = time.perf_counter()
+    try:
+        conn = http.client.HTTPConnection(host, port, timeout=timeout)
+        conn.request("POST", path, body=body, headers={"Content-Type": content_type})
+        response = conn.getresponse()
+        data = response.read()
+        conn.close()
+    except OSError as e:
+        return time.perf_counter() - start, False, type(e).__name__
+    elapsed = time.perf_counter() - start
+    ok = 200 <= response.status < 300
+    if ok and response.getheader("Content-Type", "").startswith("application/json"):
+        ok = json.loads(data).get("success", True) is not False
+    elif ok and b"event: error" in data:
+        ok = False
+    return elapsed, ok, response.status
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def run_scenario(base_url, name, concurrency, requests, warm_cache, timeout):
+    host, port = base_url.split("//", 1)[1].split(":")
+    # Bodies are built up front so client-side PDF/PNG generation isn't timed
+    bodies = [SCENARIOS[name](i, warm_cache) for i in range(requests)]
+    # One unmeasured request first, so lazy imports and pools aren't in the numbers
+    path, (body, content_type) = SCENARIOS[name](requests, warm_cache)
+    _send(host, int(port), path, body, content_type, timeout)
+    results = []
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        start = time.perf_counter()
+        futures = [pool.submit(_send, host, int(port), path, body, content_type, timeout)
+                   for path, (body, content_type) in bodies]
+        for future in futures:
+            results.append(future.result())
+        wall = time.perf_counter() - start
+
+    latencies = sorted(seconds * 1000 for seconds, _, _ in results)
+    statuses = {}
+    for _, _, status in results:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    ok = sum(1 for _, success, _ in results if success)
+    return {
+        "scenario": name,
+        "concurrency": concurrency,
+        "requests": requests,
+        "ok": ok,
+        "errors": requests - ok,
+        "statuses": statuses,
+        "wall_seconds": round(wall, 3),
+        "throughput_rps": round(ok / wall, 2) if wall else None,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50), 1),
+            "p95": round(percentile(latencies, 95), 1),
+            "p99": round(percentile(latencies, 99), 1),
+            "mean": round(sum(latencies) / len(latencies), 1),
+            "max": round(latencies[-1], 1),
+        },
+    }
+
+
+# ── Reporting ────────────────────────────────────────────────
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def print_row(row):
+    lat = row["latency_ms"]
+    print(f"{row['scenario']:<16} {row['concurrency']:>5} {row['throughput_rps']:>8.2f} "
+          f"{lat['p50']:>8.1f} {lat['p95']:>8.1f} {lat['p99']:>8.1f} {row['errors']:>6}")
+
+
+def compare(old_path, rows):
+    with open(old_path) as f:
+        old = {(r["scenario"], r["concurrency"]): r for r in json.load(f)["results"]}
+    print(f"\nvs {old_path} (negative latency / positive throughput change is better)")
+    print(f"{'scenario':<16} {'conc':>5} {'rps':>9} {'p50':>9} {'p95':>9} {'p99':>9}")
+
+    def delta(new, before):
+        if not before or new is None:
+            return "      n/a"
+        return f"{100 * (new - before) / before:>+8.1f}%"
+
+    for row in rows:
+        before = old.get((row["scenario"], row["concurrency"]))
+        if before is None:
+            continue
+        print(f"{row['scenario']:<16} {row['concurrency']:>5} "
+              f"{delta(row['throughput_rps'], before['throughput_rps'])} "
+              + " ".join(delta(row["latency_ms"][p], before["latency_ms"][p]) for p in ("p50", "p95", "p99")))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenarios", nargs="+", default=DEFAULT_SCENARIOS, choices=sorted(SCENARIOS))
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=50, help="requests per scenario and level")
+    parser.add_argument("--warm-cache", action="store_true", help="repeat identical content")
+    parser.add_argument("--timeout", type=float, default=120.0, help="client timeout, seconds")
+    parser.add_argument("--server", choices=["inprocess", "gunicorn", "asgi"], default="inprocess",
+                        help="inprocess: threaded werkzeug server in this process; asgi: uvicorn asgi:app")
+    parser.add_argument("--gunicorn-args", default="-w 2 --threads 4 --timeout 120")
+    parser.add_argument("--asgi-args", default="--workers 2")
+    parser.add_argument("--app-env", action="append", default=[], metavar="KEY=VALUE",
+                        help="extra environment for the app, e.g. UPLOAD_MODE=sync")
+    parser.add_argument("--output", help="JSON results path (default: benchmarks/results/...)")
+    parser.add_argument("--compare", help="earlier results JSON to diff against")
+    parser.add_argument("--quiet", action="store_true", help="hide the app's JSON logs")
+    fake_backends.add_profile_args(parser)
+    args = parser.parse_args()
+    # The in-process server changes directory; resolve paths first
+    output = os.path.abspath(args.output) if args.output else None
+    previous = os.path.abspath(args.compare) if args.compare else None
+
+    profiles = fake_backends.profiles_from_args(args)
+    fakes = fake_backends.start_fake_server(profiles)
+    workdir = tempfile.mkdtemp(prefix="studyflow-load-")
+    env = dict(
+        fake_backends.fake_env(fakes.url),
+        USER_STORE="memory",
+        AI_CACHE_DB=os.path.join(workdir, "ai_cache.sqlite3"),
+        OCR_CACHE_DIR=os.path.join(workdir, "ocr"),
+        DIAGRAM_CACHE_DIR=os.path.join(workdir, "diagrams"),
+        UPLOAD_FOLDER=os.path.join(workdir, "uploads"),
+        UPLOAD_MODE="sync",
+        SYLLABUS_JOB_DB=os.path.join(workdir, "jobs.sqlite3"),
+        # The fakes have no quota; pass e.g. --app-env LLM_RATE_GROQ=30/60 to test admission control
+        LLM_RATE_DB=os.path.join(workdir, "rate_limit.sqlite3"),
+        LLM_RATE_GROQ="", LLM_RATE_GEMINI="", LLM_RATE_IMAGEN="",
+        # Uploads would queue background quiz generation; --app-env QUIZ_BANK=1 includes it
+        QUIZ_BANK="0", QUIZ_BANK_DB=os.path.join(workdir, "quiz_bank.sqlite3"),
+    )
+    env.update(item.split("=", 1) for item in args.app_env)
+    if args.quiet:
+        import logging
+
+        for name in ("studyflow", "werkzeug"):
+            logging.getLogger(name).disabled = True
+    base_url, stop = start_app(args, env, workdir)
+
+    rows = []
+    print(f"{'scenario':<16} {'conc':>5} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>6}")
+    try:
+        for name in args.scenarios:
+            for concurrency in args.concurrency:
+                row = run_scenario(base_url, name, concurrency, args.requests, args.warm_cache, args.timeout)
+                rows.append(row)
+                print_row(row)
+    finally:
+        stop()
+
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "server": args.server,
+            "gunicorn_args": args.gunicorn_args if args.server == "gunicorn" else None,
+            "asgi_args": args.asgi_args if args.server == "asgi" else None,
+            "requests": args.requests,
+            "warm_cache": args.warm_cache,
+            "app_env": args.app_env,
+            "profiles": {api: profile._asdict() for api, profile in profiles.items()},
+            "backend_calls": fakes.calls,
+        },
+        "results": rows,
+    }
+    output = output or os.path.join(
+        BENCH_DIR, "results", f"load-{report['meta']['commit']}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nresults written to {output}")
+    if previous:
+        compare(previous, rows)
+
+
+if __name__ == "__main__":
+    main()
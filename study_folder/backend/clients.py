@@ -0,0 +1,110 @@
+"""Per-worker client reuse, lazy heavy imports and a boot-time report.
+
+google.generativeai, PIL, pytesseract and PyPDF2 together account for most
+of app.py's import time. They are wrapped in LazyModule, so a worker can
+start serving (e.g. /health) before they load. Each load is timed for the
+/debug startup report. Gemini model objects are built once per worker and
+reused.
+"""
+import importlib
+import os
+import sys
+import threading
+import time
+from functools import lru_cache
+
+from logs import log
+
+BOOT_STARTED = time.perf_counter()
+_boot = {"pid": os.getpid(), "boot_seconds": None, "imports": {}}
+_lock = threading.RLock()
+
+
+class LazyModule:
+    """Stands in for a module and imports it on first attribute access."""
+
+    def __init__(self, name, on_load=None):
+        self._name = name
+        self._on_load = on_load
+        self._module = None
+
+    def _load(self, trigger="request"):
+        if self._module is None:
+            with _lock:
+                if self._module is None:
+                    already_loaded = self._name in sys.modules
+                    start = time.perf_counter()
+                    module = importlib.import_module(self._name)
+                    if self._on_load:
+                        self._on_load(module)
+                    _boot["imports"][self._name] = {
+                        "seconds": round(time.perf_counter() - start, 4),
+                        "trigger": "preloaded" if already_loaded else trigger,
+                        "at": round(time.perf_counter() - BOOT_STARTED, 3),
+                    }
+                    self._module = module
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+
+def gemini_uses_rest():
+    # GEMINI_API_ENDPOINT points the SDK at another server over REST, e.g. the
+    # fake backends used by benchmarks/load_test.py
+    return bool(os.getenv("GEMINI_API_ENDPOINT"))
+
+
+def _configure_genai(module):
+    endpoint = os.getenv("GEMINI_API_ENDPOINT")
+    if endpoint:
+        module.configure(api_key=os.getenv("GEMINI_API_KEY"), transport="rest",
+                         client_options={"api_endpoint": endpoint})
+    else:
+        module.configure(api_key=os.getenv("GEMINI_API_KEY"))
+
+
+genai = LazyModule("google.generativeai", on_load=_configure_genai)
+pil_image = LazyModule("PIL.Image")
+ocr = LazyModule("ocr")
+pdf_extract = LazyModule("pdf_extract")
+
+HEAVY_MODULES = [genai, pil_image, pdf_extract, ocr]
+
+
+# ── Reused model objects ─────────────────────────────────────
+@lru_cache(maxsize=None)
+def gemini_model(name):
+    return genai.GenerativeModel(name)
+
+
+@lru_cache(maxsize=None)
+def imagen_model(name):
+    return genai.ImageGenerationModel(name)
+
+
+# ── Boot report ──────────────────────────────────────────────
+def mark_booted():
+    _boot["boot_seconds"] = round(time.perf_counter() - BOOT_STARTED, 4)
+
+
+def warm_up_in_background():
+    """Loads heavy modules after boot so the first real request doesn't pay for them."""
+    def run():
+        for module in HEAVY_MODULES:
+            try:
+                module._load(trigger="warmup")
+            except Exception as e:
+                log("warmup_import_failed", level="warning", module=module._name, error=str(e))
+
+    threading.Thread(target=run, name="warmup", daemon=True).start()
+
+
+def startup_report():
+    with _lock:
+        return {
+            "pid": _boot["pid"],
+            "boot_seconds": _boot["boot_seconds"],
+            "uptime_seconds": round(time.perf_counter() - BOOT_STARTED, 1),
+            "imports": dict(_boot["imports"]),
+        }
@@ -0,0 +1,149 @@
+"""On-disk cache of concept diagrams for /generate-image.
+
+Diagrams are keyed by the normalized concept ("Photosynthesis!" and
+"photosynthesis" share one). Each entry is a JSON record (prompt, source,
+ETag, or an external URL) plus, for rendered images, a PNG next to it:
+    DIAGRAM_CACHE_DIR/<key>.json
+    DIAGRAM_CACHE_DIR/<key>.png
+Files are written atomically, so every gunicorn worker can share the
+directory. Images are served as bytes from /diagrams/<key>.png with an
+ETag, instead of being base64-inlined into JSON.
+
+Rendered images are an LRU capped at DIAGRAM_CACHE_MAX_BYTES: cache hits
+bump the PNG's mtime, and each new image evicts the least recently used
+ones past the cap.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+
+from logs import log
+from sections import topic_key
+
+DIAGRAM_CACHE_DIR = os.getenv("DIAGRAM_CACHE_DIR", os.path.join("cache", "diagrams"))
+# Rendered-image records live until evicted for space; URL-only (fallback)
+# records are retried after this many seconds in case Imagen comes back.
+FALLBACK_TTL = int(os.getenv("DIAGRAM_FALLBACK_TTL", str(24 * 3600)))
+DIAGRAM_CACHE_MAX_BYTES = int(os.getenv("DIAGRAM_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+# The check-and-claim of a key is guarded by one of this many locks
+LOCK_STRIPES = 64
+
+
+def concept_key(concept):
+    normalized = topic_key(concept)
+    if not normalized:
+        return None
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()[:32]
+
+
+class DiagramCache:
+    def __init__(self, root=DIAGRAM_CACHE_DIR, max_bytes=DIAGRAM_CACHE_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._locks = [threading.Lock() for _ in range(LOCK_STRIPES)]
+        self._rendering = {}  # key -> [Event, record or exception] while a render runs
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, key, ext):
+        return os.path.join(self.root, f"{key}.{ext}")
+
+    def _lock(self, key):
+        return self._locks[int(key[:8], 16) % LOCK_STRIPES]
+
+    def get_or_render(self, key, render):
+        """Returns (record, cached). render() runs at most once at a time per key in
+        this worker; concurrent callers for the same key wait for its result. The
+        stripe lock only covers the check-and-claim, never the render itself."""
+        record = self.get(key)
+        if record is not None:
+            return record, True
+        with self._lock(key):
+            record = self.get(key)
+            if record is not None:
+                return record, True
+            slot = self._rendering.get(key)
+            owner = slot is None
+            if owner:
+                slot = self._rendering[key] = [threading.Event(), None]
+        if not owner:
+            slot[0].wait()
+            if isinstance(slot[1], Exception):
+                raise slot[1]
+            return slot[1], True
+        try:
+            slot[1] = render()
+            return slot[1], False
+        except Exception as e:
+            slot[1] = e
+            raise
+        finally:
+            with self._lock(key):
+                del self._rendering[key]
+            slot[0].set()
+
+    def get(self, key):
+        try:
+            with open(self._path(key, "json"), encoding="utf-8") as f:
+                record = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if record.get("etag"):
+            try:
+                os.utime(self._path(key, "png"))  # LRU: a hit makes the image recent
+            except OSError:
+                return None
+        elif time.time() - record.get("created_at", 0) > FALLBACK_TTL:
+            return None
+        return record
+
+    def image_path(self, key):
+        path = self._path(key, "png")
+        return path if os.path.exists(path) else None
+
+    def _write(self, path, data):
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def put(self, key, concept, prompt, source, png=None, image_url=None):
+        record = {"concept": concept, "prompt": prompt, "source": source,
+                  "image_url": image_url, "etag": None, "bytes": None, "created_at": time.time()}
+        try:
+            if png is not None:
+                record["etag"] = hashlib.sha256(png).hexdigest()[:32]
+                record["bytes"] = len(png)
+                self._write(self._path(key, "png"), png)  # image first: a record never points at nothing
+            self._write(self._path(key, "json"), json.dumps(record).encode("utf-8"))
+            if png is not None:
+                self.evict()
+        except OSError as e:
+            log("diagram_cache_write_failed", level="warning", key=key, error=str(e))
+        return record
+
+    def evict(self):
+        """Deletes the least recently used images until they fit max_bytes."""
+        if not self.max_bytes:
+            return 0
+        images = []
+        for entry in os.scandir(self.root):
+            if entry.name.endswith(".png"):
+                stat = entry.stat()
+                images.append((stat.st_mtime, stat.st_size, entry.name[:-len(".png")]))
+        total = sum(size for _, size, _ in images)
+        evicted = 0
+        for _, size, key in sorted(images):
+            if total <= self.max_bytes:
+                break
+            for ext in ("json", "png"):  # record first: a record never points at nothing
+                try:
+                    os.remove(self._path(key, ext))
+                except FileNotFoundError:
+                    pass  # another worker evicted it first
+            total -= size
+            evicted += 1
+        if evicted:
+            log("diagrams_evicted", count=evicted)
+        return evicted
@@ -0,0 +1,178 @@
+"""Small job queue for slow request work (no external broker).
+
+Jobs run on a bounded thread pool in the worker that accepted them. Each job
+reports the stage it is in so a status endpoint can be polled until the
+result is ready. Job rows (status, stage, result, error) are kept in a
+SQLite file shared by every worker, so a poll can land on any of them.
+Finished jobs are kept for `retention` seconds and then dropped.
+
+The worker running a job touches its row every `heartbeat` seconds. A
+queued or running row not touched for `stale_after` seconds belongs to a
+worker that died or restarted, and is reported (then stored) as failed.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from logs import log, with_request_id
+
+
+class JobFailed(Exception):
+    """Raised by a job function to fail with a client-facing message."""
+
+    def __init__(self, message):
+        super().__init__(message)
+        self.message = message
+
+
+class Job:
+    def __init__(self, queue, job_id):
+        self._queue = queue
+        self.id = job_id
+        self.status = "queued"
+        self.stage = "queued"
+        self.result = None
+        self.message = None
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+        self.finished_at = None
+
+    def set_stage(self, stage):
+        self.stage = stage
+        self.updated_at = time.time()
+        self._queue._save(self)
+
+
+WORKER_LOST = "Job lost: the server restarted while processing it. Please upload again."
+
+
+def snapshot(row, stale_before=None):
+    """The status endpoint's view of a stored job row. A live row last touched
+    before stale_before is reported as failed."""
+    job_id, status, stage, result, message, created_at, updated_at, finished_at = row
+    if status in ("queued", "running") and stale_before is not None and updated_at < stale_before:
+        status, message, finished_at = "failed", WORKER_LOST, updated_at
+    data = {
+        "job_id": job_id,
+        "status": status,
+        "stage": stage,
+        "elapsed": round((finished_at or time.time()) - created_at, 3),
+    }
+    if status == "done":
+        data["result"] = json.loads(result)
+    elif status == "failed":
+        data["message"] = message
+    return data
+
+
+class JobQueue:
+    def __init__(self, db_path, max_workers=2, retention=3600, stale_after=120, heartbeat=15):
+        self.db_path = db_path
+        self.retention = retention
+        self.stale_after = stale_after
+        self.heartbeat = heartbeat
+        self._live = set()  # ids of this process's queued and running jobs
+        self._live_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._local = threading.local()
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._conn()
+        conn.executescript(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY, status TEXT NOT NULL, stage TEXT NOT NULL, result TEXT, message TEXT,"
+            " created_at REAL NOT NULL, updated_at REAL NOT NULL, finished_at REAL);"
+            "CREATE INDEX IF NOT EXISTS jobs_by_finish ON jobs (finished_at);"
+        )
+        conn.commit()
+        threading.Thread(target=self._beat, name="job-heartbeat", daemon=True).start()
+
+    def _beat(self):
+        while True:
+            time.sleep(self.heartbeat)
+            with self._live_lock:
+                live = list(self._live)
+            if not live:
+                continue
+            try:
+                conn = self._conn()
+                with conn:
+                    conn.executemany("UPDATE jobs SET updated_at = ? WHERE id = ? AND finished_at IS NULL",
+                                     [(time.time(), job_id) for job_id in live])
+            except Exception as e:
+                log("job_heartbeat_failed", level="warning", error=str(e))
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _save(self, job):
+        result = json.dumps(job.result) if job.status == "done" else None
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO jobs"
+                " (id, status, stage, result, message, created_at, updated_at, finished_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (job.id, job.status, job.stage, result, job.message, job.created_at, job.updated_at,
+                 job.finished_at))
+
+    def submit(self, fn, *args, **kwargs):
+        """Queues fn(job, *args, **kwargs) and returns the new job id."""
+        job = Job(self, uuid.uuid4().hex)
+        self._prune()
+        self._save(job)
+        with self._live_lock:
+            self._live.add(job.id)
+        self._executor.submit(with_request_id(self._run), job, fn, args, kwargs)
+        return job.id
+
+    def get(self, job_id):
+        row = self._conn().execute(
+            "SELECT id, status, stage, result, message, created_at, updated_at, finished_at"
+            " FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return snapshot(row, time.time() - self.stale_after) if row else None
+
+    def _run(self, job, fn, args, kwargs):
+        job.status = "running"
+        self._save(job)
+        try:
+            job.result = fn(job, *args, **kwargs)
+            job.status = "done"
+            stage = "done"
+        except JobFailed as e:
+            job.message = e.message
+            job.status = "failed"
+            stage = job.stage
+        except Exception as e:
+            log("job_crashed", level="error", job_id=job.id, error=str(e))
+            job.message = f"Job failed: {str(e)}"
+            job.status = "failed"
+            stage = job.stage
+        job.finished_at = time.time()
+        try:
+            job.set_stage(stage)
+        except Exception as e:
+            log("job_save_failed", level="error", job_id=job.id, error=str(e))
+        finally:
+            with self._live_lock:
+                self._live.discard(job.id)
+
+    def _prune(self):
+        now = time.time()
+        conn = self._conn()
+        with conn:
+            # Jobs whose worker is gone are failed for good, then expire like any other
+            conn.execute("UPDATE jobs SET status = 'failed', message = ?, finished_at = updated_at"
+                         " WHERE finished_at IS NULL AND updated_at < ?", (WORKER_LOST, now - self.stale_after))
+            conn.execute("DELETE FROM jobs WHERE finished_at < ?", (now - self.retention,))
@@ -0,0 +1,60 @@
+"""Structured JSON logging with a per-request id.
+
+log("groq_failed", level="warning", error=str(e)) writes one JSON line to
+stdout with a timestamp, the level, the event name and the current request
+id. The middleware in app.py sets the request id from X-Request-ID, or
+generates one. Work handed to thread pools keeps it when the callable is
+wrapped with with_request_id().
+"""
+import contextvars
+import json
+import logging
+import sys
+import time
+
+_request_id = contextvars.ContextVar("request_id", default=None)
+
+_logger = logging.getLogger("studyflow")
+if not _logger.handlers:
+    _handler = logging.StreamHandler(sys.stdout)
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    _logger.addHandler(_handler)
+    _logger.setLevel(logging.INFO)
+    _logger.propagate = False
+
+_LEVELS = {"debug": logging.DEBUG, "info": logging.INFO,
+           "warning": logging.WARNING, "error": logging.ERROR}
+
+
+def get_request_id():
+    return _request_id.get()
+
+
+def set_request_id(request_id):
+    return _request_id.set(request_id)
+
+
+def with_request_id(fn):
+    """Wraps fn so it runs under the caller's request id, e.g. on a pool thread.
+
+    The whole context is carried over, so other context variables (such as
+    the rate_limit priority) follow the work too.
+    """
+    context = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        # A fresh copy per call: the wrapper may run on several threads at once
+        return context.copy().run(fn, *args, **kwargs)
+
+    return run
+
+
+def log(event, level="info", **fields):
+    record = {
+        "ts": round(time.time(), 3),
+        "level": level,
+        "event": event,
+        "request_id": _request_id.get(),
+    }
+    record.update(fields)
+    _logger.log(_LEVELS.get(level, logging.INFO), json.dumps(record, default=str, ensure_ascii=False))
@@ -0,0 +1,166 @@
+"""In-process metrics with a Prometheus text-format renderer for /metrics.
+
+Only counters and histograms are needed here. Values that already live
+elsewhere, such as the AI cache counters and circuit breaker states, are
+read at scrape time by collector callbacks. Each gunicorn worker keeps its
+own numbers; the `pid` label on process_info tells scrapes apart.
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _label_text(labels):
+    if not labels:
+        return ""
+    parts = []
+    for key, value in labels:
+        escaped = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        parts.append(f'{key}="{escaped}"')
+    return "{" + ",".join(parts) + "}"
+
+
+class Counter:
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_label_text(labels)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        self._series = {}  # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series):
+                    lines.append(f"{self.name}_bucket{_label_text(labels + (('le', bound),))} {count}")
+                lines.append(f"{self.name}_bucket{_label_text(labels + (('le', '+Inf'),))} {series[-1]}")
+                lines.append(f"{self.name}_sum{_label_text(labels)} {round(series[-2], 6)}")
+                lines.append(f"{self.name}_count{_label_text(labels)} {series[-1]}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def counter(self, name, help_text):
+        metric = Counter(name, help_text)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        metric = Histogram(name, help_text, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def collector(self, fn):
+        """fn() returns (name, type, help, [(labels_dict, value), ...]) tuples at scrape time."""
+        self._collectors.append(fn)
+        return fn
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for fn in self._collectors:
+            try:
+                families = fn()
+            except Exception as e:
+                lines.append(f"# collector {fn.__name__} failed: {e}")
+                continue
+            for name, kind, help_text, samples in families:
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_label_text(tuple(sorted(labels.items())))} {value}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+http_requests = REGISTRY.counter(
+    "http_requests_total", "HTTP requests by route, method and status.")
+http_latency = REGISTRY.histogram(
+    "http_request_duration_seconds", "Time to produce a response, by route and method.")
+syllabus_stages = REGISTRY.histogram(
+    "syllabus_stage_duration_seconds", "Time spent in each /upload-syllabus stage.")
+llm_latency = REGISTRY.histogram(
+    "llm_request_duration_seconds", "LLM provider call latency by provider and outcome.")
+llm_requests = REGISTRY.counter(
+    "llm_requests_total", "LLM provider calls by provider and outcome (success, failure, timeout).")
+llm_tokens = REGISTRY.counter(
+    "llm_tokens_total", "Tokens reported by LLM providers, by provider and kind.")
+llm_served = REGISTRY.counter(
+    "llm_served_total", "Requests answered per provider; fallback=true when not the first choice.")
+
+
+@REGISTRY.collector
+def process_info():
+    return [("process_info", "gauge", "Worker process serving this scrape.",
+             [({"pid": os.getpid()}, 1)])]
+
+
+def stage_timer(stage):
+    return syllabus_stages.time(stage=stage)
+
+
+class LLMObserver:
+    """Receives ProviderChain events and turns them into llm_* metrics."""
+
+    def call(self, provider, seconds, outcome):
+        llm_latency.observe(seconds, provider=provider, outcome=outcome)
+        llm_requests.inc(provider=provider, outcome=outcome)
+
+    def usage(self, provider, prompt_tokens, completion_tokens):
+        if prompt_tokens:
+            llm_tokens.inc(prompt_tokens, provider=provider, kind="prompt")
+        if completion_tokens:
+            llm_tokens.inc(completion_tokens, provider=provider, kind="completion")
+
+    def served(self, provider, fallback):
+        llm_served.inc(provider=provider, fallback=str(bool(fallback)).lower())
@@ -0,0 +1,290 @@
+"""Tiled, multi-core Tesseract OCR.
+
+Pages are cleaned up (grayscale, deskewed, binarized), cut into horizontal
+tiles at blank rows so no text line is split, and the tiles are OCR'd in
+parallel. Each pytesseract call runs its own tesseract process, so a bounded
+thread pool is enough to keep several cores busy. The text is then joined
+back in reading order.
+
+Preprocessed pages are cached on disk by content hash, so a retry skips
+that step. The cache is an LRU capped at OCR_CACHE_MAX_BYTES: reads bump a
+file's mtime, and each write evicts the least recently used files past the
+cap. Once a syllabus is extracted its raw text is memoized by the upload
+store, so evicted pages are only ever needed again for a fresh retry.
+
+Compare against the old single-call path with:
+    python ocr.py uploads/sample_syllabus.png --repeat 3
+"""
+import hashlib
+import io
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytesseract
+from PIL import Image, ImageOps, ImageSequence, ImageStat
+
+from logs import log
+
+# "tiled" (default) or "single" (one tesseract call per page, the old path)
+OCR_MODE = os.getenv("OCR_MODE", "tiled")
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", str(min(4, os.cpu_count() or 1))))
+OCR_TILE_HEIGHT = int(os.getenv("OCR_TILE_HEIGHT", "900"))
+OCR_CACHE_DIR = os.getenv("OCR_CACHE_DIR", os.path.join("cache", "ocr"))
+OCR_CACHE_MAX_BYTES = int(os.getenv("OCR_CACHE_MAX_BYTES", str(200 * 1024 * 1024)))
+TESSERACT_CONFIG = "--psm 3"
+
+MIN_WIDTH = 1000
+BLANK_ROW = 253          # mean row brightness at or above this counts as whitespace
+MAX_SKEW_DEGREES = 5
+PREPROCESS_VERSION = "1"  # bump when preprocessing changes to invalidate the cache
+
+if os.name == 'nt':  # Windows
+    pytesseract.pytesseract.tesseract_cmd = r"C:\Program Files\Tesseract-OCR\tesseract.exe"
+else:  # Render / Linux
+    pytesseract.pytesseract.tesseract_cmd = "/usr/bin/tesseract"
+
+_pool = None
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        # Each tesseract process should stay single-threaded; we parallelise across tiles.
+        os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+        _pool = ThreadPoolExecutor(max_workers=OCR_WORKERS, thread_name_prefix="ocr")
+    return _pool
+
+
+# ── Preprocessing ────────────────────────────────────────────
+def _upscale(image):
+    width, height = image.size
+    if width < MIN_WIDTH:
+        scale = MIN_WIDTH / width
+        image = image.resize((int(width * scale), int(height * scale)), Image.LANCZOS)
+    return image
+
+
+def _otsu_threshold(gray):
+    histogram = gray.histogram()
+    total = sum(histogram)
+    sum_all = sum(i * count for i, count in enumerate(histogram))
+    sum_bg, weight_bg, best, threshold = 0, 0, 0, 128
+    for i, count in enumerate(histogram):
+        weight_bg += count
+        if weight_bg == 0:
+            continue
+        weight_fg = total - weight_bg
+        if weight_fg == 0:
+            break
+        sum_bg += i * count
+        mean_bg = sum_bg / weight_bg
+        mean_fg = (sum_all - sum_bg) / weight_fg
+        between = weight_bg * weight_fg * (mean_bg - mean_fg) ** 2
+        if between > best:
+            best, threshold = between, i
+    return threshold
+
+
+def _row_profile(image):
+    """Mean brightness of every row, via a one-pixel-wide box resize."""
+    return list(image.resize((1, image.size[1]), Image.BOX).getdata())
+
+
+def _skew_angle(binary):
+    # Text lines line up best (sharpest row profile) at the correct angle.
+    small = binary.copy()
+    small.thumbnail((400, 400))
+    best_angle, best_score = 0.0, -1.0
+    steps = int(MAX_SKEW_DEGREES * 2)
+    for step in range(-steps, steps + 1):
+        angle = step / 2
+        rotated = small.rotate(angle, resample=Image.BILINEAR, fillcolor=255)
+        profile = rotated.resize((1, rotated.size[1]), Image.BOX)
+        score = ImageStat.Stat(profile).var[0]
+        if score > best_score:
+            best_angle, best_score = angle, score
+    return best_angle
+
+
+def preprocess(image):
+    """Grayscale -> upscale -> deskew -> binarize."""
+    gray = _upscale(ImageOps.grayscale(image))
+    threshold = _otsu_threshold(gray)
+    binary = gray.point(lambda v: 255 if v > threshold else 0)
+
+    angle = _skew_angle(binary)
+    if angle:
+        gray = gray.rotate(angle, resample=Image.BICUBIC, expand=True, fillcolor=255)
+        binary = gray.point(lambda v: 255 if v > threshold else 0)
+    return binary
+
+
+def preprocess_cached(image, content_hash):
+    """preprocess(), memoized on disk under the source content hash."""
+    path = os.path.join(OCR_CACHE_DIR, f"{content_hash}-v{PREPROCESS_VERSION}.png")
+    if os.path.exists(path):
+        try:
+            with Image.open(path) as cached:
+                image = cached.copy()
+            os.utime(path)
+            return image
+        except Exception as e:
+            log("ocr_cache_read_failed", level="warning", error=str(e))
+
+    processed = preprocess(image)
+    try:
+        os.makedirs(OCR_CACHE_DIR, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        processed.save(tmp_path, format="PNG")
+        os.replace(tmp_path, path)
+        evict_cache()
+    except Exception as e:
+        log("ocr_cache_write_failed", level="warning", error=str(e))
+    return processed
+
+
+def evict_cache(max_bytes=None):
+    """Deletes the least recently used cached pages until the cache fits max_bytes."""
+    max_bytes = OCR_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    if not max_bytes:
+        return 0
+    entries = []
+    for entry in os.scandir(OCR_CACHE_DIR):
+        if entry.name.endswith(".png"):
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+    total = sum(size for _, size, _ in entries)
+    evicted = 0
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass  # another worker evicted it first
+        total -= size
+        evicted += 1
+    if evicted:
+        log("ocr_cache_evicted", count=evicted)
+    return evicted
+
+
+# ── Tiling ───────────────────────────────────────────────────
+def split_tiles(binary, tile_height=None):
+    """Returns (top, bottom) row bands cut at whitespace, skipping blank bands."""
+    tile_height = tile_height or OCR_TILE_HEIGHT
+    height = binary.size[1]
+    profile = _row_profile(binary)
+    blank = [value >= BLANK_ROW for value in profile]
+
+    cuts = [0]
+    position = tile_height
+    while position < height - tile_height // 2:
+        cut = _nearest_blank(blank, position, tile_height // 2)
+        cuts.append(cut if cut is not None else position)
+        position = cuts[-1] + tile_height
+    cuts.append(height)
+
+    return [(top, bottom) for top, bottom in zip(cuts, cuts[1:])
+            if bottom > top and not all(blank[top:bottom])]
+
+
+def _nearest_blank(blank, position, window):
+    for offset in range(window):
+        for row in (position - offset, position + offset):
+            if 0 < row < len(blank) and blank[row]:
+                return row
+    return None
+
+
+# ── OCR ──────────────────────────────────────────────────────
+def _ocr(image):
+    return pytesseract.image_to_string(image, config=TESSERACT_CONFIG)
+
+
+def _single_pass(frame):
+    # The original path: RGB + upscale + one tesseract call for the whole page.
+    return _ocr(_upscale(frame.convert("RGB")))
+
+
+def _frames(image):
+    return [frame.copy() for frame in ImageSequence.Iterator(image)]
+
+
+def ocr_frames(frames, content_hash=None, mode=None):
+    """OCRs a list of page images and returns their text in reading order."""
+    mode = mode or OCR_MODE
+    if mode == "single":
+        return "\n".join(_single_pass(frame) for frame in frames)
+
+    tiles = []
+    for index, frame in enumerate(frames):
+        if content_hash:
+            binary = preprocess_cached(frame, f"{content_hash}-{index}")
+        else:
+            binary = preprocess(frame)
+        width = binary.size[0]
+        tiles.extend(binary.crop((0, top, width, bottom)) for top, bottom in split_tiles(binary))
+
+    if len(tiles) <= 1 or OCR_WORKERS <= 1:
+        texts = [_ocr(tile) for tile in tiles]
+    else:
+        texts = list(_get_pool().map(_ocr, tiles))
+    return "\n".join(text.strip() for text in texts if text.strip())
+
+
+def ocr_image_bytes(data, mode=None):
+    content_hash = hashlib.sha256(data).hexdigest()
+    with Image.open(io.BytesIO(data)) as image:
+        return ocr_frames(_frames(image), content_hash=content_hash, mode=mode)
+
+
+def ocr_image_file(filepath, mode=None):
+    """OCRs every page of an image file (multi-page TIFFs included)."""
+    with open(filepath, "rb") as f:
+        return ocr_image_bytes(f.read(), mode=mode)
+
+
+# ── Throughput / accuracy comparison ─────────────────────────
+def _similarity(a, b):
+    import difflib
+    return round(difflib.SequenceMatcher(None, a.split(), b.split()).ratio(), 4)
+
+
+def compare_modes(filepath, repeat=1, truth=None):
+    """Times both modes on one file and reports how close their output is."""
+    report = {}
+    outputs = {}
+    for mode in ("single", "tiled"):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            outputs[mode] = ocr_image_file(filepath, mode=mode)
+            timings.append(time.perf_counter() - start)
+        report[mode] = {
+            "best_seconds": round(min(timings), 3),
+            "mean_seconds": round(sum(timings) / len(timings), 3),
+            "words": len(outputs[mode].split()),
+        }
+        if truth is not None:
+            report[mode]["accuracy_vs_truth"] = _similarity(outputs[mode], truth)
+    report["agreement"] = _similarity(outputs["single"], outputs["tiled"])
+    return report
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Compare single-call and tiled OCR.")
+    parser.add_argument("image", nargs="?", default=os.path.join("uploads", "sample_syllabus.png"))
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--truth", help="text file with the expected transcription")
+    args = parser.parse_args()
+
+    expected = None
+    if args.truth:
+        with open(args.truth, encoding="utf-8") as f:
+            expected = f.read()
+    print(json.dumps(compare_modes(args.image, repeat=args.repeat, truth=expected), indent=2))
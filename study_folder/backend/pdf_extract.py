@@ -0,0 +1,151 @@
+"""Parallel per-page PDF text extraction.
+
+Pages are split into ranges and extracted on a shared process pool. Results
+are streamed back in page order, so callers can stop early once they have
+enough text. Pages without a text layer (scanned pages) are OCR'd on their
+own instead of failing the whole document.
+"""
+import multiprocessing
+import os
+import sys
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from PyPDF2 import PdfReader
+
+from logs import log
+
+PDF_MAX_PAGES = int(os.getenv("PDF_MAX_PAGES", "300"))
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "8"))
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Stop reading once this many characters of text are collected (0 = read all pages).
+PDF_TEXT_TARGET = int(os.getenv("PDF_TEXT_TARGET", "60000"))
+# A page with less text than this is treated as scanned.
+MIN_PAGE_TEXT = 25
+
+# method is "text", "ocr", "empty", or "needs_ocr". needs_ocr means the page
+# is scanned, local OCR failed, and `images` holds the raw image bytes for a
+# fallback.
+PageText = namedtuple("PageText", ["index", "text", "method", "images"])
+
+# Workers must not be forked from a process that already has threads running
+# (the OCR tile pool, the web server's). forkserver starts them from a clean
+# single-threaded process; Windows only has spawn.
+PDF_START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+_pool = None
+
+
+def _init_worker():
+    # A worker that did get a copy of ocr's thread pool would have none of its
+    # threads, and map() on it would never return: start from a fresh one.
+    ocr = sys.modules.get("ocr")
+    if ocr is not None:
+        ocr._pool = None
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=PDF_WORKERS, initializer=_init_worker,
+                                    mp_context=multiprocessing.get_context(PDF_START_METHOD))
+    return _pool
+
+
+def _page_images(page):
+    try:
+        return [image.data for image in page.images]
+    except Exception:
+        return []
+
+
+def _ocr_images(images):
+    from ocr import ocr_image_bytes
+
+    parts = [ocr_image_bytes(data) for data in images]
+    return "\n".join(part for part in parts if part.strip())
+
+
+def extract_page_range(filepath, start, stop):
+    """Extracts pages [start, stop) from filepath. Runs inside pool workers."""
+    return _extract_pages(PdfReader(filepath), start, stop)
+
+
+def _extract_pages(reader, start, stop):
+    results = []
+    for index in range(start, stop):
+        page = reader.pages[index]
+        text = page.extract_text() or ""
+        if len(text.strip()) >= MIN_PAGE_TEXT:
+            results.append(PageText(index, text, "text", None))
+            continue
+
+        images = _page_images(page)
+        if not images:
+            results.append(PageText(index, text, "empty", None))
+            continue
+        try:
+            ocr_text = _ocr_images(images)
+            if len(ocr_text.strip()) >= MIN_PAGE_TEXT:
+                results.append(PageText(index, ocr_text, "ocr", None))
+                continue
+        except Exception as e:
+            log("pdf_page_ocr_failed", level="warning", page=index + 1, error=str(e))
+        results.append(PageText(index, text, "needs_ocr", images))
+    return results
+
+
+def iter_pdf_pages(filepath, max_pages=None, pages_per_task=None, workers=None):
+    """Yields PageText results in page order while later ranges are still running."""
+    max_pages = max_pages or PDF_MAX_PAGES
+    pages_per_task = pages_per_task or PDF_PAGES_PER_TASK
+    workers = workers or PDF_WORKERS
+
+    reader = PdfReader(filepath)
+    total = min(len(reader.pages), max_pages)
+    ranges = deque((start, min(start + pages_per_task, total))
+                   for start in range(0, total, pages_per_task))
+
+    # Small documents (or single-core hosts) aren't worth the pool round trip.
+    if len(ranges) <= 1 or workers <= 1:
+        for start, stop in ranges:
+            yield from _extract_pages(reader, start, stop)
+        return
+
+    # Keep only a bounded window in flight so an early stop wastes little work.
+    pool = _get_pool()
+    pending = deque()
+    try:
+        while ranges and len(pending) < workers * 2:
+            pending.append(pool.submit(extract_page_range, filepath, *ranges.popleft()))
+        while pending:
+            results = pending.popleft().result()
+            if ranges:
+                pending.append(pool.submit(extract_page_range, filepath, *ranges.popleft()))
+            yield from results
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def extract_pdf_text(filepath, fallback_ocr=None, max_pages=None, target_chars=None):
+    """Returns the document text, joined in page order.
+
+    fallback_ocr(image_bytes_list) is called for scanned pages that local OCR
+    could not read, e.g. to send them to Gemini.
+    """
+    if target_chars is None:
+        target_chars = PDF_TEXT_TARGET
+
+    parts = []
+    collected = 0
+    for page in iter_pdf_pages(filepath, max_pages=max_pages):
+        text = page.text
+        if page.method == "needs_ocr" and fallback_ocr:
+            text = fallback_ocr(page.images) or text
+        if text.strip():
+            parts.append(text)
+            collected += len(text)
+        if target_chars and collected >= target_chars:
+            break
+    return "\n".join(parts)
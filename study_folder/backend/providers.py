@@ -0,0 +1,719 @@
+"""LLM provider layer: per-provider timeouts, circuit breakers and hedging.
+
+A ProviderChain tries its providers in order. A provider whose circuit is
+open (it kept failing recently) is skipped without a network call. With a
+hedge delay set, the next provider is started when the current one hasn't
+answered within that delay, and the first successful answer wins.
+
+With a rate limiter attached, each call first takes a token for its
+provider (see rate_limit.py). A provider that is rate limited, locally or
+by an upstream 429, is skipped like an open circuit but without counting
+as a failure. If every provider is rate limited, Overloaded is raised with
+the shortest Retry-After.
+
+The same chain serves sync Flask routes (complete / stream) and asyncio
+code (acomplete / astream, used by the ASGI app in asgi.py). FakeProvider
+injects latency and errors for local testing:
+    python providers.py
+"""
+import asyncio
+import os
+import random
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from clients import gemini_model, gemini_uses_rest
+from logs import log, with_request_id
+from metrics import LLMObserver
+from rate_limit import RateLimited, limiter_from_env, retry_after_hint
+
+# Connections kept open to each provider per worker (reused across requests)
+LLM_POOL_CONNECTIONS = int(os.getenv("LLM_POOL_CONNECTIONS", "20"))
+# The async clients carry every in-flight request of an ASGI worker at once
+LLM_ASYNC_POOL_CONNECTIONS = int(os.getenv("LLM_ASYNC_POOL_CONNECTIONS", "200"))
+# How often complete() checks whether a queued call has started (and its timeout with it)
+QUEUED_POLL_SECONDS = 0.05
+
+# messages (optional) is the full chat payload for chat-style providers;
+# prompt + system_prompt is what single-prompt providers receive. prompt may
+# be a zero-argument callable, so a flattened prompt that only a fallback
+# provider needs is built only if that provider is actually called.
+LLMRequest = namedtuple(
+    "LLMRequest", ["prompt", "system_prompt", "max_tokens", "temperature", "messages"]
+)
+
+
+def prompt_text(req):
+    return req.prompt() if callable(req.prompt) else req.prompt
+
+
+def make_request(prompt, system_prompt="You are a helpful assistant.", max_tokens=1024,
+                 temperature=0.7, messages=None):
+    return LLMRequest(prompt, system_prompt, max_tokens, temperature, messages)
+
+
+class ProviderError(Exception):
+    pass
+
+
+class AllProvidersFailed(ProviderError):
+    def __init__(self, errors):
+        self.errors = errors
+        detail = "; ".join(f"{name}: {error}" for name, error in errors.items())
+        super().__init__(f"All providers failed ({detail or 'none available'})")
+
+
+class Overloaded(AllProvidersFailed):
+    """Every provider was rate limited; retry_after is the soonest one frees up."""
+
+    def __init__(self, errors):
+        super().__init__(errors)
+        self.retry_after = min(error.retry_after for error in errors.values())
+
+
+def _failure(errors):
+    if errors and all(isinstance(error, RateLimited) for error in errors.values()):
+        return Overloaded(errors)
+    return AllProvidersFailed(errors)
+
+
+def _error_text(e):
+    return e if isinstance(e, RateLimited) else (str(e) or type(e).__name__)
+
+
+# ── Circuit breaker ──────────────────────────────────────────
+class CircuitBreaker:
+    """Opens after `failure_threshold` consecutive failures. After `reset_after`
+    seconds one trial call is let through (half-open): success closes it,
+    failure opens it again."""
+
+    def __init__(self, failure_threshold=3, reset_after=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_after = reset_after
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_after:
+            return "half-open"
+        return "open"
+
+    def allow(self):
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at >= self.reset_after:
+                # Hold the circuit open for everyone else while this trial runs.
+                self.opened_at = time.monotonic()
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+# ── Providers ────────────────────────────────────────────────
+class Provider:
+    name = "provider"
+
+    def __init__(self, timeout=30.0, breaker=None):
+        self.timeout = timeout
+        self.breaker = breaker or CircuitBreaker()
+        self.observer = None  # set by ProviderChain
+
+    def report_usage(self, prompt_tokens, completion_tokens):
+        if self.observer:
+            self.observer.usage(self.name, prompt_tokens or 0, completion_tokens or 0)
+
+    def complete(self, req):
+        raise NotImplementedError
+
+    def stream(self, req):
+        yield self.complete(req)
+
+    async def acomplete(self, req):
+        return await asyncio.to_thread(self.complete, req)
+
+    async def astream(self, req):
+        yield await self.acomplete(req)
+
+
+def _pool_limits(size=LLM_POOL_CONNECTIONS):
+    import httpx
+    # Keep idle connections around long enough to survive gaps between requests.
+    return httpx.Limits(max_connections=size, max_keepalive_connections=size, keepalive_expiry=60)
+
+
+class GroqProvider(Provider):
+    name = "groq"
+
+    def __init__(self, model, api_key=None, timeout=20.0, breaker=None):
+        super().__init__(timeout, breaker)
+        self.model = model
+        self.api_key = api_key
+        self._client = None
+        self._async_client = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        with self._lock:
+            if self._client is None:
+                from groq import DefaultHttpxClient, Groq
+                # The chain does fallback itself, so don't let the SDK retry.
+                self._client = Groq(api_key=self.api_key, timeout=self.timeout, max_retries=0,
+                                    http_client=DefaultHttpxClient(limits=_pool_limits()))
+            return self._client
+
+    @property
+    def async_client(self):
+        with self._lock:
+            if self._async_client is None:
+                from groq import AsyncGroq, DefaultAsyncHttpxClient
+                self._async_client = AsyncGroq(api_key=self.api_key, timeout=self.timeout, max_retries=0,
+                                               http_client=DefaultAsyncHttpxClient(
+                                                   limits=_pool_limits(LLM_ASYNC_POOL_CONNECTIONS)))
+            return self._async_client
+
+    def _params(self, req):
+        return {
+            "model": self.model,
+            "messages": req.messages or [
+                {"role": "system", "content": req.system_prompt},
+                {"role": "user",   "content": prompt_text(req)}
+            ],
+            "max_tokens": req.max_tokens,
+            "temperature": req.temperature,
+        }
+
+    def _report(self, response):
+        usage = getattr(response, "usage", None)
+        if usage:
+            self.report_usage(usage.prompt_tokens, usage.completion_tokens)
+
+    def complete(self, req):
+        response = self.client.chat.completions.create(**self._params(req))
+        self._report(response)
+        return response.choices[0].message.content
+
+    def stream(self, req):
+        for chunk in self.client.chat.completions.create(stream=True, **self._params(req)):
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta:
+                yield delta
+
+    async def acomplete(self, req):
+        response = await self.async_client.chat.completions.create(**self._params(req))
+        self._report(response)
+        return response.choices[0].message.content
+
+    async def astream(self, req):
+        async for chunk in await self.async_client.chat.completions.create(stream=True, **self._params(req)):
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta:
+                yield delta
+
+
+class GeminiProvider(Provider):
+    name = "gemini"
+
+    def __init__(self, model, timeout=30.0, breaker=None):
+        super().__init__(timeout, breaker)
+        self.model = model
+
+    def _model(self):
+        return gemini_model(self.model)
+
+    def _prompt(self, req):
+        return f"{req.system_prompt}\n\n{prompt_text(req)}"
+
+    def _report(self, response):
+        usage = getattr(response, "usage_metadata", None)
+        if usage:
+            self.report_usage(usage.prompt_token_count, usage.candidates_token_count)
+
+    def complete(self, req):
+        response = self._model().generate_content(
+            self._prompt(req), request_options={"timeout": self.timeout}
+        )
+        self._report(response)
+        return response.text
+
+    def stream(self, req):
+        for chunk in self._model().generate_content(
+            self._prompt(req), stream=True, request_options={"timeout": self.timeout}
+        ):
+            if chunk.text:
+                yield chunk.text
+
+    async def acomplete(self, req):
+        if gemini_uses_rest():
+            # The SDK's REST transport has no async client
+            return await asyncio.to_thread(self.complete, req)
+        response = await self._model().generate_content_async(
+            self._prompt(req), request_options={"timeout": self.timeout}
+        )
+        self._report(response)
+        return response.text
+
+    async def astream(self, req):
+        if gemini_uses_rest():
+            # The sync call on a thread, answered in one chunk
+            yield await self.acomplete(req)
+            return
+        async for chunk in await self._model().generate_content_async(
+            self._prompt(req), stream=True, request_options={"timeout": self.timeout}
+        ):
+            if chunk.text:
+                yield chunk.text
+
+
+class FakeProvider(Provider):
+    """Local stand-in. latency is seconds or a (low, high) range; error_rate is 0..1."""
+
+    def __init__(self, name, latency=0.0, error_rate=0.0, response=None,
+                 timeout=30.0, breaker=None, seed=None):
+        super().__init__(timeout, breaker)
+        self.name = name
+        self.latency = latency
+        self.error_rate = error_rate
+        self.response = response
+        self.calls = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _draw(self):
+        with self._lock:
+            self.calls += 1
+            latency = self.latency
+            if isinstance(latency, (tuple, list)):
+                latency = self._random.uniform(*latency)
+            return latency, self._random.random() < self.error_rate
+
+    def _answer(self, req, failed):
+        if failed:
+            raise ProviderError(f"{self.name}: injected failure")
+        return self.response or f"[{self.name}] {prompt_text(req)[:60]}"
+
+    def complete(self, req):
+        latency, failed = self._draw()
+        time.sleep(latency)
+        return self._answer(req, failed)
+
+    def stream(self, req):
+        for word in self.complete(req).split(" "):
+            yield word + " "
+
+    async def acomplete(self, req):
+        latency, failed = self._draw()
+        await asyncio.sleep(latency)
+        return self._answer(req, failed)
+
+    async def astream(self, req):
+        for word in (await self.acomplete(req)).split(" "):
+            yield word + " "
+
+
+# ── Chain ────────────────────────────────────────────────────
+class _Attempt:
+    """One provider call launched by ProviderChain.complete(). Its timeout runs
+    from when a worker thread starts the call, not from when it was queued."""
+
+    def __init__(self, provider):
+        self.provider = provider
+        self.started = None  # time.monotonic(), set by the worker
+        self.abandoned = threading.Event()
+
+
+class ProviderChain:
+    def __init__(self, providers, hedge_delay=None, max_workers=16, observer=None, limiter=None):
+        self.providers = list(providers)
+        self.hedge_delay = hedge_delay
+        self.limiter = limiter  # rate_limit.RateLimiter, keyed by provider name
+        # observer gets call(provider, seconds, outcome), usage(provider, prompt, completion)
+        # and served(provider, fallback) events, e.g. metrics.LLMObserver
+        self.observer = observer
+        for provider in self.providers:
+            provider.observer = observer
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm")
+        # The async paths wait for rate-limit tokens here, not on the event loop's
+        # default executor, which the ASGI routes need for prompt building and the
+        # cache. The limiter sheds past max_queue waiters per key, so this never queues.
+        self._admission = None
+        if limiter is not None and limiter.limits:
+            self._admission = ThreadPoolExecutor(max_workers=limiter.max_queue * len(limiter.limits),
+                                                 thread_name_prefix="llm-admit")
+        self._stats = {p.name: {"calls": 0, "failures": 0, "seconds": 0.0} for p in self.providers}
+        self._stats_lock = threading.Lock()
+
+    def _record(self, provider, elapsed, ok, outcome=None):
+        if ok:
+            provider.breaker.record_success()
+        else:
+            provider.breaker.record_failure()
+            log("llm_call_failed", level="warning", provider=provider.name,
+                outcome=outcome or "failure", seconds=round(elapsed, 3))
+        if self.observer:
+            self.observer.call(provider.name, elapsed, outcome or ("success" if ok else "failure"))
+        with self._stats_lock:
+            stats = self._stats.setdefault(provider.name, {"calls": 0, "failures": 0, "seconds": 0.0})
+            stats["calls"] += 1
+            stats["seconds"] += elapsed
+            if not ok:
+                stats["failures"] += 1
+
+    def stats(self):
+        with self._stats_lock:
+            snapshot = {name: dict(stats) for name, stats in self._stats.items()}
+        for stats in snapshot.values():
+            stats["seconds"] = round(stats["seconds"], 3)
+        for provider in self.providers:
+            snapshot[provider.name]["circuit"] = provider.breaker.state
+        result = {"hedge_delay": self.hedge_delay, "providers": snapshot}
+        if self.limiter:
+            result["rate_limits"] = self.limiter.stats()
+        return result
+
+    def _admit(self, provider, errors):
+        """Takes a rate-limit token for provider; records why not and returns False if refused."""
+        if self.limiter is None:
+            return True
+        try:
+            self.limiter.acquire(provider.name)
+            return True
+        except RateLimited as e:
+            errors[provider.name] = e
+            return False
+
+    def _claim(self, provider, errors):
+        """Lets an admitted call through the breaker (taking the half-open trial, if
+        that's its state). Only called after admission, so a trial is never spent
+        on a call the rate limiter then refuses."""
+        if provider.breaker.allow():
+            return True
+        errors[provider.name] = "circuit open"
+        return False
+
+    def _next_provider(self, remaining, errors):
+        while remaining:
+            provider = remaining.pop(0)
+            # An open breaker is skipped before it can spend a rate-limit token
+            if provider.breaker.state == "open":
+                errors[provider.name] = "circuit open"
+            elif self._admit(provider, errors) and self._claim(provider, errors):
+                return provider
+        return None
+
+    def _throttled(self, provider, elapsed, exc):
+        """RateLimited for an upstream 429 (and blocks the key), or None for other errors.
+        A 429 says nothing about the provider's health, so the breaker isn't touched."""
+        retry_after = retry_after_hint(exc)
+        if retry_after is None:
+            return None
+        if self.limiter:
+            self.limiter.penalize(provider.name, retry_after)
+        if self.observer:
+            self.observer.call(provider.name, elapsed, "rate_limited")
+        return RateLimited(provider.name, retry_after)
+
+    def _call(self, provider, req, attempt=None):
+        if attempt is not None:
+            attempt.started = time.monotonic()
+        abandoned = attempt and attempt.abandoned
+        start = time.perf_counter()
+        try:
+            text = provider.complete(req)
+            if not text:
+                raise ProviderError("empty response")
+        except Exception as e:
+            throttled = self._throttled(provider, time.perf_counter() - start, e)
+            if throttled:
+                raise throttled from e
+            if not (abandoned and abandoned.is_set()):
+                self._record(provider, time.perf_counter() - start, False)
+            raise
+        if not (abandoned and abandoned.is_set()):
+            self._record(provider, time.perf_counter() - start, True)
+        return text
+
+    def complete(self, req):
+        """Returns (provider_name, text) or raises AllProvidersFailed (Overloaded when
+        every provider is rate limited)."""
+        remaining = list(self.providers)
+        errors = {}
+        running = {}  # future -> _Attempt
+        last_start = 0.0
+
+        def launch():
+            nonlocal last_start
+            provider = self._next_provider(remaining, errors)
+            if provider is None:
+                return False
+            last_start = time.monotonic()
+            attempt = _Attempt(provider)
+            running[self._executor.submit(with_request_id(self._call), provider, req, attempt)] = attempt
+            return True
+
+        launch()
+        while running:
+            now = time.monotonic()
+            # A call still queued behind busy workers has no deadline yet: check back
+            # shortly to start its clock once a worker picks it up.
+            wake_at = min(attempt.started + attempt.provider.timeout if attempt.started is not None
+                          else now + QUEUED_POLL_SECONDS for attempt in running.values())
+            if self.hedge_delay is not None and remaining:
+                wake_at = min(wake_at, last_start + self.hedge_delay)
+            done, _ = wait(running, timeout=max(0.0, wake_at - now), return_when=FIRST_COMPLETED)
+
+            for future in done:
+                provider = running.pop(future).provider
+                try:
+                    text = future.result()
+                except Exception as e:
+                    errors[provider.name] = _error_text(e)
+                    continue
+                for loser in running:
+                    loser.cancel()  # a call already in flight finishes in the background
+                self._served(provider)
+                return provider.name, text
+
+            now = time.monotonic()
+            for future, attempt in list(running.items()):
+                provider = attempt.provider
+                if attempt.started is not None and now >= attempt.started + provider.timeout:
+                    # The worker thread keeps running until the SDK's own timeout
+                    # fires; whatever it returns is ignored.
+                    attempt.abandoned.set()
+                    del running[future]
+                    future.cancel()
+                    errors[provider.name] = f"timed out after {provider.timeout}s"
+                    self._record(provider, provider.timeout, False, "timeout")
+
+            hedge_due = self.hedge_delay is not None and now - last_start >= self.hedge_delay
+            if remaining and (not running or hedge_due):
+                launch()
+
+        raise _failure(errors)
+
+    def _served(self, provider):
+        if self.observer:
+            self.observer.served(provider.name, fallback=provider is not self.providers[0])
+
+    async def _acall(self, provider, req):
+        start = time.perf_counter()
+        try:
+            text = await asyncio.wait_for(provider.acomplete(req), provider.timeout)
+            if not text:
+                raise ProviderError("empty response")
+        except asyncio.CancelledError:
+            raise
+        except asyncio.TimeoutError:
+            self._record(provider, time.perf_counter() - start, False, "timeout")
+            raise ProviderError(f"timed out after {provider.timeout}s")
+        except Exception as e:
+            throttled = self._throttled(provider, time.perf_counter() - start, e)
+            if throttled:
+                raise throttled from e
+            self._record(provider, time.perf_counter() - start, False)
+            raise
+        self._record(provider, time.perf_counter() - start, True)
+        return text
+
+    async def acomplete(self, req):
+        """asyncio twin of complete(); losing hedged calls are really cancelled."""
+        remaining = list(self.providers)
+        errors = {}
+        running = {}  # task -> provider
+
+        async def launch():
+            provider = await self._anext_provider(remaining, errors)
+            if provider is None:
+                return False
+            running[asyncio.ensure_future(self._acall(provider, req))] = provider
+            return True
+
+        await launch()
+        try:
+            while running:
+                timeout = self.hedge_delay if (self.hedge_delay is not None and remaining) else None
+                done, _ = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    provider = running.pop(task)
+                    try:
+                        text = task.result()
+                    except Exception as e:
+                        errors[provider.name] = _error_text(e)
+                        continue
+                    self._served(provider)
+                    return provider.name, text
+                if remaining and (not running or not done):
+                    await launch()
+        finally:
+            for task in running:
+                task.cancel()
+        raise _failure(errors)
+
+    def stream(self, req):
+        """Yields (provider_name, text) chunks. Falls back only before the first chunk."""
+        remaining = list(self.providers)
+        errors = {}
+        while True:
+            provider = self._next_provider(remaining, errors)
+            if provider is None:
+                raise _failure(errors)
+            start = time.perf_counter()
+            started = False
+            try:
+                for text in provider.stream(req):
+                    if not started:
+                        started = True
+                        self._served(provider)
+                    yield provider.name, text
+            except Exception as e:
+                throttled = None if started else self._throttled(provider, time.perf_counter() - start, e)
+                if throttled:
+                    errors[provider.name] = throttled
+                    continue
+                self._record(provider, time.perf_counter() - start, False)
+                if started:
+                    raise
+                errors[provider.name] = _error_text(e)
+                continue
+            if not started:
+                self._record(provider, time.perf_counter() - start, False)
+                errors[provider.name] = "empty response"
+                continue
+            self._record(provider, time.perf_counter() - start, True)
+            return
+
+    async def _anext_provider(self, remaining, errors):
+        while remaining:
+            provider = remaining.pop(0)
+            if provider.breaker.state == "open":
+                errors[provider.name] = "circuit open"
+                continue
+            if self.limiter is not None and provider.name in self.limiter.limits:
+                # Queueing for a token blocks, so keep it off the event loop
+                admitted = await asyncio.get_running_loop().run_in_executor(
+                    self._admission, with_request_id(self._admit), provider, errors)
+                if not admitted:
+                    continue
+            if self._claim(provider, errors):
+                return provider
+        return None
+
+    async def astream(self, req):
+        """asyncio twin of stream(); the first chunk must arrive within the provider's timeout."""
+        remaining = list(self.providers)
+        errors = {}
+        while True:
+            provider = await self._anext_provider(remaining, errors)
+            if provider is None:
+                raise _failure(errors)
+            start = time.perf_counter()
+            chunks = provider.astream(req)
+            started = False
+            try:
+                async for text in _first_within(chunks, provider.timeout):
+                    if not started:
+                        started = True
+                        self._served(provider)
+                    yield provider.name, text
+            except asyncio.CancelledError:
+                raise
+            except asyncio.TimeoutError:
+                self._record(provider, time.perf_counter() - start, False, "timeout")
+                if started:
+                    raise
+                errors[provider.name] = f"timed out after {provider.timeout}s"
+                continue
+            except Exception as e:
+                throttled = None if started else self._throttled(provider, time.perf_counter() - start, e)
+                if throttled:
+                    errors[provider.name] = throttled
+                    continue
+                self._record(provider, time.perf_counter() - start, False)
+                if started:
+                    raise
+                errors[provider.name] = _error_text(e)
+                continue
+            finally:
+                await chunks.aclose()
+            if not started:
+                self._record(provider, time.perf_counter() - start, False)
+                errors[provider.name] = "empty response"
+                continue
+            self._record(provider, time.perf_counter() - start, True)
+            return
+
+
+async def _first_within(chunks, timeout):
+    """Re-yields an async iterator, raising asyncio.TimeoutError if its first item is late."""
+    try:
+        first = await asyncio.wait_for(chunks.__anext__(), timeout)
+    except StopAsyncIteration:
+        return
+    yield first
+    async for chunk in chunks:
+        yield chunk
+
+
+def chain_from_env(groq_model, gemini_model):
+    """Groq first, Gemini second, configured from LLM_* environment variables."""
+    def breaker():
+        return CircuitBreaker(
+            failure_threshold=int(os.getenv("LLM_BREAKER_FAILURES", "3")),
+            reset_after=float(os.getenv("LLM_BREAKER_RESET", "30")),
+        )
+
+    hedge_delay = os.getenv("LLM_HEDGE_DELAY")
+    return ProviderChain(
+        [
+            GroqProvider(groq_model, api_key=os.getenv("GROQ_API_KEY"),
+                         timeout=float(os.getenv("LLM_TIMEOUT_GROQ", "20")), breaker=breaker()),
+            GeminiProvider(gemini_model,
+                           timeout=float(os.getenv("LLM_TIMEOUT_GEMINI", "30")), breaker=breaker()),
+        ],
+        hedge_delay=float(hedge_delay) if hedge_delay else None,
+        observer=LLMObserver(),
+        limiter=limiter_from_env(),
+    )
+
+
+if __name__ == "__main__":
+    # Sequential fallback vs hedging against fakes: a slow primary, a steady secondary.
+    req = make_request("Explain photosynthesis")
+    for hedge in (None, 0.3):
+        chain = ProviderChain(
+            [FakeProvider("slow-primary", latency=2.0, timeout=1.5),
+             FakeProvider("secondary", latency=0.2)],
+            hedge_delay=hedge,
+        )
+        start = time.perf_counter()
+        name, _ = chain.complete(req)
+        sync_elapsed = time.perf_counter() - start
+        start = time.perf_counter()
+        async_name, _ = asyncio.run(chain.acomplete(req))
+        async_elapsed = time.perf_counter() - start
+        print(f"hedge_delay={hedge}: sync {name} in {sync_elapsed:.2f}s, "
+              f"async {async_name} in {async_elapsed:.2f}s")
+
+    flaky = FakeProvider("flaky", error_rate=1.0, breaker=CircuitBreaker(failure_threshold=2))
+    chain = ProviderChain([flaky, FakeProvider("backup")])
+    for _ in range(5):
+        chain.complete(req)
+    print(f"flaky provider called {flaky.calls}x for 5 requests; circuit {flaky.breaker.state}")
@@ -0,0 +1,232 @@
+"""Per-syllabus bank of pre-generated quiz questions.
+
+Generating a 5-question quiz live takes a full LLM call. Instead, questions
+are generated in the background, QUIZ_BANK_BATCH at a time, once a
+syllabus is processed. They are stored in a SQLite file shared by every
+worker:
+    questions   syllabus id, normalized question text, question JSON
+    seen        which questions each user has already been served
+A quiz request then samples QUIZ_SIZE questions the user hasn't seen, with
+one indexed query over a bank capped at QUIZ_BANK_MAX questions. When a
+user's unseen questions fall under QUIZ_BANK_LOW, another batch is
+generated in the background. A user who has seen the whole bank starts a
+new round.
+
+Model output is validated after JSON parsing: every question needs text,
+options A-D, an answer among them and an explanation. Invalid items are
+dropped. Duplicates are detected by normalized question text (case,
+punctuation and spacing ignored), within a batch and against the bank.
+"""
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+
+from logs import log, with_request_id
+
+OPTION_KEYS = ("A", "B", "C", "D")
+QUIZ_SIZE = 5
+BANK_TARGET = int(os.getenv("QUIZ_BANK_TARGET", "30"))
+BANK_MAX = int(os.getenv("QUIZ_BANK_MAX", "200"))
+BANK_LOW = int(os.getenv("QUIZ_BANK_LOW", "10"))
+BANK_BATCH = int(os.getenv("QUIZ_BANK_BATCH", "10"))
+
+_JSON_ARRAY = re.compile(r"\[.*\]", re.DOTALL)
+_NOT_WORD = re.compile(r"[^\w]+")
+
+
+def normalize_question(text):
+    """Dedup key: "What is  Osmosis?" and "what is osmosis" are the same question."""
+    text = unicodedata.normalize("NFKC", str(text)).casefold()
+    return " ".join(_NOT_WORD.sub(" ", text).split())
+
+
+def validate_question(item):
+    """The question in canonical form, or None if it doesn't fit the quiz schema."""
+    if not isinstance(item, dict):
+        return None
+    question = item.get("question")
+    options = item.get("options")
+    answer = item.get("answer")
+    explanation = item.get("explanation", "")
+    if isinstance(options, list) and len(options) == len(OPTION_KEYS):
+        options = dict(zip(OPTION_KEYS, options))
+    if not (isinstance(question, str) and question.strip() and isinstance(options, dict)):
+        return None
+    if sorted(options) != list(OPTION_KEYS):
+        return None
+    if not all(isinstance(value, str) and value.strip() for value in options.values()):
+        return None
+    answer = str(answer or "").strip().upper()[:1]
+    if answer not in OPTION_KEYS or not isinstance(explanation, str):
+        return None
+    return {
+        "question": question.strip(),
+        "options": {key: options[key].strip() for key in OPTION_KEYS},
+        "answer": answer,
+        "explanation": explanation.strip(),
+    }
+
+
+def _json_items(text):
+    """The JSON array in a model reply (extra prose around it is ignored), or []."""
+    match = _JSON_ARRAY.search(text or "")
+    if not match:
+        return []
+    try:
+        items = json.loads(match.group(0))
+    except ValueError:
+        return []
+    return items if isinstance(items, list) else []
+
+
+def parse_questions(text):
+    """Valid questions from a model reply, in canonical form."""
+    return [question for question in map(validate_question, _json_items(text)) if question]
+
+
+class QuizBank:
+    """generate(syllabus_id, avoid) returns model text with a JSON array of new
+    questions (avoid lists question texts already banked), or None on failure."""
+
+    def __init__(self, db_path, generate, target=BANK_TARGET, max_size=BANK_MAX, low=BANK_LOW,
+                 max_workers=1):
+        self.db_path = db_path
+        self.generate = generate
+        self.target = target
+        self.max_size = max_size
+        self.low = low
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="quiz-bank")
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._conn()
+        conn.executescript(
+            "CREATE TABLE IF NOT EXISTS questions ("
+            " syllabus TEXT NOT NULL, key TEXT NOT NULL, body TEXT NOT NULL, created_at REAL NOT NULL,"
+            " PRIMARY KEY (syllabus, key));"
+            "CREATE TABLE IF NOT EXISTS seen ("
+            " syllabus TEXT NOT NULL, user TEXT NOT NULL, key TEXT NOT NULL,"
+            " PRIMARY KEY (syllabus, user, key));"
+        )
+        conn.commit()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def size(self, syllabus):
+        return self._conn().execute(
+            "SELECT COUNT(*) FROM questions WHERE syllabus = ?", (syllabus,)).fetchone()[0]
+
+    def add(self, syllabus, questions):
+        """Banks valid, new questions (up to max_size). Returns (added, duplicates)."""
+        added = duplicates = 0
+        conn = self._conn()
+        with conn:
+            room = self.max_size - conn.execute(
+                "SELECT COUNT(*) FROM questions WHERE syllabus = ?", (syllabus,)).fetchone()[0]
+            for question in questions:
+                if added >= room:
+                    break
+                key = normalize_question(question["question"])
+                if not key:
+                    continue
+                cursor = conn.execute(
+                    "INSERT OR IGNORE INTO questions (syllabus, key, body, created_at) VALUES (?, ?, ?, ?)",
+                    (syllabus, key, json.dumps(question, ensure_ascii=False), time.time()))
+                if cursor.rowcount:
+                    added += 1
+                else:
+                    duplicates += 1
+        return added, duplicates
+
+    def mark_seen(self, syllabus, user, questions):
+        if not user:
+            return
+        conn = self._conn()
+        with conn:
+            conn.executemany("INSERT OR IGNORE INTO seen (syllabus, user, key) VALUES (?, ?, ?)",
+                             [(syllabus, user, normalize_question(q["question"])) for q in questions])
+
+    def _unseen(self, conn, syllabus, user, count):
+        return conn.execute(
+            "SELECT key, body FROM questions q WHERE syllabus = ? AND NOT EXISTS ("
+            " SELECT 1 FROM seen s WHERE s.syllabus = q.syllabus AND s.user = ? AND s.key = q.key)"
+            " ORDER BY random() LIMIT ?", (syllabus, user or "", count)).fetchall()
+
+    def sample(self, syllabus, user=None, count=QUIZ_SIZE):
+        """count random questions the user hasn't been served, or None while the bank
+        holds fewer than count. Tops the bank up in the background when it runs low."""
+        conn = self._conn()
+        total = conn.execute("SELECT COUNT(*) FROM questions WHERE syllabus = ?", (syllabus,)).fetchone()[0]
+        if total < count:
+            self.top_up(syllabus)
+            return None
+        with conn:
+            rows = self._unseen(conn, syllabus, user, count)
+            if len(rows) < count and user:
+                # Everything has been served: start a new round for this user
+                conn.execute("DELETE FROM seen WHERE syllabus = ? AND user = ?", (syllabus, user))
+                rows = self._unseen(conn, syllabus, user, count)
+            if user:
+                conn.executemany("INSERT OR IGNORE INTO seen (syllabus, user, key) VALUES (?, ?, ?)",
+                                 [(syllabus, user, key) for key, _ in rows])
+            unseen_left = total - (conn.execute(
+                "SELECT COUNT(*) FROM seen WHERE syllabus = ? AND user = ?",
+                (syllabus, user)).fetchone()[0] if user else 0)
+        if total < self.target or (unseen_left < self.low and total < self.max_size):
+            self.top_up(syllabus)
+        return [json.loads(body) for _, body in rows]
+
+    # ── Background generation ────────────────────────────────
+    def top_up(self, syllabus):
+        """Queues one generation batch for syllabus, unless one is already queued."""
+        with self._lock:
+            if syllabus in self._pending:
+                return
+            self._pending.add(syllabus)
+        self._executor.submit(with_request_id(self._fill), syllabus)
+
+    def _fill(self, syllabus):
+        try:
+            rows = self._conn().execute(
+                "SELECT body FROM questions WHERE syllabus = ? ORDER BY created_at DESC LIMIT 40",
+                (syllabus,)).fetchall()
+            avoid = [json.loads(body)["question"] for body, in rows]
+            start = time.perf_counter()
+            items = _json_items(self.generate(syllabus, avoid))
+            questions = [question for question in map(validate_question, items) if question]
+            added, duplicates = self.add(syllabus, questions)
+            log("quiz_bank_filled", syllabus=syllabus, added=added, duplicates=duplicates,
+                invalid=len(items) - len(questions), size=self.size(syllabus),
+                seconds=round(time.perf_counter() - start, 3))
+        except Exception as e:
+            log("quiz_bank_fill_failed", level="warning", syllabus=syllabus, error=str(e))
+        finally:
+            with self._lock:
+                self._pending.discard(syllabus)
+
+    def stats(self):
+        conn = self._conn()
+        syllabi, questions = conn.execute(
+            "SELECT COUNT(DISTINCT syllabus), COUNT(*) FROM questions").fetchone()
+        with self._lock:
+            pending = len(self._pending)
+        return {"syllabi": syllabi, "questions": questions, "filling": pending}
+
+
+def bank_from_env(generate):
+    return QuizBank(os.getenv("QUIZ_BANK_DB", os.path.join("cache", "quiz_bank.sqlite3")), generate)
@@ -0,0 +1,233 @@
+"""Shared token buckets and admission control for outbound AI calls.
+
+Each upstream key (groq, gemini, imagen) gets a token bucket. Its state
+lives in a SQLite file, so all gunicorn workers on the box draw from the
+same budget instead of each discovering the provider's limit through 429s.
+A 429 blocks the key for every worker until Retry-After has passed.
+
+Callers queue per key and per worker, in priority order. Interactive
+requests (tutor, assistant, uploads) go ahead of batch work (batch
+endpoint, background jobs, summaries, diagram pre-rendering). Across
+workers, batch work also leaves LLM_RATE_BATCH_RESERVE of each bucket for
+interactive calls. A caller whose projected wait is over its priority's
+budget is refused at once with RateLimited (the app answers 503 +
+Retry-After), so bursts don't pile up blocked threads.
+
+Limits are "<requests>/<seconds>", set with LLM_RATE_<KEY>, e.g.
+LLM_RATE_GROQ=30/60. An empty value disables limiting for that key.
+"""
+import contextvars
+import heapq
+import itertools
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from logs import log
+from metrics import REGISTRY
+
+INTERACTIVE = 0
+BATCH = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BATCH: "batch"}
+
+DEFAULT_LIMITS = {"groq": "30/60", "gemini": "15/60", "imagen": "10/60"}
+# How long a caller may wait for a token before being shed, per priority
+DEFAULT_MAX_WAIT = {INTERACTIVE: 5.0, BATCH: 60.0}
+
+_priority = contextvars.ContextVar("llm_priority", default=INTERACTIVE)
+
+rate_limit_waits = REGISTRY.histogram(
+    "rate_limit_wait_seconds", "Time spent queued for an outbound AI call, by key and priority.",
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60))
+rate_limit_shed = REGISTRY.counter(
+    "rate_limit_shed_total", "Outbound AI calls refused by admission control, by key and priority.")
+rate_limit_429 = REGISTRY.counter(
+    "rate_limit_429_total", "429 responses from upstream AI providers, by key.")
+
+
+class RateLimited(Exception):
+    def __init__(self, key, retry_after):
+        self.key = key
+        self.retry_after = max(0.0, retry_after)
+        super().__init__(f"{key} rate limited, retry after {self.retry_after:.1f}s")
+
+
+def current_priority():
+    return _priority.get()
+
+
+@contextmanager
+def priority(level):
+    """Runs the block (and pool work wrapped with logs.with_request_id) at this priority."""
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def parse_limit(value):
+    """"30/60" -> (capacity 30, refill 0.5 tokens/s); empty -> None."""
+    if not value:
+        return None
+    count, _, seconds = value.partition("/")
+    capacity = float(count)
+    return capacity, capacity / float(seconds or 1)
+
+
+def retry_after_hint(exc):
+    """Seconds to back off if exc is an upstream 429, else None."""
+    status = getattr(exc, "status_code", None) or getattr(exc, "code", None)
+    if status != 429:
+        return None
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return 10.0
+
+
+class RateLimiter:
+    def __init__(self, limits, db_path=None, max_wait=None, batch_reserve=0.25, max_queue=64):
+        self.limits = {key: limit for key, limit in limits.items() if limit}
+        self.db_path = db_path
+        self.max_wait = {**DEFAULT_MAX_WAIT, **(max_wait or {})}
+        self.batch_reserve = batch_reserve
+        self.max_queue = max_queue
+        self._cond = threading.Condition()
+        self._queues = {key: [] for key in self.limits}
+        self._seq = itertools.count()
+        self._memory = {}  # key -> [tokens, updated, blocked_until] without a db
+        self._local = threading.local()
+        if db_path:
+            directory = os.path.dirname(db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn().execute(
+                "CREATE TABLE IF NOT EXISTS buckets ("
+                " key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL,"
+                " blocked_until REAL NOT NULL)"
+            )
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    # ── Bucket state ─────────────────────────────────────────
+    def _update(self, key, change):
+        """Atomically applies change(tokens, blocked_until, now) -> (tokens, blocked_until, result)."""
+        capacity, rate = self.limits[key]
+        now = time.time()
+        if not self.db_path:
+            with self._cond:
+                tokens, updated, blocked_until = self._memory.get(key, (capacity, now, 0.0))
+                tokens = min(capacity, tokens + (now - updated) * rate)
+                tokens, blocked_until, result = change(tokens, blocked_until, now)
+                self._memory[key] = (tokens, now, blocked_until)
+                return result
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT tokens, updated, blocked_until FROM buckets WHERE key = ?",
+                               (key,)).fetchone()
+            tokens, updated, blocked_until = row or (capacity, now, 0.0)
+            tokens = min(capacity, tokens + max(0.0, now - updated) * rate)
+            tokens, blocked_until, result = change(tokens, blocked_until, now)
+            conn.execute("INSERT OR REPLACE INTO buckets (key, tokens, updated, blocked_until)"
+                         " VALUES (?, ?, ?, ?)", (key, tokens, now, blocked_until))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return result
+
+    def _take(self, key, level):
+        """Takes a token and returns 0, or returns the seconds until one is available."""
+        capacity, rate = self.limits[key]
+        floor = capacity * self.batch_reserve if level == BATCH else 0.0
+
+        def change(tokens, blocked_until, now):
+            if blocked_until > now:
+                return tokens, blocked_until, blocked_until - now
+            if tokens - 1 >= floor:
+                return tokens - 1, blocked_until, 0.0
+            return tokens, blocked_until, (floor + 1 - tokens) / rate
+
+        return self._update(key, change)
+
+    def penalize(self, key, retry_after):
+        """Upstream said 429: empty the bucket and block the key for every worker."""
+        if key not in self.limits:
+            return
+        rate_limit_429.inc(key=key)
+        log("upstream_rate_limited", level="warning", key=key, retry_after=retry_after)
+        self._update(key, lambda tokens, blocked_until, now:
+                     (0.0, max(blocked_until, now + retry_after), None))
+
+    # ── Admission ────────────────────────────────────────────
+    def acquire(self, key):
+        """Blocks until a token for key is taken, or raises RateLimited straight away
+        when the projected wait is over this priority's budget."""
+        if key not in self.limits:
+            return
+        level = current_priority()
+        labels = {"key": key, "priority": PRIORITY_NAMES[level]}
+        start = time.monotonic()
+        deadline = start + self.max_wait[level]
+        _, rate = self.limits[key]
+        queue = self._queues[key]
+        ticket = (level, next(self._seq))
+        with self._cond:
+            ahead = sum(1 for other in queue if other < ticket)
+            if len(queue) >= self.max_queue or ahead / rate > self.max_wait[level]:
+                rate_limit_shed.inc(**labels)
+                raise RateLimited(key, (ahead + 1) / rate)
+            heapq.heappush(queue, ticket)
+        try:
+            while True:
+                with self._cond:
+                    while queue[0] != ticket:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            rate_limit_shed.inc(**labels)
+                            raise RateLimited(key, len(queue) / rate)
+                        self._cond.wait(remaining)
+                wait = self._take(key, level)
+                if wait <= 0:
+                    rate_limit_waits.observe(time.monotonic() - start, **labels)
+                    return
+                if time.monotonic() + wait > deadline:
+                    rate_limit_shed.inc(**labels)
+                    raise RateLimited(key, wait)
+                time.sleep(min(wait, 0.25))  # re-check: another worker may have refilled or drained it
+        finally:
+            with self._cond:
+                queue.remove(ticket)
+                heapq.heapify(queue)
+                self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {key: {"limit": f"{capacity:g}/{capacity / rate:g}s", "queued": len(self._queues[key])}
+                    for key, (capacity, rate) in self.limits.items()}
+
+
+def limiter_from_env():
+    limits = {key: parse_limit(os.getenv(f"LLM_RATE_{key.upper()}", default))
+              for key, default in DEFAULT_LIMITS.items()}
+    return RateLimiter(
+        limits,
+        db_path=os.getenv("LLM_RATE_DB", os.path.join("cache", "rate_limit.sqlite3")) or None,
+        max_wait={INTERACTIVE: float(os.getenv("LLM_MAX_WAIT_INTERACTIVE", DEFAULT_MAX_WAIT[INTERACTIVE])),
+                  BATCH: float(os.getenv("LLM_MAX_WAIT_BATCH", DEFAULT_MAX_WAIT[BATCH]))},
+        batch_reserve=float(os.getenv("LLM_RATE_BATCH_RESERVE", "0.25")),
+        max_queue=int(os.getenv("LLM_QUEUE_MAX", "64")),
+    )
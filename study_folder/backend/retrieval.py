@@ -0,0 +1,154 @@
+"""BM25 retrieval over uploaded syllabi, for grounded doubt and tutor answers.
+
+When a syllabus is processed, its cleaned text is cut into passages at
+unit/chapter headings (sections.split_sections), and an inverted index is
+stored with the upload in the upload store's SQLite index:
+    passages   the passage texts, in document order
+    lengths    token count per passage
+    postings   term -> [passage, term frequency, passage, term frequency, ...]
+Clients then send a syllabus id instead of the whole syllabus. The most
+relevant passages for the question are looked up locally, with no model or
+network call. Loaded indexes are kept in a small per-worker LRU, so a query
+is a dictionary walk over the query's terms.
+"""
+import math
+import os
+import re
+import threading
+from collections import Counter, OrderedDict
+
+from logs import log
+from sections import split_sections
+
+INDEX_VERSION = 1
+PASSAGE_CHARS = int(os.getenv("RETRIEVAL_PASSAGE_CHARS", "700"))
+TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "3"))
+# Same budget the prompts used to spend on syllabusContext[:1500]
+MAX_CONTEXT_CHARS = int(os.getenv("RETRIEVAL_MAX_CHARS", "1500"))
+K1 = 1.5
+B = 0.75
+
+_WORD = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset(
+    "a an and are as at be by can do does explain for from how in into is it its of on or "
+    "please that the their this to vs was what when where which why with".split()
+)
+
+
+def _stem(word):
+    """Crude suffix stripping, so "equations" finds "equation" and "reacting" finds "react"."""
+    if len(word) > 4:
+        for suffix in ("ing", "ies", "es", "ed", "s"):
+            if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+                return word[:-len(suffix)] + ("y" if suffix == "ies" else "")
+    return word
+
+
+def tokenize(text):
+    return [_stem(word) for word in _WORD.findall(text.lower()) if word not in STOPWORDS and len(word) > 1]
+
+
+class SyllabusIndex:
+    def __init__(self, passages, lengths, postings):
+        self.passages = passages
+        self.lengths = lengths
+        self.postings = postings
+        count = len(passages)
+        self.average_length = (sum(lengths) / count) if count else 0.0
+        self.idf = {}
+        for term, plist in postings.items():
+            frequency = len(plist) // 2  # passages containing the term
+            self.idf[term] = math.log(1 + (count - frequency + 0.5) / (frequency + 0.5))
+
+    @classmethod
+    def build(cls, text, passage_chars=PASSAGE_CHARS):
+        passages = [passage.strip() for passage in split_sections(text or "", passage_chars)]
+        passages = [passage for passage in passages if passage]
+        lengths, postings = [], {}
+        for number, passage in enumerate(passages):
+            counts = Counter(tokenize(passage))
+            lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                postings.setdefault(term, []).extend((number, tf))
+        return cls(passages, lengths, postings)
+
+    @classmethod
+    def from_record(cls, record):
+        if not isinstance(record, dict) or record.get("version") != INDEX_VERSION:
+            return None
+        return cls(record["passages"], record["lengths"], record["postings"])
+
+    def to_record(self):
+        return {"version": INDEX_VERSION, "passages": self.passages, "lengths": self.lengths,
+                "postings": self.postings}
+
+    def search(self, query, k=TOP_K):
+        """[(score, passage number)] for the k best passages with any query term."""
+        scores = {}
+        for term in set(tokenize(query)):
+            plist = self.postings.get(term)
+            if not plist:
+                continue
+            idf = self.idf[term]
+            for i in range(0, len(plist), 2):
+                number, tf = plist[i], plist[i + 1]
+                norm = K1 * (1 - B + B * self.lengths[number] / self.average_length)
+                scores[number] = scores.get(number, 0.0) + idf * tf * (K1 + 1) / (tf + norm)
+        best = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:k]
+        return [(score, number) for number, score in best]
+
+    def context(self, query, k=TOP_K, max_chars=MAX_CONTEXT_CHARS):
+        """The best passages for query, in document order, within max_chars."""
+        chosen, used = [], 0
+        for _, number in self.search(query, k):
+            passage = self.passages[number]
+            room = max_chars - used
+            if room <= 0:
+                break
+            chosen.append((number, passage[:room]))
+            used += min(len(passage), room) + 2
+        return "\n\n".join(passage for _, passage in sorted(chosen))
+
+
+class Retriever:
+    """Builds, stores (in an UploadStore) and serves per-syllabus indexes."""
+
+    def __init__(self, uploads, max_loaded=32):
+        self.uploads = uploads
+        self.max_loaded = max_loaded
+        self._loaded = OrderedDict()  # digest -> SyllabusIndex, least recently used first
+        self._lock = threading.Lock()
+
+    def _keep(self, digest, index):
+        with self._lock:
+            self._loaded[digest] = index
+            self._loaded.move_to_end(digest)
+            while len(self._loaded) > self.max_loaded:
+                self._loaded.popitem(last=False)
+        return index
+
+    def build(self, digest, text):
+        index = SyllabusIndex.build(text)
+        self.uploads.remember(digest, "index", index.to_record())
+        log("syllabus_indexed", digest=digest, passages=len(index.passages), terms=len(index.postings))
+        return self._keep(digest, index)
+
+    def get(self, digest, text=None):
+        """The index for a syllabus id. A missing one is built from text, else from the
+        stored extraction; None for an unknown syllabus."""
+        with self._lock:
+            index = self._loaded.get(digest)
+            if index is not None:
+                self._loaded.move_to_end(digest)
+                return index
+        index = SyllabusIndex.from_record(self.uploads.memo(digest, "index"))
+        if index is not None:
+            return self._keep(digest, index)
+        if text is None:
+            text = self.uploads.memo(digest, "raw")
+        return self.build(digest, text) if text else None
+
+    def context(self, digest, query, k=TOP_K):
+        """Relevant passages for query ("" if none match), or None for an unknown syllabus."""
+        index = self.get(digest)
+        return None if index is None else index.context(query, k)
@@ -0,0 +1,182 @@
+"""Server-side Pomodoro scheduling, laid out like frontend/src/utils/scheduler.js.
+
+A day's layout depends only on the start time and the daily study hours.
+Sessions are 25 minutes, each followed by a 5-minute break, or a 20-minute
+break after every 4th session. A day takes another session while
+25 + 5 more minutes fit under the cap. So instead of walking a clock one
+task at a time, the slot times of a day are computed once per (start time,
+hours) pair and cached. Task n of a plan then goes to day n // per_day,
+slot n % per_day. That is a table lookup per task, and the tables are
+shared by every user with the same settings, which is what makes bulk
+re-planning cheap.
+
+Output tasks have the same shape, ids and labels as generateTasks, so
+clients can use either interchangeably.
+"""
+import datetime
+import math
+import re
+from functools import lru_cache
+
+FOCUS_MINUTES = 25
+SHORT_BREAK_MINUTES = 5
+LONG_BREAK_MINUTES = 20
+LONG_BREAK_EVERY = 4
+# Another session is started only if it and a short break still fit
+SESSION_BUDGET = FOCUS_MINUTES + SHORT_BREAK_MINUTES
+
+# The UI offers 1-12 hours a day; anything past a full day is a bad request
+MIN_STUDY_HOURS = 1
+MAX_STUDY_HOURS = 24
+
+SHORT_BREAK_LABEL = "Short Break ☕"
+LONG_BREAK_LABEL = "Long Break 🧘"
+
+_SPACES = re.compile(r"\s+")
+
+
+def parse_start_time(value):
+    """Minutes after midnight for "HH:MM"; 09:00 when missing or malformed."""
+    if value and ":" in str(value):
+        hours, minutes = str(value).split(":")[:2]
+        try:
+            return int(hours) * 60 + int(minutes)
+        except ValueError:
+            pass
+    return 9 * 60
+
+
+def parse_study_hours(value):
+    """Daily study hours as a float. ValueError unless it is a finite number
+    from MIN_STUDY_HOURS to MAX_STUDY_HOURS (sessions_per_day loops up to the cap)."""
+    if isinstance(value, bool):
+        raise ValueError("studyHours must be a number")
+    try:
+        hours = float(value)
+    except (TypeError, ValueError):
+        raise ValueError("studyHours must be a number") from None
+    if not math.isfinite(hours) or not MIN_STUDY_HOURS <= hours <= MAX_STUDY_HOURS:
+        raise ValueError(f"studyHours must be between {MIN_STUDY_HOURS} and {MAX_STUDY_HOURS}")
+    return hours
+
+
+def parse_date(value, default=None):
+    if not value:
+        return default or datetime.date.today()
+    return datetime.date.fromisoformat(str(value)[:10])
+
+
+@lru_cache(maxsize=1440)
+def clock(minutes):
+    """date-fns "hh:mm a" for minutes after midnight (wrapping past midnight)."""
+    hours, minutes = divmod(minutes % (24 * 60), 60)
+    return f"{(hours % 12) or 12:02d}:{minutes:02d} {'AM' if hours < 12 else 'PM'}"
+
+
+def _minutes_used(sessions):
+    """Minutes taken by the first n sessions of a day, breaks included."""
+    long_breaks = sessions // LONG_BREAK_EVERY
+    return sessions * SESSION_BUDGET + long_breaks * (LONG_BREAK_MINUTES - SHORT_BREAK_MINUTES)
+
+
+@lru_cache(maxsize=64)
+def sessions_per_day(study_hours):
+    """(sessions per day, days skipped before the first one) for a daily cap."""
+    cap = float(study_hours) * 60
+    sessions = 1
+    while _minutes_used(sessions) + SESSION_BUDGET <= cap:
+        sessions += 1
+    # Under 30 minutes a day, even the very first session moves to tomorrow
+    return sessions, 0 if SESSION_BUDGET <= cap else 1
+
+
+@lru_cache(maxsize=256)
+def day_layout(start_minutes, sessions):
+    """Per slot: (focus start, focus end, break start, break end, break minutes, break label)."""
+    slots = []
+    pointer = start_minutes
+    for slot in range(sessions):
+        long_break = (slot + 1) % LONG_BREAK_EVERY == 0
+        break_minutes = LONG_BREAK_MINUTES if long_break else SHORT_BREAK_MINUTES
+        focus_end = pointer + FOCUS_MINUTES
+        slots.append((clock(pointer), clock(focus_end), clock(focus_end),
+                      clock(focus_end + break_minutes), str(break_minutes),
+                      LONG_BREAK_LABEL if long_break else SHORT_BREAK_LABEL))
+        pointer = focus_end + break_minutes
+    return tuple(slots)
+
+
+def study_items(topics):
+    """(label, name) per focus session: each subtopic, or the topic itself if it has none."""
+    items = []
+    for item in topics or []:
+        topic = str(item.get("topic", ""))
+        subtopics = item.get("subtopics") or []
+        if not subtopics:
+            items.append((topic, topic))
+            continue
+        items.append((f"{topic}: {subtopics[0]}", str(subtopics[0])))
+        items.extend((str(sub), str(sub)) for sub in subtopics[1:])
+    return items
+
+
+def layout_tasks(items, start_date, study_hours, start_time):
+    """Focus + break task dicts for (label, name) items, starting on start_date."""
+    per_day, skipped = sessions_per_day(parse_study_hours(study_hours))
+    slots = day_layout(parse_start_time(start_time), per_day)
+    first_day = start_date.toordinal() + skipped
+    days = [datetime.date.fromordinal(first_day + day).isoformat()
+            for day in range((len(items) + per_day - 1) // per_day)]
+    tasks = []
+    for index, (label, name) in enumerate(items):
+        day, slot = divmod(index, per_day)
+        date = days[day]
+        focus_start, focus_end, break_start, break_end, break_minutes, break_label = slots[slot]
+        tasks.append({
+            "id": f"{date}-{focus_start}-{_SPACES.sub('-', name).lower()}",
+            "date": date, "topic": label, "duration": "25", "completed": False, "type": "focus",
+            "startTime": focus_start, "endTime": focus_end, "preference": start_time,
+        })
+        tasks.append({
+            "id": f"{date}-{break_start}-break",
+            "date": date, "topic": break_label, "duration": break_minutes, "completed": False,
+            "type": "break", "startTime": break_start, "endTime": break_end, "preference": start_time,
+        })
+    return tasks
+
+
+def generate_tasks(topics, study_hours, start_time, start_date=None):
+    """Python twin of generateTasks(topics, examDate, studyHours, startTime)."""
+    return layout_tasks(study_items(topics), parse_date(start_date), study_hours, start_time)
+
+
+def reschedule_missed(tasks, study_hours, start_time, today=None):
+    """Python twin of rescheduleMissedTasks. Returns (tasks, rescheduled).
+
+    Completed tasks stay as they are. If any incomplete task is dated before
+    today, every incomplete focus session (missed ones first) is laid out
+    again from today.
+    """
+    today = parse_date(today)
+    today_str = today.isoformat()
+    completed = [task for task in tasks if task.get("completed")]
+    incomplete = [task for task in tasks if not task.get("completed")]
+    missed = [task for task in incomplete if task.get("date") and str(task["date"]) < today_str]
+    if not missed:
+        return tasks, False
+    # Undated incomplete tasks are dropped, as in the frontend
+    pending = missed + [task for task in incomplete if task.get("date") and str(task["date"]) >= today_str]
+    items = [(str(task.get("topic", "")), str(task.get("topic", "")))
+             for task in pending if task.get("type") == "focus"]
+    return completed + layout_tasks(items, today, study_hours, start_time), True
+
+
+def plan_summary(tasks, exam_date=None):
+    """Last study day and whether the plan runs into the exam (as the upload page warns)."""
+    last_date = tasks[-1]["date"] if tasks else None
+    exam = str(exam_date)[:10] if exam_date else None
+    return {
+        "sessions": len(tasks) // 2,
+        "last_date": last_date,
+        "exceeds_exam": bool(exam and last_date and last_date >= exam),
+    }
@@ -0,0 +1,203 @@
+"""Splitting syllabus text into sections and merging per-section topic trees.
+
+Long syllabi are cut at unit/chapter/module headings, then packed into
+chunks no longer than max_chars. Topic lists extracted from each chunk are
+merged back in chunk order, with duplicate topics and subtopics folded
+together.
+
+For revised syllabi, each section is fingerprinted. plan_reuse() finds the
+chunks of a previous version whose sections all survive unchanged, so only
+the remaining sections go back to the LLM. diff_topic_trees() reports what
+changed between two merged topic lists.
+"""
+import difflib
+import hashlib
+import re
+
+# "Unit 1", "UNIT - IV", "Chapter 3:", "Module II", "Part B", "Lecture 12", "Week 3"
+HEADING = re.compile(
+    r"^\s*(unit|chapter|module|part|lecture|week)(?:\s+|\s*[-:.]\s*)([0-9]+|[ivxlc]+|[a-z])\b",
+    re.IGNORECASE,
+)
+
+
+def _blocks(text):
+    """Yields heading-delimited blocks of lines."""
+    block = []
+    for line in text.split("\n"):
+        if HEADING.match(line) and block:
+            yield "\n".join(block)
+            block = []
+        block.append(line)
+    if block:
+        yield "\n".join(block)
+
+
+def _split_long(block, max_chars):
+    piece, size = [], 0
+    for line in block.split("\n"):
+        if piece and size + len(line) + 1 > max_chars:
+            yield "\n".join(piece)
+            piece, size = [], 0
+        # A single line longer than max_chars is hard-cut.
+        while len(line) > max_chars:
+            yield line[:max_chars]
+            line = line[max_chars:]
+        piece.append(line)
+        size += len(line) + 1
+    if piece:
+        yield "\n".join(piece)
+
+
+def split_units(text, max_chars=4000):
+    """Heading-delimited sections, with any longer than max_chars cut into pieces."""
+    units = []
+    for block in _blocks(text):
+        units.extend(_split_long(block, max_chars) if len(block) > max_chars else [block])
+    return units
+
+
+def pack_units(units, max_chars=4000):
+    """Groups consecutive units into runs whose joined text fits max_chars, as index lists."""
+    groups, current, size = [], [], 0
+    for index, unit in enumerate(units):
+        if current and size + len(unit) + 1 > max_chars:
+            groups.append(current)
+            current, size = [], 0
+        current.append(index)
+        size += len(unit) + (1 if size else 0)
+    if current:
+        groups.append(current)
+    return groups
+
+
+def split_sections(text, max_chars=4000):
+    """Chunks of at most max_chars, cut at headings where possible, in document order."""
+    units = split_units(text, max_chars)
+    chunks = ["\n".join(units[i] for i in group) for group in pack_units(units, max_chars)]
+    return [chunk for chunk in chunks if chunk.strip()]
+
+
+def section_fingerprint(text):
+    """Identifies a section by its words, so re-wrapped or re-spaced text still matches."""
+    return hashlib.sha256(" ".join(text.split()).encode("utf-8")).hexdigest()[:20]
+
+
+def plan_reuse(fingerprints, previous_groups):
+    """Lines up a document's section fingerprints with a previous version's chunks.
+
+    previous_groups is [{"sections": [fingerprint, ...], "topics": [...]}, ...].
+    A previous chunk is reused when all of its sections appear again, in
+    order, with nothing in between. Returns a list in document order of
+    ("reuse", group) and ("extract", [section indexes]) steps.
+    """
+    by_first = {}
+    for group in previous_groups or []:
+        sections = group.get("sections") or []
+        if sections:
+            by_first.setdefault(sections[0], []).append(group)
+
+    plan, pending, i = [], [], 0
+    while i < len(fingerprints):
+        match = next((group for group in by_first.get(fingerprints[i], [])
+                      if fingerprints[i:i + len(group["sections"])] == group["sections"]), None)
+        if match is None:
+            pending.append(i)
+            i += 1
+            continue
+        if pending:
+            plan.append(("extract", pending))
+            pending = []
+        plan.append(("reuse", match))
+        i += len(match["sections"])
+    if pending:
+        plan.append(("extract", pending))
+    return plan
+
+
+def topic_key(name, normalize=None):
+    if normalize:
+        name = normalize(name)
+    return re.sub(r"[^a-z0-9]+", " ", name.lower()).strip()
+
+
+def merge_topic_trees(trees, normalize=None):
+    """Merges [{topic, subtopics}] lists in order; the first spelling of a topic wins."""
+    merged = {}
+    for tree in trees:
+        for item in tree or []:
+            if not isinstance(item, dict):
+                continue
+            name = str(item.get("topic", "")).strip()
+            key = topic_key(name, normalize)
+            if not key:
+                continue
+            entry = merged.setdefault(key, {"topic": name, "subtopics": [], "_seen": set()})
+            for sub in item.get("subtopics") or []:
+                sub = str(sub).strip()
+                sub_key = topic_key(sub, normalize)
+                if sub_key and sub_key not in entry["_seen"]:
+                    entry["_seen"].add(sub_key)
+                    entry["subtopics"].append(sub)
+    return [{"topic": entry["topic"], "subtopics": entry["subtopics"]} for entry in merged.values()]
+
+
+def _similarity(old, new, normalize=None):
+    old_subs = {topic_key(sub, normalize) for sub in old["subtopics"]} - {""}
+    new_subs = {topic_key(sub, normalize) for sub in new["subtopics"]} - {""}
+    name = difflib.SequenceMatcher(None, topic_key(old["topic"], normalize),
+                                   topic_key(new["topic"], normalize)).ratio()
+    if not (old_subs or new_subs):
+        return name
+    overlap = len(old_subs & new_subs) / len(old_subs | new_subs)
+    return max(name, overlap)
+
+
+def diff_topic_trees(old, new, normalize=None, rename_threshold=0.6):
+    """What changed from one merged topic list to the next.
+
+    Topics are matched by normalized name. Of those left over, a removed and
+    an added topic with similar names or mostly the same subtopics count as a
+    rename. Returns {"added", "removed", "renamed", "updated"}; "updated" lists
+    matched topics whose subtopics changed.
+    """
+    old_by_key = {topic_key(item["topic"], normalize): item for item in old}
+    new_by_key = {topic_key(item["topic"], normalize): item for item in new}
+    removed = [item for key, item in old_by_key.items() if key not in new_by_key]
+    added = [item for key, item in new_by_key.items() if key not in old_by_key]
+
+    # Greedy pairing, best match first
+    candidates = sorted(
+        ((_similarity(before, after, normalize), i, j)
+         for i, before in enumerate(removed) for j, after in enumerate(added)),
+        reverse=True,
+    )
+    renamed, paired_old, paired_new = [], set(), set()
+    for score, i, j in candidates:
+        if score < rename_threshold:
+            break
+        if i in paired_old or j in paired_new:
+            continue
+        paired_old.add(i)
+        paired_new.add(j)
+        renamed.append({"from": removed[i]["topic"], "to": added[j]["topic"],
+                        "subtopics": added[j]["subtopics"]})
+
+    updated = []
+    for key, after in new_by_key.items():
+        before = old_by_key.get(key)
+        if before is None:
+            continue
+        old_subs = {topic_key(sub, normalize): sub for sub in before["subtopics"]}
+        new_subs = {topic_key(sub, normalize): sub for sub in after["subtopics"]}
+        gained = [sub for sub_key, sub in new_subs.items() if sub_key not in old_subs]
+        lost = [sub for sub_key, sub in old_subs.items() if sub_key not in new_subs]
+        if gained or lost:
+            updated.append({"topic": after["topic"], "added_subtopics": gained, "removed_subtopics": lost})
+
+    return {
+        "added": [item for j, item in enumerate(added) if j not in paired_new],
+        "removed": [item for i, item in enumerate(removed) if i not in paired_old],
+        "renamed": renamed,
+        "updated": updated,
+    }
@@ -0,0 +1,29 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+
+@pytest.fixture(scope="session")
+def client():
+    """The Flask app with every store in a scratch directory and no outbound limits."""
+    workdir = tempfile.mkdtemp(prefix="studyflow-test-")
+    os.environ.update(
+        USER_STORE="memory",
+        WARMUP_IMPORTS="0",
+        AI_CACHE_DB=os.path.join(workdir, "ai_cache.sqlite3"),
+        UPLOAD_FOLDER=os.path.join(workdir, "uploads"),
+        QUIZ_BANK_DB=os.path.join(workdir, "quiz_bank.sqlite3"),
+        LLM_RATE_DB=os.path.join(workdir, "rate_limit.sqlite3"),
+        OCR_CACHE_DIR=os.path.join(workdir, "ocr"),
+        DIAGRAM_CACHE_DIR=os.path.join(workdir, "diagrams"),
+        SYLLABUS_JOB_DB=os.path.join(workdir, "jobs.sqlite3"),
+    )
+    os.chdir(workdir)
+    import app
+
+    return app.app.test_client()
@@ -0,0 +1,45 @@
+import json
+
+import pytest
+
+SYLLABUS_ID = "b" * 64
+BANKED = [{"question": "From the bank?", "options": {"A": "1", "B": "2", "C": "3", "D": "4"},
+           "answer": "A", "explanation": ""}]
+
+
+@pytest.fixture
+def backend(client, monkeypatch):
+    import app
+
+    prompts = []
+
+    def call_ai(prompt, *args, **kwargs):
+        prompts.append(prompt)
+        return "[]"
+
+    monkeypatch.setattr(app, "QUIZ_BANK", True)
+    monkeypatch.setattr(app.quiz_bank, "sample", lambda *args, **kwargs: BANKED)
+    monkeypatch.setattr(app, "call_ai", call_ai)
+    monkeypatch.setattr(app, "prompts", prompts, raising=False)
+    return app
+
+
+def test_quiz_without_content_is_served_from_the_bank(client, backend):
+    body = client.post("/ai-assistant", json={"task": "quiz", "content": "", "syllabusId": SYLLABUS_ID}).get_json()
+    assert body["source"] == "bank" and json.loads(body["response"]) == BANKED
+
+
+def test_quiz_on_own_content_skips_the_bank(client, backend):
+    body = client.post("/ai-assistant", json={"task": "quiz", "content": "Custom notes on osmosis",
+                                              "syllabusId": SYLLABUS_ID}).get_json()
+    assert body.get("source") != "bank"
+    assert "Custom notes on osmosis" in backend.prompts[-1]
+
+
+def test_quiz_falls_back_to_sent_syllabus_text(client, backend, monkeypatch):
+    monkeypatch.setattr(backend, "QUIZ_BANK", False)
+    unknown = client.post("/ai-assistant", json={"task": "quiz", "content": "", "syllabusId": SYLLABUS_ID})
+    assert unknown.status_code == 409
+    resent = client.post("/ai-assistant", json={"task": "quiz", "content": "", "syllabusId": SYLLABUS_ID,
+                                                "syllabusContext": "Unit 1 Thermodynamics"})
+    assert resent.get_json()["success"] and "Unit 1 Thermodynamics" in backend.prompts[-1]
@@ -0,0 +1,21 @@
+import pytest
+
+
+@pytest.mark.parametrize("body", [
+    {"email": "a@example.com", "password": 12345678},
+    {"email": "a@example.com", "password": None},
+    {"email": "a@example.com", "password": ""},
+    {"email": ["a@example.com"], "password": "secret"},
+    ["a@example.com", "secret"],
+])
+def test_register_rejects_malformed_credentials(client, body):
+    response = client.post("/register", json=body)
+    assert response.status_code == 400
+    assert client.post("/login", json=body).status_code == 401
+
+
+def test_register_and_login(client):
+    body = {"email": "b@example.com", "password": "correct horse"}
+    assert client.post("/register", json=body).status_code == 200
+    token = client.post("/login", json=body).get_json()["token"]
+    assert client.get("/session", headers={"Authorization": f"Bearer {token}"}).get_json()["email"] == body["email"]
@@ -0,0 +1,43 @@
+import pytest
+
+import scheduler
+
+TOPICS = [{"topic": "Thermodynamics", "subtopics": ["Entropy", "Heat engines"]}]
+
+
+@pytest.mark.parametrize("hours", [1e7, float("inf"), float("nan"), 0, 0.5, 25, -3, "lots", None, True])
+def test_study_hours_out_of_range_are_rejected(hours):
+    with pytest.raises(ValueError):
+        scheduler.parse_study_hours(hours)
+
+
+@pytest.mark.parametrize("hours", [1, 4, "6", 12, 24])
+def test_study_hours_in_range(hours):
+    assert scheduler.generate_tasks(TOPICS, hours, "09:00", "2026-01-05")
+
+
+@pytest.mark.parametrize("body", [
+    '{"topics": %s, "studyHours": 1e7}',
+    '{"topics": %s, "studyHours": Infinity}',
+    '{"topics": %s, "studyHours": "four"}',
+    '{"topics": %s, "studyHours": 0}',
+])
+def test_schedule_rejects_bad_study_hours(client, body):
+    import json
+
+    response = client.post("/schedule", data=body % json.dumps(TOPICS), content_type="application/json")
+    assert response.status_code == 400
+    assert response.get_json()["success"] is False
+
+
+def test_reschedule_rejects_bad_study_hours_per_plan(client):
+    missed = scheduler.generate_tasks(TOPICS, 4, "09:00", "2026-01-05")
+    response = client.post("/schedule/reschedule", json={"today": "2026-01-10", "plans": [
+        {"id": "bad", "tasks": missed, "studyHours": 1e7},
+        {"id": "idle", "tasks": [], "studyHours": "x"},
+        {"id": "good", "tasks": missed, "studyHours": 4},
+    ]})
+    results = {result["id"]: result for result in response.get_json()["results"]}
+    assert results["bad"]["success"] is False
+    assert results["idle"]["success"] is False
+    assert results["good"]["success"] is True and results["good"]["rescheduled"] is True
@@ -0,0 +1,37 @@
+import io
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+import fake_backends  # noqa: E402
+
+
+@pytest.fixture
+def backend(client, monkeypatch):
+    import app
+
+    monkeypatch.setattr(app, "QUIZ_BANK", False)
+    return app
+
+
+def upload(client, pdf, **form):
+    return client.post("/upload-syllabus", data={"file": (io.BytesIO(pdf), "syllabus.pdf"), **form},
+                       content_type="multipart/form-data").get_json()
+
+
+def test_fallback_topics_are_not_memoized(client, backend, monkeypatch):
+    pdf = fake_backends.make_pdf(fake_backends.syllabus_lines(3) + ["outage check"])
+    monkeypatch.setattr(backend, "call_ai", lambda *args, **kwargs: None)
+    first = upload(client, pdf)
+    assert first["success"] and first["sections"]["degraded_chunks"]
+
+    topics = [{"topic": "Thermodynamics", "subtopics": ["Entropy"]}]
+    monkeypatch.setattr(backend, "call_ai", lambda *args, **kwargs: json.dumps(topics))
+    second = upload(client, pdf)
+    assert second["cached"] is False and second["sections"]["degraded_chunks"] == 0
+    assert [t["topic"] for t in second["topics"]] == ["Thermodynamics"]
+    assert upload(client, pdf)["cached"] is True
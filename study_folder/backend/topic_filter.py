@@ -0,0 +1,147 @@
+"""Compiled keyword filters for syllabus cleaning and topic post-processing.
+
+All keywords are compiled into one regex built from a prefix trie, e.g.
+"ex(?:am|ternal)". Each line is lowercased once and scanned once, instead
+of being lowercased and scanned once per keyword. The blacklist
+(clean_syllabus_text) and the forbidden list (topic post-processing) share
+this matcher.
+
+Institutions can add or remove keywords through a JSON file named by
+TOPIC_FILTER_CONFIG:
+    {"institutions": {"abc-university": {"blacklist": {"add": ["lab"], "remove": ["project"]},
+                                         "forbidden": {"add": ["lab"]}}}}
+Institution names are matched case-insensitively (see institution_key).
+"""
+import json
+import os
+import re
+from functools import lru_cache
+
+from logs import log
+
+BLACKLIST_KEYWORDS = [
+    "mark", "score", "credit", "weightage", "hour", "exam", "internal",
+    "external", "total", "pattern", "duration", "question paper", "allotment",
+    "time", "minute", "mins", "hrs", "maximum", "minimum", "sec", "section",
+    "objective", "instruction", "rule", "administrative", "policy", "grade",
+    "grading", "assignment", "project", "presentation", "attendance", "participation",
+    "syllabus", "course", "description", "outcome", "prerequisite", "textbook",
+    "reference", "material", "university", "department", "faculty", "student"
+]
+
+FORBIDDEN_TOPIC_KEYWORDS = [
+    "mark", "score", "credit", "weightage", "hour", "exam",
+    "internal", "external", "total", "time", "hrs", "mins"
+]
+
+LEADING_NUMBERING = re.compile(r"^[0-9.\-\s]+")
+
+
+def _trie_pattern(keywords):
+    # A keyword that contains another keyword can never change the outcome.
+    words = sorted({kw.lower() for kw in keywords if kw})
+    words = [w for w in words if not any(other != w and other in w for other in words)]
+
+    trie = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def build(node):
+        branches = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ""
+        return branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+
+    return build(trie)
+
+
+class KeywordMatcher:
+    """Case-insensitive "does this text contain any keyword" check."""
+
+    def __init__(self, keywords):
+        self.keywords = list(keywords)
+        pattern = _trie_pattern(self.keywords)
+        # An empty keyword list must match nothing, not everything.
+        self._search = re.compile(pattern).search if pattern else (lambda text: None)
+
+    def matches(self, text):
+        return self._search(text.lower()) is not None
+
+    def matches_lower(self, lowered):
+        return self._search(lowered) is not None
+
+
+class TopicFilters:
+    def __init__(self, blacklist=BLACKLIST_KEYWORDS, forbidden=FORBIDDEN_TOPIC_KEYWORDS):
+        self.blacklist = KeywordMatcher(blacklist)
+        self.forbidden = KeywordMatcher(forbidden)
+
+    def clean_line(self, line):
+        """Returns the cleaned line, or None if it should be dropped."""
+        line = line.strip()
+        if len(line) < 4 or self.blacklist.matches(line):
+            return None
+        line = LEADING_NUMBERING.sub("", line)
+        return line if len(line) > 3 else None
+
+    def clean_document(self, text):
+        """Batch mode: the whole document is lowercased once and filtered in one pass."""
+        lines = text.split("\n")
+        lowered = text.lower().split("\n")
+        if len(lowered) != len(lines):
+            # Some exotic characters change line structure when lowercased.
+            lowered = [line.lower() for line in lines]
+
+        search = self.blacklist.matches_lower
+        strip_numbering = LEADING_NUMBERING.sub
+        cleaned = []
+        for line, low in zip(lines, lowered):
+            if search(low):
+                continue
+            line = line.strip()
+            if len(line) < 4:
+                continue
+            line = strip_numbering("", line)
+            if len(line) > 3:
+                cleaned.append(line)
+        return "\n".join(cleaned)
+
+    def is_forbidden(self, topic):
+        return self.forbidden.matches(topic)
+
+
+def _apply(base, changes):
+    changes = changes or {}
+    removed = {kw.lower() for kw in changes.get("remove", [])}
+    return [kw for kw in base if kw not in removed] + list(changes.get("add", []))
+
+
+def institution_key(institution):
+    """Canonical institution name: "MIT " and "mit" get the same filters."""
+    return (institution or "").strip().lower()
+
+
+@lru_cache(maxsize=None)
+def _load_config(path):
+    if not path:
+        return {}
+    try:
+        with open(path, encoding="utf-8") as f:
+            institutions = json.load(f).get("institutions", {})
+        return {institution_key(name): overrides for name, overrides in institutions.items()}
+    except Exception as e:
+        log("topic_filter_config_failed", level="warning", error=str(e))
+        return {}
+
+
+@lru_cache(maxsize=64)
+def filters_for(institution=None):
+    """Compiled filters for an institution (defaults if unknown or not given)."""
+    overrides = _load_config(os.getenv("TOPIC_FILTER_CONFIG", "")).get(institution_key(institution), {})
+    return TopicFilters(
+        blacklist=_apply(BLACKLIST_KEYWORDS, overrides.get("blacklist")),
+        forbidden=_apply(FORBIDDEN_TOPIC_KEYWORDS, overrides.get("forbidden")),
+    )
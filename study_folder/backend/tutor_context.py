@@ -0,0 +1,193 @@
+"""Token-budgeted conversation context for /ai-tutor.
+
+The newest turns are sent verbatim, up to TUTOR_RECENT_MESSAGES messages
+and TUTOR_HISTORY_TOKENS tokens, and each message is capped at
+TUTOR_MESSAGE_TOKENS. Older turns are folded into a rolling summary, kept
+per conversation id in the shared AI cache. That way every worker sees it
+and the start of each prompt stays the same from turn to turn.
+
+Summaries are refreshed in the background, a batch of turns at a time, so a
+tutor reply never waits on one. Until a refresh lands, the turns it will
+cover are condensed in place to their first sentence.
+
+Token counts are estimated (about 4 characters per token). That is close
+enough for budgeting, and no tokenizer has to be loaded.
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from logs import log, with_request_id
+
+HISTORY_TOKENS = int(os.getenv("TUTOR_HISTORY_TOKENS", "1200"))
+RECENT_MESSAGES = int(os.getenv("TUTOR_RECENT_MESSAGES", "6"))
+MESSAGE_TOKENS = int(os.getenv("TUTOR_MESSAGE_TOKENS", "400"))
+SUMMARY_TOKENS = int(os.getenv("TUTOR_SUMMARY_TOKENS", "250"))
+# Older turns wait until this many have piled up before a summary refresh
+SUMMARY_BATCH = int(os.getenv("TUTOR_SUMMARY_BATCH", "4"))
+SUMMARY_TTL = int(os.getenv("TUTOR_SUMMARY_TTL", str(24 * 3600)))
+
+Message = namedtuple("Message", ["role", "content"])
+
+
+def estimate_tokens(text):
+    return (len(text) + 3) // 4
+
+
+def clip(text, max_tokens):
+    """Cuts text to roughly max_tokens, at a word boundary where possible."""
+    max_chars = max_tokens * 4
+    if len(text) <= max_chars:
+        return text
+    cut = text[:max_chars]
+    space = cut.rfind(" ", max_chars - 80)
+    return (cut[:space] if space > 0 else cut).rstrip() + " …"
+
+
+def _first_sentence(text, max_tokens=30):
+    match = re.match(r"\s*(.+?[.!?])(\s|$)", text, re.DOTALL)
+    return clip((match.group(1) if match else text).strip(), max_tokens)
+
+
+def _fingerprint(messages, count):
+    """Identifies messages[:count] by its length and end points, in constant time."""
+    ends = [list(messages[0]), list(messages[count - 1])] if count else []
+    payload = json.dumps([count, ends], ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def conversation_id(topic, history):
+    """Stable id for clients that don't send one: topic + the opening message."""
+    opening = history[0].content if history else ""
+    return hashlib.sha256(f"{topic}\n{opening}".encode("utf-8")).hexdigest()[:24]
+
+
+def normalize_history(history):
+    """Messages as sent by the client; contents are clipped only where they are used."""
+    return [Message("user" if msg.get("role") == "user" else "assistant", str(msg["content"]))
+            for msg in history or [] if isinstance(msg, dict) and msg.get("content")]
+
+
+def _clipped(message):
+    return Message(message.role, clip(message.content, MESSAGE_TOKENS))
+
+
+def _label(role):
+    return "Student" if role == "user" else "Teacher"
+
+
+class TutorContext:
+    """What one tutor turn sends: a summary of older turns plus recent turns verbatim."""
+
+    def __init__(self, conversation, summary, recent):
+        self.conversation = conversation
+        self.summary = summary
+        self.recent = recent
+
+    @property
+    def tokens(self):
+        return estimate_tokens(self.summary) + sum(estimate_tokens(m.content) for m in self.recent)
+
+    def chat_messages(self, system, question):
+        messages = [{"role": "system", "content": system}]
+        if self.summary:
+            messages.append({"role": "system", "content": f"Summary of the earlier conversation:\n{self.summary}"})
+        messages.extend({"role": m.role, "content": m.content} for m in self.recent)
+        messages.append({"role": "user", "content": question})
+        return messages
+
+    def history_text(self):
+        lines = []
+        if self.summary:
+            lines.append(f"(Earlier, summarized) {self.summary}")
+        lines.extend(f"{_label(m.role)}: {m.content}" for m in self.recent)
+        return "\n".join(lines) + ("\n" if lines else "")
+
+
+class ContextManager:
+    """Builds TutorContexts and keeps the per-conversation rolling summaries.
+
+    summarize(previous_summary, transcript) returns the new summary text, or
+    None on failure. cache is an ai_cache.AICache.
+    """
+
+    def __init__(self, cache, summarize, max_workers=2):
+        self.cache = cache
+        self.summarize = summarize
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tutor-summary")
+        self._pending = set()
+        self._lock = threading.Lock()
+
+    def _key(self, conversation):
+        return f"tutor-summary:{conversation}"
+
+    def _load(self, conversation, messages):
+        """(summary, covered) for the stored summary, if it matches this history's prefix."""
+        raw = self.cache.get(self._key(conversation), task="tutor_summary")
+        if raw:
+            try:
+                record = json.loads(raw)
+                covered = record["covered"]
+                if covered <= len(messages) and record["digest"] == _fingerprint(messages, covered):
+                    return record["summary"], covered
+            except (ValueError, KeyError, TypeError):
+                pass
+        return "", 0
+
+    def build(self, topic, history, conversation=None):
+        messages = normalize_history(history)
+        conversation = conversation or conversation_id(topic, messages)
+        summary, covered = self._load(conversation, messages)
+        tail = [_clipped(m) for m in messages[covered:]]
+
+        # Newest messages that fit the budget, verbatim
+        budget = HISTORY_TOKENS - estimate_tokens(summary)
+        keep = 0
+        for msg in reversed(tail):
+            cost = estimate_tokens(msg.content)
+            if keep >= RECENT_MESSAGES or (keep and cost > budget):
+                break
+            budget -= cost
+            keep += 1
+        older = tail[:len(tail) - keep]
+        recent = tail[len(tail) - keep:]
+
+        if older:
+            # Not in the summary yet: a one-line stand-in until the refresh lands
+            condensed = " ".join(f"{_label(m.role)}: {_first_sentence(m.content)}" for m in older)
+            room = HISTORY_TOKENS - sum(estimate_tokens(m.content) for m in recent)
+            summary = clip(f"{summary} {condensed}".strip(), max(SUMMARY_TOKENS, room))
+            if len(older) >= SUMMARY_BATCH:
+                self._refresh(conversation, messages, covered + len(older))
+        return TutorContext(conversation, summary, recent)
+
+    def _refresh(self, conversation, messages, upto):
+        with self._lock:
+            if conversation in self._pending:
+                return
+            self._pending.add(conversation)
+        self._executor.submit(with_request_id(self._summarize), conversation, messages[:upto])
+
+    def _summarize(self, conversation, messages):
+        try:
+            previous, previous_covered = self._load(conversation, messages)
+            if previous_covered >= len(messages):
+                return
+            transcript = "\n".join(f"{_label(m.role)}: {clip(m.content, MESSAGE_TOKENS)}"
+                                   for m in messages[previous_covered:])
+            summary = self.summarize(previous, transcript)
+            if not summary:
+                return
+            record = {"summary": clip(summary.strip(), SUMMARY_TOKENS), "covered": len(messages),
+                      "digest": _fingerprint(messages, len(messages))}
+            self.cache.set(self._key(conversation), json.dumps(record), SUMMARY_TTL, task="tutor_summary")
+            log("tutor_summary_updated", conversation=conversation, covered=len(messages))
+        except Exception as e:
+            log("tutor_summary_failed", level="warning", conversation=conversation, error=str(e))
+        finally:
+            with self._lock:
+                self._pending.discard(conversation)
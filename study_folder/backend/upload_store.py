@@ -0,0 +1,219 @@
+"""Content-addressed storage for syllabus uploads, with memoized extraction.
+
+An upload is streamed to a private temp file in fixed-size chunks and
+hashed as it is written. It is then renamed to uploads/<sha256><ext>, so two
+students who both upload "syllabus.pdf" never touch each other's file, and
+identical files are stored once. Extraction results are memoized in a
+SQLite index next to the files, shared by every gunicorn worker:
+    raw      extracted text, keyed by content hash
+    result   cleaned text + topics, keyed by content hash and institution
+A re-upload of a known syllabus is answered from the index without OCR or
+LLM calls.
+
+The directory is kept under UPLOAD_MAX_BYTES and UPLOAD_MAX_AGE seconds by
+evicting the least recently used files. Files used in the last
+UPLOAD_EVICT_GRACE seconds are never evicted, since a job may still be
+reading them.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import namedtuple
+
+from logs import log
+
+# Bump when extraction or topic structuring changes, so old memos are ignored.
+EXTRACTION_VERSION = 1
+CHUNK_SIZE = 1024 * 1024
+
+StoredUpload = namedtuple("StoredUpload", ["digest", "path", "filename", "size", "is_new"])
+
+
+def _extension(filename):
+    ext = os.path.splitext(filename or "")[1].lower()
+    return ext if ext.isascii() and ext[1:].isalnum() and len(ext) <= 8 else ""
+
+
+class UploadStore:
+    def __init__(self, root, max_bytes=None, max_age=None, grace=600):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.grace = grace
+        self.db_path = os.path.join(root, "index.sqlite3")
+        self._local = threading.local()
+        os.makedirs(root, exist_ok=True)
+        conn = self._conn()
+        conn.executescript(
+            "CREATE TABLE IF NOT EXISTS uploads ("
+            " digest TEXT PRIMARY KEY, path TEXT NOT NULL, size INTEGER NOT NULL,"
+            " created_at REAL NOT NULL, last_used REAL NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS uploads_by_use ON uploads (last_used);"
+            "CREATE TABLE IF NOT EXISTS extractions ("
+            " digest TEXT NOT NULL, kind TEXT NOT NULL, variant TEXT NOT NULL,"
+            " version INTEGER NOT NULL, value TEXT NOT NULL,"
+            " PRIMARY KEY (digest, kind, variant));"
+        )
+        conn.commit()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    # ── Files ────────────────────────────────────────────────
+    def save(self, stream, filename):
+        """Streams a file-like object to disk and returns a StoredUpload."""
+        hasher = hashlib.sha256()
+        size = 0
+        buffer = bytearray(CHUNK_SIZE)
+        view = memoryview(buffer)
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, prefix=".upload-")
+        try:
+            with os.fdopen(fd, "wb") as out:
+                readinto = getattr(stream, "readinto", None)
+                while True:
+                    if readinto:
+                        n = readinto(buffer)
+                        chunk = view[:n] if n else b""
+                    else:
+                        chunk = stream.read(CHUNK_SIZE)
+                        n = len(chunk)
+                    if not n:
+                        break
+                    hasher.update(chunk)
+                    out.write(chunk)
+                    size += n
+            digest = hasher.hexdigest()
+            path = os.path.join(self.root, digest + _extension(filename))
+            is_new = not os.path.exists(path)
+            if is_new:
+                os.replace(tmp_path, path)  # atomic; a concurrent identical upload is harmless
+            else:
+                os.remove(tmp_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        now = time.time()
+        conn = self._conn()
+        with conn:
+            # Same bytes under another extension: keep only the newest copy
+            row = conn.execute("SELECT path FROM uploads WHERE digest = ?", (digest,)).fetchone()
+            if row and row[0] != path and os.path.exists(row[0]):
+                os.remove(row[0])
+            conn.execute(
+                "INSERT INTO uploads (digest, path, size, created_at, last_used) VALUES (?, ?, ?, ?, ?)"
+                " ON CONFLICT(digest) DO UPDATE SET path = excluded.path, last_used = excluded.last_used",
+                (digest, path, size, now, now),
+            )
+        self.evict()
+        return StoredUpload(digest, path, filename, size, is_new)
+
+    def get(self, digest):
+        """StoredUpload for a known content hash whose file is still on disk, or None."""
+        row = self._conn().execute(
+            "SELECT path, size FROM uploads WHERE digest = ?", (digest,)
+        ).fetchone()
+        if row is None or not os.path.exists(row[0]):
+            return None
+        self.touch(digest)
+        return StoredUpload(digest, row[0], os.path.basename(row[0]), row[1], False)
+
+    def touch(self, digest):
+        conn = self._conn()
+        with conn:
+            conn.execute("UPDATE uploads SET last_used = ? WHERE digest = ?", (time.time(), digest))
+
+    # ── Memoized extraction ──────────────────────────────────
+    def memo(self, digest, kind, variant=""):
+        row = self._conn().execute(
+            "SELECT value FROM extractions WHERE digest = ? AND kind = ? AND variant = ? AND version = ?",
+            (digest, kind, variant or "", EXTRACTION_VERSION),
+        ).fetchone()
+        if row is None:
+            return None
+        try:
+            return json.loads(row[0])
+        except ValueError:
+            return None
+
+    def remember(self, digest, kind, value, variant=""):
+        try:
+            conn = self._conn()
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO extractions (digest, kind, variant, version, value)"
+                    " VALUES (?, ?, ?, ?, ?)",
+                    (digest, kind, variant or "", EXTRACTION_VERSION, json.dumps(value, ensure_ascii=False)),
+                )
+        except sqlite3.Error as e:
+            log("upload_memo_write_failed", level="warning", digest=digest, kind=kind, error=str(e))
+
+    # ── Eviction ─────────────────────────────────────────────
+    def _forget(self, conn, digest, path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        conn.execute("DELETE FROM uploads WHERE digest = ?", (digest,))
+        conn.execute("DELETE FROM extractions WHERE digest = ?", (digest,))
+
+    def evict(self):
+        """Drops expired files, then least recently used ones until under max_bytes."""
+        now = time.time()
+        protected = now - self.grace
+        evicted = 0
+        conn = self._conn()
+        try:
+            with conn:
+                if self.max_age:
+                    for digest, path in conn.execute(
+                        "SELECT digest, path FROM uploads WHERE last_used < ? AND last_used < ?",
+                        (now - self.max_age, protected),
+                    ).fetchall():
+                        self._forget(conn, digest, path)
+                        evicted += 1
+                if self.max_bytes:
+                    total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM uploads").fetchone()[0]
+                    if total > self.max_bytes:
+                        for digest, path, size in conn.execute(
+                            "SELECT digest, path, size FROM uploads WHERE last_used < ? ORDER BY last_used",
+                            (protected,),
+                        ).fetchall():
+                            if total <= self.max_bytes:
+                                break
+                            self._forget(conn, digest, path)
+                            total -= size
+                            evicted += 1
+        except sqlite3.Error as e:
+            log("upload_evict_failed", level="warning", error=str(e))
+        if evicted:
+            log("uploads_evicted", count=evicted)
+        return evicted
+
+    def stats(self):
+        count, total = self._conn().execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM uploads"
+        ).fetchone()
+        return {"files": count, "bytes": total, "max_bytes": self.max_bytes, "max_age": self.max_age}
+
+
+def store_from_env(root="uploads"):
+    max_bytes = int(os.getenv("UPLOAD_MAX_BYTES", str(512 * 1024 * 1024)))
+    max_age = int(os.getenv("UPLOAD_MAX_AGE", str(30 * 24 * 3600)))
+    return UploadStore(
+        os.getenv("UPLOAD_FOLDER", root),
+        max_bytes=max_bytes or None,
+        max_age=max_age or None,
+        grace=int(os.getenv("UPLOAD_EVICT_GRACE", "600")),
+    )
@@ -0,0 +1,242 @@
+"""User and session storage for /register and /login.
+
+The default backend is a SQLite file in WAL mode, so every gunicorn worker
+sees the same users and a restart loses nothing. Users are looked up by
+their primary-key email, and sessions by their primary-key token.
+Passwords are stored as salted scrypt hashes. The cost is tunable with
+USER_SCRYPT_N, and hashes made with an older cost are upgraded on the next
+successful login.
+
+USER_STORE=memory keeps everything in-process (handy for local runs).
+"""
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+SCRYPT_N = int(os.getenv("USER_SCRYPT_N", str(2 ** 14)))
+SCRYPT_R = 8
+SCRYPT_P = 1
+SESSION_TTL = int(os.getenv("SESSION_TTL", str(7 * 24 * 3600)))
+# How long a worker trusts its cached copy of a session before re-reading the
+# store. Logout only evicts the local worker's copy, so this bounds how long
+# other workers keep accepting a logged-out token.
+SESSION_CACHE_SECONDS = float(os.getenv("SESSION_CACHE_SECONDS", "30"))
+
+
+# ── Password hashing ─────────────────────────────────────────
+def _b64(data):
+    return base64.b64encode(data).decode("ascii")
+
+
+def hash_password(password, n=None):
+    n = n or SCRYPT_N
+    salt = secrets.token_bytes(16)
+    digest = hashlib.scrypt(password.encode("utf-8"), salt=salt, n=n, r=SCRYPT_R, p=SCRYPT_P,
+                            maxmem=256 * n * SCRYPT_R, dklen=32)
+    return f"scrypt${n}${SCRYPT_R}${SCRYPT_P}${_b64(salt)}${_b64(digest)}"
+
+
+def verify_password(password, encoded):
+    try:
+        scheme, n, r, p, salt, digest = encoded.split("$")
+        n, r, p = int(n), int(r), int(p)
+    except (AttributeError, ValueError):
+        return False
+    if scheme != "scrypt":
+        return False
+    expected = base64.b64decode(digest)
+    actual = hashlib.scrypt(password.encode("utf-8"), salt=base64.b64decode(salt), n=n, r=r, p=p,
+                            maxmem=256 * n * r, dklen=len(expected))
+    return hmac.compare_digest(actual, expected)
+
+
+def needs_rehash(encoded):
+    return not encoded.startswith(f"scrypt${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}$")
+
+
+# ── Session cache ────────────────────────────────────────────
+class _SessionCache:
+    """Small LRU of token -> (email, valid_until) in front of the store. An entry
+    is valid until the session expires or max_age seconds after caching."""
+
+    def __init__(self, max_entries=2048, max_age=SESSION_CACHE_SECONDS):
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token):
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                return None
+            if entry[1] <= time.time():
+                del self._entries[token]
+                return None
+            self._entries.move_to_end(token)
+            return entry[0]
+
+    def put(self, token, email, expires_at):
+        with self._lock:
+            self._entries[token] = (email, min(expires_at, time.time() + self.max_age))
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def drop(self, token):
+        with self._lock:
+            self._entries.pop(token, None)
+
+
+# ── Stores ───────────────────────────────────────────────────
+class UserStore:
+    """Backend interface. Subclasses implement the _-prefixed storage hooks."""
+
+    def __init__(self):
+        self._sessions = _SessionCache()
+
+    def register(self, email, password):
+        """Returns False if the email is already taken."""
+        return self._insert_user(email, hash_password(password))
+
+    def authenticate(self, email, password):
+        encoded = self._password_hash(email)
+        if not encoded or not verify_password(password, encoded):
+            return False
+        if needs_rehash(encoded):
+            self._update_password_hash(email, hash_password(password))
+        return True
+
+    def create_session(self, email):
+        token = secrets.token_urlsafe(32)
+        expires_at = time.time() + SESSION_TTL
+        self._insert_session(token, email, expires_at)
+        self._sessions.put(token, email, expires_at)
+        return token
+
+    def session_email(self, token):
+        """Email for a live session token, or None. Hot tokens are served from memory."""
+        if not token:
+            return None
+        email = self._sessions.get(token)
+        if email:
+            return email
+        row = self._load_session(token)
+        if row is None or row[1] <= time.time():
+            return None
+        self._sessions.put(token, *row)
+        return row[0]
+
+    def end_session(self, token):
+        self._sessions.drop(token)
+        self._delete_session(token)
+
+
+class MemoryUserStore(UserStore):
+    def __init__(self):
+        super().__init__()
+        self._users = {}
+        self._session_rows = {}
+        self._lock = threading.Lock()
+
+    def _insert_user(self, email, encoded):
+        with self._lock:
+            if email in self._users:
+                return False
+            self._users[email] = encoded
+            return True
+
+    def _password_hash(self, email):
+        return self._users.get(email)
+
+    def _update_password_hash(self, email, encoded):
+        with self._lock:
+            self._users[email] = encoded
+
+    def _insert_session(self, token, email, expires_at):
+        self._session_rows[token] = (email, expires_at)
+
+    def _load_session(self, token):
+        return self._session_rows.get(token)
+
+    def _delete_session(self, token):
+        self._session_rows.pop(token, None)
+
+
+class SQLiteUserStore(UserStore):
+    def __init__(self, db_path):
+        super().__init__()
+        self.db_path = db_path
+        self._local = threading.local()
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._conn()
+        conn.executescript(
+            "CREATE TABLE IF NOT EXISTS users ("
+            " email TEXT PRIMARY KEY, password_hash TEXT NOT NULL, created_at REAL NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " token TEXT PRIMARY KEY, email TEXT NOT NULL, expires_at REAL NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS sessions_by_email ON sessions (email);"
+            "CREATE INDEX IF NOT EXISTS sessions_by_expiry ON sessions (expires_at);"
+        )
+        conn.commit()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _insert_user(self, email, encoded):
+        conn = self._conn()
+        try:
+            with conn:
+                conn.execute("INSERT INTO users (email, password_hash, created_at) VALUES (?, ?, ?)",
+                             (email, encoded, time.time()))
+            return True
+        except sqlite3.IntegrityError:
+            return False
+
+    def _password_hash(self, email):
+        row = self._conn().execute(
+            "SELECT password_hash FROM users WHERE email = ?", (email,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def _update_password_hash(self, email, encoded):
+        conn = self._conn()
+        with conn:
+            conn.execute("UPDATE users SET password_hash = ? WHERE email = ?", (encoded, email))
+
+    def _insert_session(self, token, email, expires_at):
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM sessions WHERE expires_at <= ?", (time.time(),))
+            conn.execute("INSERT INTO sessions (token, email, expires_at) VALUES (?, ?, ?)",
+                         (token, email, expires_at))
+
+    def _load_session(self, token):
+        return self._conn().execute(
+            "SELECT email, expires_at FROM sessions WHERE token = ?", (token,)
+        ).fetchone()
+
+    def _delete_session(self, token):
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM sessions WHERE token = ?", (token,))
+
+
+def store_from_env():
+    if os.getenv("USER_STORE", "sqlite") == "memory":
+        return MemoryUserStore()
+    return SQLiteUserStore(os.getenv("USER_DB", os.path.join("data", "users.sqlite3")))
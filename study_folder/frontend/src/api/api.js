@@ -48,10 +48,15 @@ async function fetchWithRetry(url, options, retries = 3, delay = 10000) {
   throw new Error("Backend failed to start in time. Please refresh and try again.");
 }
 
-export async function uploadSyllabus(file, uid) {
+// baseSyllabusId: syllabus_id of the previous version. Only changed sections are
+// re-processed, and the response carries a `diff` of the topic tree.
+export async function uploadSyllabus(file, uid, baseSyllabusId = null) {
   const formData = new FormData();
   formData.append("file", file);
   formData.append("uid", uid);
+  if (baseSyllabusId) {
+    formData.append("base_syllabus_id", baseSyllabusId);
+  }
 
   return fetchWithRetry(`${BACKEND_URL}/upload-syllabus`, {
     method: "POST",
@@ -59,12 +64,24 @@ export async function uploadSyllabus(file, uid) {
   });
 }
 
-export async function callAI(task, content, syllabusContext = "") {
-  return fetchWithRetry(`${BACKEND_URL}/ai-assistant`, {
+// With a syllabusId (from /upload-syllabus) the backend looks up the relevant
+// syllabus passages itself, so the full text isn't sent with every doubt.
+// If the backend doesn't know that syllabus (code "unknown_syllabus"), the
+// request is sent again with the text.
+export async function callAI(task, content, syllabusContext = "", syllabusId = null, userId = null) {
+  const body = syllabusId ? { task, content, syllabusId } : { task, content, syllabusContext };
+  // Quizzes are sampled from the syllabus's question bank, skipping ones this user has seen
+  if (userId) body.userId = userId;
+  const post = (payload) => fetchWithRetry(`${BACKEND_URL}/ai-assistant`, {
     method: "POST",
     headers: { "Content-Type": "application/json" },
-    body: JSON.stringify({ task, content, syllabusContext })
+    body: JSON.stringify(payload)
   });
+  const res = await post(body);
+  if (res.code === "unknown_syllabus" && syllabusContext) {
+    return post({ ...body, syllabusContext });
+  }
+  return res;
 }
 
 export async function generateConceptImage(concept, context = "") {
@@ -74,7 +91,12 @@ export async function generateConceptImage(concept, context = "") {
       headers: { "Content-Type": "application/json" },
       body: JSON.stringify({ concept, context })
     });
-    return res.json();
+    const data = await res.json();
+    // Cached diagrams are served by the backend at a relative /diagrams/... URL
+    if (data.image_url && data.image_url.startsWith("/")) {
+      data.image_url = `${BACKEND_URL}${data.image_url}`;
+    }
+    return data;
   } catch (err) {
     console.error("Image generation failed:", err);
     return { success: false };
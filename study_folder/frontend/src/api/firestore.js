@@ -95,6 +95,7 @@ export async function saveStudyPlan(uid, tasks, name, examDate, metadata = {}) {
     studyHours: metadata.hours || 4,
     studyPreference: metadata.preference || "morning",
     syllabusText: metadata.syllabusText || "",
+    syllabusId: metadata.syllabusId || null,
     createdAt: new Date()
   });
   return planId;
@@ -2,7 +2,7 @@ import React, { useState } from "react";
 import Card from "../components/Card";
 import { callAI, generateConceptImage } from "../api/api";
 
-function AIAssistant({ syllabusText, summary, setSummary, chat, setChat, activeTab, setActiveTab }) {
+function AIAssistant({ syllabusText, syllabusId, summary, setSummary, chat, setChat, activeTab, setActiveTab }) {
   const [loadingSummary, setLoadingSummary] = useState(false);
   const [userQuery, setUserQuery] = useState("");
   const [loadingChat, setLoadingChat] = useState(false);
@@ -80,7 +80,7 @@ function AIAssistant({ syllabusText, summary, setSummary, chat, setChat, activeT
     setLoadingChat(true);
 
     try {
-      const res = await callAI("doubt", currentQuery, syllabusText);
+      const res = await callAI("doubt", currentQuery, syllabusText, syllabusId);
       const aiMessageIndex = newChat.length; // index of the AI reply about to be added
       const updatedChat = [...newChat, { role: "ai", text: res.response }];
       setChat(updatedChat);
@@ -21,6 +21,7 @@ function Home({ onLogout }) {
   
   // State for AI features
   const [syllabusText, setSyllabusText] = useState("");
+  const [syllabusId, setSyllabusId] = useState(null);
   const [aiSummary, setAiSummary] = useState("");
   const [aiChat, setAiChat] = useState([]);
   const [aiActiveTab, setAiActiveTab] = useState("summary");
@@ -92,6 +93,7 @@ function Home({ onLogout }) {
         if (plan && plan.syllabusText) {
           setSyllabusText(plan.syllabusText);
         }
+        setSyllabusId(plan?.syllabusId || null);
       }
     };
     loadPlanDetails();
@@ -138,6 +140,7 @@ function Home({ onLogout }) {
             setPage={setPage}
             setActivePlanId={setActivePlanId}
             setSyllabusText={setSyllabusText}
+            setSyllabusId={setSyllabusId}
           />
         )}
         {page === "calendar" && (
@@ -152,6 +155,7 @@ function Home({ onLogout }) {
         {page === "assistant" && (
           <AIAssistant 
             syllabusText={syllabusText} 
+            syllabusId={syllabusId}
             summary={aiSummary}
             setSummary={setAiSummary}
             chat={aiChat}
@@ -163,6 +167,7 @@ function Home({ onLogout }) {
         {page === "quiz" && (
           <Quiz 
             syllabusText={syllabusText} 
+            syllabusId={syllabusId}
             quiz={quizData}
             setQuiz={setQuizData}
             answers={quizAnswers}
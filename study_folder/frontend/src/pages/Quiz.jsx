@@ -4,7 +4,7 @@ import { callAI } from "../api/api";
 import { auth } from "../firebase";
 import { logStudySession, recordActivity } from "../api/firestore";
 
-function Quiz({ syllabusText, quiz, setQuiz, answers, setAnswers, showResult, setShowResult }) {
+function Quiz({ syllabusText, syllabusId, quiz, setQuiz, answers, setAnswers, showResult, setShowResult }) {
   const [loading, setLoading] = useState(false);
 
   async function handleGenerateQuiz() {
@@ -15,7 +15,9 @@ function Quiz({ syllabusText, quiz, setQuiz, answers, setAnswers, showResult, se
     setLoading(true);
     setShowResult(false);
     try {
-      const res = await callAI("quiz", syllabusText);
+      // No content of its own: the backend quizzes on the uploaded syllabus (from its question
+      // bank when it has one), or on syllabusText if it no longer knows syllabusId
+      const res = await callAI("quiz", "", syllabusText, syllabusId, auth.currentUser?.uid);
       
       if (!res.success) {
         throw new Error(res.message || "Failed to connect to AI server.");
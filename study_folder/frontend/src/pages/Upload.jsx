@@ -12,7 +12,8 @@ function Upload({
   examDate, setExamDate, 
   status, setStatus, 
   setPage, setActivePlanId,
-  setSyllabusText
+  setSyllabusText,
+  setSyllabusId
 }) {
   const [startTime, setStartTime] = React.useState("09:00");
   const [studyHours, setStudyHours] = React.useState(4);
@@ -40,6 +41,7 @@ function Upload({
 
       if (res.success) {
         setSyllabusText(res.text); // Save the extracted text for AI features
+        setSyllabusId(res.syllabus_id || null); // Lets doubts send the id instead of the text
         const topics = res.topics;
 
         if (topics.length === 0) {
@@ -61,7 +63,8 @@ function Upload({
             topics: res.topics,
             hours: studyHours,
             preference: startTime,
-            syllabusText: res.text
+            syllabusText: res.text,
+            syllabusId: res.syllabus_id
           });
           setActivePlanId(planId);
         } catch (dbErr) {